@@ -1,14 +1,37 @@
+from django.conf import settings
+
 from django.contrib import admin
 
+from posts import search
+
 from posts.models import Comment
 from posts.models import Follow
 from posts.models import Group
+from posts.models import ImageJob
 from posts.models import Post
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    """Поиск в списке объектов через индекс posts.search вместо
+    LIKE '%…%' по search_fields (полного просмотра таблицы).
+    search_fields нужны только для того, чтобы админка показала поле."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        ids = search.search_ids(
+            search_term,
+            self.search_kind,
+            settings.SEARCH_ADMIN_LIMIT
+        )
+        return queryset.filter(pk__in=ids), False
+
+
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'group', 'pub_date', 'author')
-    search_fields = ('text', 'group',)
+    search_fields = ('text',)
+    search_kind = search.POST
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
@@ -20,9 +43,10 @@ class GroupAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created')
-    search_fields = ('text', 'author',)
+    search_fields = ('text',)
+    search_kind = search.COMMENT
     list_filter = ('created', 'author')
     empty_value_display = '-пусто-'
 
@@ -34,7 +58,14 @@ class FollowAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'post', 'status', 'attempts', 'created', 'started')
+    list_filter = ('status',)
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(ImageJob, ImageJobAdmin)
@@ -0,0 +1,230 @@
+"""JSON API лент только для чтения.
+
+Те же ленты, что и HTML-страницы (index, group_post, profile, post_view,
+follow_index), на том же слое запросов: for_feed, CursorPaginator,
+кэш страниц feed_cache. Клиенту отдаются только данные:
+
+    GET /api/v1/posts/?fields=id,text&cursor=...
+
+* fields — через запятую поля постов, которые нужны клиенту
+  (по умолчанию все из POST_FIELDS);
+* cursor — курсор страницы из next_cursor / previous_cursor ответа;
+* ETag и Last-Modified строятся из поколений feed_cache, как у
+  AnonymousPageCacheMiddleware: повторный запрос с If-None-Match
+  получает 304 без обращения к базе;
+* ответы сжимает gzip общий GZipMiddleware, если клиент его принимает.
+
+Полностраничный кэш для анонимов (posts.middleware) API не кэширует:
+страницы лент и так берутся из feed_cache, а повторные запросы
+получают 304.
+"""
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+
+from django.http import Http404
+from django.http import JsonResponse
+
+from django.shortcuts import get_object_or_404
+
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.cache import patch_vary_headers
+
+from django.utils.http import http_date
+
+from posts import feed_cache
+from posts import stats
+from posts import timeline
+
+from posts.middleware import page_etag
+from posts.middleware import page_scopes
+
+from posts.models import Group
+from posts.models import Post
+
+from posts.paginator import CursorPaginator
+
+from posts.views import comments_page
+
+from yatube.settings import POSTS_LIMIT
+
+User = get_user_model()
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.thumbnail_url or None,
+    'comment_count': lambda post: post.comment_count,
+}
+# Ручка API -> HTML-страница с теми же областями feed_cache.
+PAGES = {
+    'api_index': 'index',
+    'api_group': 'group',
+    'api_profile': 'profile',
+    'api_post': 'post_view',
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+    'author': lambda comment: comment.author.username,
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def json_response(data, status=200):
+    # Кириллица без \\uXXXX и без пробелов: втрое меньше байт.
+    return JsonResponse(
+        data,
+        status=status,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')}
+    )
+
+
+def requested_fields(request):
+    value = request.GET.get('fields')
+    if not value:
+        return list(POST_FIELDS)
+    fields = [field for field in value.split(',') if field]
+    unknown = set(fields) - set(POST_FIELDS)
+    if unknown:
+        raise BadRequest('Неизвестные поля: {0}'.format(
+            ', '.join(sorted(unknown))
+        ))
+    return fields
+
+
+def serialize(instance, fields, available):
+    return {field: available[field](instance) for field in fields}
+
+
+def page_data(page, fields, available):
+    return {
+        'results': [serialize(item, fields, available) for item in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+def feed(request, paginator, *scopes):
+    page = feed_cache.get_page(paginator, request.GET.get('cursor'), *scopes)
+    return page_data(page, requested_fields(request), POST_FIELDS)
+
+
+def api_view(view):
+    """Общее для всех ручек: GET/HEAD, ETag/Last-Modified по поколениям
+    feed_cache и ошибки в JSON."""
+    @wraps(view)
+    def wrapper(request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response({'detail': 'Только чтение.'}, status=405)
+        url_name = request.resolver_match.url_name
+        if url_name in PAGES:
+            scopes = page_scopes(PAGES[url_name], kwargs)
+        else:
+            if not request.user.is_authenticated:
+                return json_response(
+                    {'detail': 'Нужна авторизация.'},
+                    status=401
+                )
+            scopes = (
+                feed_cache.follow_scope(request.user.pk),
+                feed_cache.CELEBRITIES,
+            )
+        tokens = feed_cache.generations(*scopes)
+        etag = page_etag(
+            '{0}|{1}'.format(request.get_full_path(), request.user.pk),
+            tokens
+        )
+        last_modified = feed_cache.last_modified(tokens)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            try:
+                response = json_response(view(request, **kwargs))
+            except BadRequest as error:
+                return json_response({'detail': str(error)}, status=400)
+            except Http404:
+                return json_response({'detail': 'Не найдено.'}, status=404)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+        if request.user.is_authenticated:
+            # Ответ зависит от пользователя: общим кэшам его не хранить.
+            patch_cache_control(response, private=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
+
+
+@api_view
+def index(request):
+    paginator = CursorPaginator(Post.objects.for_feed(), POSTS_LIMIT)
+    return feed(request, paginator, feed_cache.INDEX)
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    paginator = CursorPaginator(group.posts.for_feed(), POSTS_LIMIT)
+    data = feed(request, paginator, feed_cache.group_scope(group.slug))
+    data['group'] = {
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    }
+    return data
+
+
+@api_view
+def profile_posts(request, username):
+    user = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    paginator = CursorPaginator(user.posts.for_feed(), POSTS_LIMIT)
+    data = feed(request, paginator, feed_cache.author_scope(user.username))
+    author_stats = stats.get_stats(user)
+    data['author'] = {
+        'username': user.username,
+        'full_name': user.get_full_name(),
+        'posts_count': author_stats.posts_count,
+        'followers_count': author_stats.followers_count,
+        'following_count': author_stats.following_count,
+    }
+    return data
+
+
+@api_view
+def post_detail(request, username, post_id):
+    post = get_object_or_404(
+        Post.objects.for_feed(),
+        author__username=username,
+        id=post_id
+    )
+    _, page = comments_page(post, request.GET.get('cursor'))
+    return {
+        'post': serialize(post, requested_fields(request), POST_FIELDS),
+        'comments': page_data(page, list(COMMENT_FIELDS), COMMENT_FIELDS),
+    }
+
+
+@api_view
+def follow_posts(request):
+    paginator = timeline.follow_paginator(request.user, POSTS_LIMIT)
+    return feed(
+        request,
+        paginator,
+        feed_cache.follow_scope(request.user.pk),
+        feed_cache.CELEBRITIES
+    )
@@ -0,0 +1,19 @@
+from django.urls import path
+
+from posts import api
+
+urlpatterns = [
+    path('posts/', api.index, name='api_index'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='api_group'),
+    path('follow/', api.follow_posts, name='api_follow'),
+    path(
+        'users/<str:username>/posts/',
+        api.profile_posts,
+        name='api_profile'
+    ),
+    path(
+        'users/<str:username>/posts/<int:post_id>/',
+        api.post_detail,
+        name='api_post'
+    ),
+]
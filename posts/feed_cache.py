@@ -0,0 +1,167 @@
+"""Кэш страниц лент с инвалидацией по поколениям.
+
+Ключ страницы ленты строится из поколений (generations) затронутых
+областей: 'index', 'group:<slug>', 'author:<username>', 'post:<id>',
+'follow:<id>' и общей 'all'. Сигналы сохранения и удаления обновляют
+поколения областей, которые меняет запись, поэтому страницы можно
+хранить часами и всё равно сразу видеть изменения.
+
+Поколение — не счётчик, а токен «время изменения + случайная часть»:
+сброс — это запись новых токенов (set_many обновляет сразу всех
+подписчиков автора), после вытеснения из кэша старые страницы не могут
+совпасть с новым токеном, а по времени в токенах строится
+Last-Modified для HTTP-кэша (posts.middleware).
+"""
+import time
+
+import uuid
+
+from django.conf import settings
+
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+
+from posts import timeline
+
+from posts.models import Follow
+from posts.models import Group
+
+from posts.paginator import CursorPage
+
+User = get_user_model()
+
+GENERATION_PREFIX = 'feed_gen'
+PAGE_PREFIX = 'feed_page'
+
+ALL = 'all'
+INDEX = 'index'
+CELEBRITIES = 'celebrities'
+
+
+def group_scope(slug):
+    return 'group:{0}'.format(slug)
+
+
+def author_scope(username):
+    return 'author:{0}'.format(username)
+
+
+def post_scope(post_id):
+    return 'post:{0}'.format(post_id)
+
+
+def follow_scope(user_id):
+    return 'follow:{0}'.format(user_id)
+
+
+def _generation_key(scope):
+    return '{0}:{1}'.format(GENERATION_PREFIX, scope)
+
+
+def _new_generation():
+    return '{0}-{1}'.format(int(time.time()), uuid.uuid4().hex[:12])
+
+
+def generations(*scopes):
+    """Текущие поколения областей (и общей 'all') одним запросом
+    к кэшу; недостающие создаются."""
+    scopes = (ALL,) + scopes
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _new_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def last_modified(tokens):
+    """Время последнего изменения по токенам поколений (unix time)."""
+    return max(int(token.split('-')[0]) for token in tokens)
+
+
+def bump(*scopes):
+    """Обновляет поколения: все страницы этих лент устаревают."""
+    generation = _new_generation()
+    cache.set_many(
+        {_generation_key(scope): generation for scope in scopes},
+        None
+    )
+
+
+def username(instance, field_name, user_id):
+    """username по внешнему ключу без запроса, если пользователь
+    уже загружен."""
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance):
+        return getattr(instance, field_name).username
+    return User.objects.filter(pk=user_id).values_list(
+        'username',
+        flat=True
+    ).first()
+
+
+def bump_post(post, *group_ids):
+    """Сбрасывает ленты, в которых показан пост: главную, группу
+    (и прежнюю группу при переносе), профиль автора, страницу поста
+    и ленты подписчиков. Посты «знаменитостей» читаются в ленты
+    подписок при запросе, поэтому вместо миллионов подписчиков
+    сбрасывается общая область."""
+    scopes = [
+        INDEX,
+        post_scope(post.pk),
+        author_scope(username(post, 'author', post.author_id)),
+    ]
+    group_ids = {post.group_id, *group_ids} - {None}
+    if group_ids:
+        scopes.extend(
+            group_scope(slug)
+            for slug in Group.objects.filter(pk__in=group_ids).values_list(
+                'slug',
+                flat=True
+            )
+        )
+    if timeline.is_celebrity(post.author_id):
+        scopes.append(CELEBRITIES)
+    else:
+        scopes.extend(
+            follow_scope(user_id)
+            for user_id in Follow.objects.filter(
+                author=post.author_id
+            ).values_list('user', flat=True).iterator()
+        )
+    bump(*scopes)
+
+
+def bump_follow(follow):
+    """Подписка меняет ленту подписчика и счётчики в карточках
+    обоих пользователей."""
+    bump(
+        follow_scope(follow.user_id),
+        author_scope(username(follow, 'user', follow.user_id)),
+        author_scope(username(follow, 'author', follow.author_id)),
+    )
+
+
+def get_page(paginator, cursor, *scopes):
+    """Страница ленты из кэша или из базы.
+
+    Кэшируются посты страницы и курсоры, а не сам CursorPage:
+    паджинатор держит QuerySet, который не нужно сериализовать."""
+    key = '{0}:{1}:{2}'.format(
+        PAGE_PREFIX,
+        ':'.join(generations(*scopes)),
+        cursor or ''
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        object_list, next_cursor, previous_cursor = cached
+        return CursorPage(object_list, paginator, next_cursor, previous_cursor)
+    page = paginator.get_page(cursor)
+    cache.set(
+        key,
+        (page.object_list, page.next_cursor, page.previous_cursor),
+        settings.FEED_CACHE_TIMEOUT
+    )
+    return page
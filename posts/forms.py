@@ -1,5 +1,7 @@
 from django import forms
 
+from posts import uploads
+
 from posts.models import Comment
 from posts.models import Post
 
@@ -9,6 +11,20 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['image'].validators.append(uploads.validate_image)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = self.files.get(self.add_prefix('image'))
+        if getattr(upload, 'too_large', False):
+            # Данные сверх лимита не сохранялись, и ImageField считает
+            # файл битым: показываем настоящую причину.
+            self._errors.pop('image', None)
+            self.add_error('image', uploads.too_large_error())
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,169 @@
+"""Фоновая обработка картинок постов.
+
+Форма поста только сохраняет загруженный файл и ставит задание
+в очередь — таблицу ImageJob. Команда process_images забирает задания
+и в пуле процессов декодирует картинку, убирает EXIF (с поворотом по
+ориентации), уменьшает оригинал до POST_IMAGE_MAX_SIZE и строит
+миниатюры. Пока задание не выполнено, у поста нет миниатюр и шаблоны
+показывают заглушку.
+"""
+from datetime import timedelta
+
+from io import BytesIO
+
+from django.conf import settings
+
+from django.core.files.base import ContentFile
+
+from django.db.models import F
+
+from django.utils import timezone
+
+from PIL import Image
+from PIL import ImageOps
+
+from posts import thumbnails
+
+from posts.models import ImageJob
+
+# Форматы, в которых оригинал пересохраняется как есть; остальные
+# переводятся в JPEG.
+KEEP_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def enqueue(post):
+    """Ставит картинку поста в очередь. Старые миниатюры и
+    невыполненные задания поста больше не нужны."""
+    ImageJob.objects.filter(post=post, status=ImageJob.PENDING).delete()
+    if post.thumbnails:
+        thumbnails.delete(post)
+        post.thumbnails = ''
+        post.save(update_fields=['thumbnails', 'updated'])
+    if post.image:
+        return ImageJob.objects.create(post=post)
+    return None
+
+
+def requeue_stale():
+    """Возвращает в очередь задания, зависшие в состоянии «выполняется»
+    (воркер упал посреди обработки). Задания, исчерпавшие попытки,
+    помечаются неудачными: картинка, роняющая воркер, не должна
+    повторяться бесконечно."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.IMAGE_JOB_STALE_TIMEOUT
+    )
+    stale = ImageJob.objects.filter(
+        status=ImageJob.RUNNING,
+        started__lt=deadline
+    )
+    stale.filter(attempts__gte=settings.IMAGE_JOB_MAX_ATTEMPTS).update(
+        status=ImageJob.FAILED,
+        error='Обработка не завершилась за IMAGE_JOB_STALE_TIMEOUT.'
+    )
+    return stale.update(status=ImageJob.PENDING)
+
+
+def claim(limit):
+    """Забирает до limit заданий. Задание достаётся тому воркеру,
+    чей UPDATE ... WHERE status = 'pending' изменил строку, поэтому
+    несколько воркеров не обработают одну картинку дважды."""
+    claimed = []
+    pending = ImageJob.objects.filter(status=ImageJob.PENDING).values_list(
+        'pk',
+        flat=True
+    )
+    for pk in pending[:limit]:
+        updated = ImageJob.objects.filter(
+            pk=pk,
+            status=ImageJob.PENDING
+        ).update(
+            status=ImageJob.RUNNING,
+            started=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def prepare_original(post):
+    """Открывает оригинал, поворачивает его по EXIF и пересохраняет
+    без метаданных, уменьшив до POST_IMAGE_MAX_SIZE. Возвращает
+    обработанную картинку для построения миниатюр."""
+    storage = post.image.storage
+    with storage.open(post.image.name) as source:
+        image = Image.open(source)
+        image_format = image.format
+        if getattr(image, 'is_animated', False):
+            # Анимацию не пересохраняем: миниатюры строятся по первому
+            # кадру, оригинал остаётся как есть.
+            image.load()
+            return image
+        image = ImageOps.exif_transpose(image)
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    if image_format not in KEEP_FORMATS:
+        image_format = 'JPEG'
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    # Pillow переносит EXIF из info в сохраняемый файл для части
+    # форматов (PNG, WEBP), поэтому он убирается явно.
+    image.info.pop('exif', None)
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=90, optimize=True, progressive=True)
+    else:
+        image.save(buffer, image_format)
+
+    original = name = post.image.name
+    if image_format == 'JPEG' and not name.lower().endswith(('.jpg', '.jpeg')):
+        name = '{0}.jpg'.format(name.rsplit('.', 1)[0])
+    # Сначала новый файл и ссылка на него, потом удаление старого:
+    # сбой посреди обработки не оставит пост без картинки.
+    post.image.name = storage.save(name, ContentFile(buffer.getvalue()))
+    post.save(update_fields=['image', 'updated'])
+    if post.image.name != original:
+        storage.delete(original)
+    return image
+
+
+def process(job_id):
+    """Выполняет одно задание; возвращает его итоговое состояние."""
+    job = ImageJob.objects.select_related('post').filter(pk=job_id).first()
+    if job is None:
+        return None
+    try:
+        image = prepare_original(job.post)
+        thumbnails.generate(job.post, image)
+    except Exception as error:
+        # Любая ошибка Pillow или хранилища относится к заданию:
+        # исключение, ушедшее в пул процессов, остановило бы воркер
+        # и оставило задание в состоянии «выполняется».
+        if job.attempts < settings.IMAGE_JOB_MAX_ATTEMPTS:
+            status = ImageJob.PENDING
+        else:
+            status = ImageJob.FAILED
+        ImageJob.objects.filter(pk=job.pk).update(
+            status=status,
+            error=str(error) or error.__class__.__name__
+        )
+        return status
+    ImageJob.objects.filter(pk=job.pk).update(
+        status=ImageJob.DONE,
+        error=''
+    )
+    return ImageJob.DONE
+
+
+def run_pending(limit=None):
+    """Выполняет задания из очереди в текущем процессе (для тестов
+    и --processes 0), возвращает число обработанных заданий."""
+    done = 0
+    while limit is None or done < limit:
+        batch = claim(1)
+        if not batch:
+            break
+        process(batch[0])
+        done += 1
+    return done
@@ -0,0 +1,154 @@
+import multiprocessing
+
+import random
+
+import shutil
+
+import tempfile
+
+import time
+
+from django.conf import settings
+
+from django.core.cache import caches
+
+from django.core.management import call_command
+
+from django.core.management.base import BaseCommand
+
+from django.db import connections
+
+from django.test.utils import override_settings
+
+BACKENDS = ('locmem', 'file', 'db', 'tiered')
+
+
+def cache_settings(backend, location):
+    """CACHES для одного прогона; файловый кэш — во временном каталоге."""
+    backends = dict(settings.CACHE_BACKENDS)
+    backends['file'] = dict(backends['file'], LOCATION=location)
+    if backend != 'tiered':
+        return {'default': backends[backend]}
+    return {
+        'default': {
+            'BACKEND': 'yatube.cache.TieredCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_KEY_PREFIXES': ['bench_page:'],
+            },
+        },
+        'shared': backends['file'],
+    }
+
+
+def worker(conf, options, truth, results, seed):
+    """Имитирует чтение лент воркером gunicorn.
+
+    truth — настоящие версии лент в общей памяти: по ним видно, отдал
+    ли кэш страницу, которую другой воркер уже инвалидировал."""
+    rng = random.Random(seed)
+    feeds = options['feeds']
+    # Популярность лент по закону Ципфа: главная читается чаще групп.
+    weights = [1 / (rank + 1) for rank in range(feeds)]
+    reads = hits = stale = 0
+    with override_settings(CACHES=conf):
+        cache = caches['default']
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            feed = rng.choices(range(feeds), weights)[0]
+            gen_key = 'bench_gen:{0}'.format(feed)
+            if rng.random() < options['write_ratio']:
+                with truth.get_lock():
+                    truth[feed] += 1
+                cache.delete(gen_key)
+                continue
+            reads += 1
+            generation = cache.get(gen_key)
+            if generation is None:
+                cache.add(gen_key, '{0}-{1}'.format(seed, rng.random()), None)
+                generation = cache.get(gen_key)
+            page_key = 'bench_page:{0}:{1}'.format(feed, generation)
+            page = cache.get(page_key)
+            if page is None:
+                cache.set(page_key, {'version': truth[feed]}, 3600)
+            else:
+                hits += 1
+                if page['version'] < truth[feed]:
+                    stale += 1
+        elapsed = time.perf_counter() - started
+    results.put((reads, hits, stale, elapsed))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша при нескольких процессах-воркерах: '
+        'доля попаданий и доля устаревших страниц.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--feeds', type=int, default=50)
+        parser.add_argument('--write-ratio', type=float, default=0.02)
+        parser.add_argument(
+            '--backend',
+            action='append',
+            choices=BACKENDS,
+            help='Можно указать несколько раз; по умолчанию все.'
+        )
+
+    def run(self, backend, options):
+        location = tempfile.mkdtemp(prefix='bench_cache_')
+        conf = cache_settings(backend, location)
+        try:
+            if backend == 'db':
+                with override_settings(CACHES=conf):
+                    call_command('createcachetable')
+            connections.close_all()
+            truth = multiprocessing.Array('i', options['feeds'])
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(
+                    target=worker,
+                    args=(conf, options, truth, results, seed)
+                )
+                for seed in range(options['workers'])
+            ]
+            for process in processes:
+                process.start()
+            totals = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            if backend == 'db':
+                with override_settings(CACHES=conf):
+                    caches['default'].clear()
+        finally:
+            shutil.rmtree(location, ignore_errors=True)
+        reads = sum(result[0] for result in totals)
+        hits = sum(result[1] for result in totals)
+        stale = sum(result[2] for result in totals)
+        elapsed = max(result[3] for result in totals)
+        return {
+            'hit_ratio': hits / reads if reads else 0,
+            'stale_ratio': stale / reads if reads else 0,
+            'requests_per_second': (
+                options['workers'] * options['requests'] / elapsed
+            ),
+        }
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            '{0:<8} {1:>10} {2:>12} {3:>10}'.format(
+                'backend', 'hit ratio', 'stale ratio', 'req/s'
+            )
+        )
+        for backend in options['backend'] or BACKENDS:
+            result = self.run(backend, options)
+            self.stdout.write(
+                '{0:<8} {1:>10.1%} {2:>12.1%} {3:>10.0f}'.format(
+                    backend,
+                    result['hit_ratio'],
+                    result['stale_ratio'],
+                    result['requests_per_second']
+                )
+            )
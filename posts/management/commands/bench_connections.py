@@ -0,0 +1,178 @@
+import threading
+
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from django.db import connections
+
+from django.db.backends.signals import connection_created
+
+from django.test import Client
+from django.test import RequestFactory
+
+from django.urls import reverse
+
+from posts.management.commands.bench_feeds import percentile
+
+from posts.models import AuthorStats
+
+MODES = ('closed', 'persistent')
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self.lock:
+            self.value += 1
+
+
+def set_max_age(max_age):
+    """CONN_MAX_AGE для всех алиасов. Соединения потоков создаются
+    по тем же словарям настроек, поэтому новое значение действует
+    на все соединения, открытые после вызова."""
+    previous = {}
+    for alias in connections:
+        settings_dict = connections.databases[alias]
+        previous[alias] = settings_dict['CONN_MAX_AGE']
+        settings_dict['CONN_MAX_AGE'] = max_age
+    return previous
+
+
+def restore_max_age(previous):
+    for alias, max_age in previous.items():
+        connections.databases[alias]['CONN_MAX_AGE'] = max_age
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность при параллельных запросах залогиненного '
+        'пользователя через WSGI-обработчик: соединения закрываются '
+        'после каждого запроса (closed) или живут CONN_MAX_AGE '
+        '(persistent). Данные — seed_bench.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5,
+            help='Секунд на каждый режим.'
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=60,
+            help='CONN_MAX_AGE в режиме persistent.'
+        )
+        parser.add_argument(
+            '--mode',
+            action='append',
+            choices=MODES,
+            help='Можно указать несколько раз; по умолчанию все.'
+        )
+
+    def environ(self):
+        """WSGI-окружения запросов ленты подписок и профиля
+        пользователя с наибольшим числом подписок."""
+        stats = AuthorStats.objects.select_related('user').order_by(
+            '-following_count'
+        ).first()
+        if stats is None:
+            raise CommandError('Нет данных: сначала запустите seed_bench.')
+        client = Client()
+        client.force_login(stats.user)
+        cookie = '{0}={1}'.format(
+            'sessionid',
+            client.cookies['sessionid'].value
+        )
+        factory = RequestFactory()
+        return [
+            factory._base_environ(PATH_INFO=path, HTTP_COOKIE=cookie)
+            for path in (
+                reverse('follow_index'),
+                reverse('profile', args=[stats.user.username]),
+            )
+        ]
+
+    def run(self, handler, environs, options):
+        stop = threading.Event()
+        timings = []
+        errors = []
+        lock = threading.Lock()
+
+        def start_response(status, headers):
+            if not status.startswith('200'):
+                errors.append(status)
+
+        def worker(number):
+            local = []
+            while not stop.is_set():
+                environ = dict(environs[number % len(environs)])
+                started = time.perf_counter()
+                response = handler(environ, start_response)
+                b''.join(response)
+                # close() шлёт request_finished: Django закрывает
+                # соединения с истёкшим CONN_MAX_AGE.
+                response.close()
+                local.append((time.perf_counter() - started) * 1000)
+                number += 1
+            connections.close_all()
+            with lock:
+                timings.extend(local)
+
+        threads = [
+            threading.Thread(target=worker, args=(number,))
+            for number in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise CommandError('Ответ {0}'.format(errors[0]))
+        if not timings:
+            raise CommandError('Ни один запрос не завершился.')
+        return timings
+
+    def handle(self, *args, **options):
+        environs = self.environ()
+        connections.close_all()
+        handler = WSGIHandler()
+        opened = Counter()
+        connection_created.connect(opened)
+        self.stdout.write(
+            '{0:<11} {1:>9} {2:>8} {3:>8} {4:>12}'.format(
+                'mode', 'req/s', 'p50 ms', 'p99 ms', 'connections'
+            )
+        )
+        try:
+            for mode in options['mode'] or MODES:
+                previous = set_max_age(
+                    options['max_age'] if mode == 'persistent' else 0
+                )
+                opened.value = 0
+                try:
+                    timings = self.run(handler, environs, options)
+                finally:
+                    restore_max_age(previous)
+                self.stdout.write(
+                    '{0:<11} {1:>9.1f} {2:>8.2f} {3:>8.2f} {4:>12}'.format(
+                        mode,
+                        len(timings) / options['duration'],
+                        percentile(timings, 50),
+                        percentile(timings, 99),
+                        opened.value
+                    )
+                )
+        finally:
+            connection_created.disconnect(opened)
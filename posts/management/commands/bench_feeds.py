@@ -0,0 +1,277 @@
+import json
+
+import math
+
+import platform
+
+import random
+
+import resource
+
+import time
+
+import django
+
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from django.db import connection
+
+from django.db.models import Count
+
+from django.test import Client
+
+from django.urls import reverse
+
+from django.utils import timezone
+
+from posts import feed_cache
+
+from posts.models import AuthorStats
+from posts.models import Group
+from posts.models import Post
+
+from yatube.metrics import wrap_queries
+
+User = get_user_model()
+
+VIEWS = ('index', 'group_post', 'profile', 'post_view', 'follow_index')
+MODES = ('cold', 'warm')
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class QueryCounter:
+    """Счётчик запросов через execute_wrapper: в отличие от
+    CaptureQueriesContext не ограничен размером connection.queries."""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def max_rss_mb():
+    # На Linux ru_maxrss — в килобайтах.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def targets(count, rng):
+    """Адреса для каждой страницы: половина — самые популярные группы,
+    авторы и обсуждаемые посты, половина — случайные."""
+    half = max(count // 2, 1)
+
+    def mix(popular, everything):
+        chosen = list(popular[:half])
+        rest = [item for item in everything if item not in chosen]
+        chosen.extend(rng.sample(rest, min(count - len(chosen), len(rest))))
+        return chosen
+
+    slugs = list(Group.objects.annotate(
+        posts_total=Count('posts')
+    ).order_by('-posts_total').values_list('slug', flat=True))
+    authors = list(AuthorStats.objects.order_by(
+        '-posts_count'
+    ).values_list('user__username', flat=True))
+    posts = list(Post.objects.order_by('-comment_count').values_list(
+        'author__username',
+        'pk'
+    )[:count * 10])
+    return {
+        'index': [reverse('index')],
+        'group_post': [
+            reverse('group', args=[slug]) for slug in mix(slugs, slugs)
+        ],
+        'profile': [
+            reverse('profile', args=[username])
+            for username in mix(authors, authors)
+        ],
+        'post_view': [
+            reverse('post_view', args=[username, pk])
+            for username, pk in mix(posts, posts)
+        ],
+        'follow_index': [reverse('follow_index')],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест лент на текущей базе (данные — seed_bench): '
+        'p50/p99 времени ответа, число запросов к базе и пиковый RSS '
+        'для index, group_post, profile, post_view и follow_index. '
+        'Отчёт в JSON можно сравнить с прошлым прогоном (--compare). '
+        'Холодный режим сбрасывает поколения лент (feed_cache), '
+        'а весь кэш очищает только с --clear-cache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Запросов на страницу в каждом режиме.'
+        )
+        parser.add_argument(
+            '--urls',
+            type=int,
+            default=20,
+            help='Сколько разных групп, авторов и постов опрашивать.'
+        )
+        parser.add_argument(
+            '--view',
+            action='append',
+            choices=VIEWS,
+            help='Можно указать несколько раз; по умолчанию все.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear-cache',
+            action='store_true',
+            help=(
+                'Очищать кэш целиком перед каждым холодным запросом. '
+                'Только для отдельного стенда: кэш общий с сайтом '
+                '(ограничение частоты, замеры, поколения лент).'
+            )
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+        parser.add_argument(
+            '--compare',
+            help='JSON-отчёт прошлого прогона для сравнения.'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Допустимый рост p99 при сравнении (доля).'
+        )
+
+    def reader(self):
+        """Читатель ленты подписок с наибольшим числом подписок."""
+        stats = AuthorStats.objects.order_by('-following_count').first()
+        if stats is None or not stats.following_count:
+            raise CommandError('Нет подписок: сначала запустите seed_bench.')
+        return stats.user
+
+    def measure(self, client, urls, mode, requests, clear_cache=False):
+        timings = []
+        queries = []
+        for number in range(requests):
+            if mode == 'cold' and clear_cache:
+                cache.clear()
+            elif mode == 'cold':
+                feed_cache.bump(feed_cache.ALL)
+            url = urls[number % len(urls)]
+            counter = QueryCounter()
+            with wrap_queries(counter):
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError('{0}: ответ {1}'.format(
+                    url,
+                    response.status_code
+                ))
+            queries.append(counter.count)
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+        }
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        client = Client()
+        client.force_login(self.reader())
+        urls = targets(options['urls'], rng)
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+                'database': connection.vendor,
+                'cache': cache.__class__.__name__,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'requests': options['requests'],
+                'cold': 'clear' if options['clear_cache'] else 'feed_cache',
+            },
+            'views': {},
+        }
+        self.stdout.write('{0:<13} {1:<5} {2:>9} {3:>9} {4:>8} {5:>8}'.format(
+            'view', 'mode', 'p50 ms', 'p99 ms', 'queries', 'RSS MB'
+        ))
+        for view in options['view'] or VIEWS:
+            report['views'][view] = {}
+            for mode in MODES:
+                result = self.measure(
+                    client,
+                    urls[view],
+                    mode,
+                    options['requests'],
+                    options['clear_cache']
+                )
+                result['rss_mb'] = round(max_rss_mb(), 1)
+                report['views'][view][mode] = result
+                self.stdout.write(
+                    '{0:<13} {1:<5} {2:>9.2f} {3:>9.2f} {4:>8.1f} '
+                    '{5:>8.1f}'.format(
+                        view,
+                        mode,
+                        result['p50_ms'],
+                        result['p99_ms'],
+                        result['queries_mean'],
+                        result['rss_mb']
+                    )
+                )
+        if options['clear_cache']:
+            cache.clear()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(report, options['compare'], options['tolerance'])
+
+    def compare(self, report, path, tolerance):
+        """Сравнение с прошлым отчётом; рост p99 больше tolerance или
+        рост числа запросов — ошибка команды (для CI)."""
+        with open(path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        for view, modes in report['views'].items():
+            for mode, result in modes.items():
+                before = baseline['views'].get(view, {}).get(mode)
+                if before is None:
+                    continue
+                change = result['p99_ms'] / before['p99_ms'] - 1
+                self.stdout.write('{0:<13} {1:<5} p99 {2:+.0%}'.format(
+                    view,
+                    mode,
+                    change
+                ))
+                if change > tolerance:
+                    regressions.append('{0} {1}: p99 {2:+.0%}'.format(
+                        view,
+                        mode,
+                        change
+                    ))
+                if result['queries_max'] > before['queries_max']:
+                    regressions.append('{0} {1}: запросов {2} -> {3}'.format(
+                        view,
+                        mode,
+                        before['queries_max'],
+                        result['queries_max']
+                    ))
+        if regressions:
+            raise CommandError('Регрессии: ' + '; '.join(regressions))
@@ -0,0 +1,101 @@
+import random
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from django.db import connection
+
+from posts import search
+
+from posts.management.commands.bench_feeds import percentile
+from posts.management.commands.seed_bench import VOCABULARY
+
+from posts.models import Post
+
+# Запрос: слова из начала словаря seed_bench (частые), из хвоста
+# (редкие) и пара частое + редкое.
+QUERIES = ('frequent', 'rare', 'two_words')
+
+
+def make_queries(kind, count, rng):
+    head = VOCABULARY[:50]
+    tail = VOCABULARY[len(VOCABULARY) // 2:]
+    if kind == 'frequent':
+        return [rng.choice(head) for _ in range(count)]
+    if kind == 'rare':
+        return [rng.choice(tail) for _ in range(count)]
+    return [
+        '{0} {1}'.format(rng.choice(head), rng.choice(tail))
+        for _ in range(count)
+    ]
+
+
+def measure(function, queries):
+    timings = []
+    found = 0
+    for query in queries:
+        started = time.perf_counter()
+        found += len(function(query))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, found
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу (posts.search) с LIKE по тексту '
+        'постов на текущей базе (данные — seed_bench): p50/p99 времени '
+        'первой страницы результатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=20,
+            help='Запросов каждого вида.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if search.get_index(connection.vendor) is None:
+            raise CommandError(
+                'Для {0} нет индекса, сравнивать не с чем.'.format(
+                    connection.vendor
+                )
+            )
+        if not Post.objects.exists():
+            raise CommandError('Нет постов: сначала запустите seed_bench.')
+        rng = random.Random(options['seed'])
+        limit = 10
+        methods = {
+            'index': lambda query: search.search_ids(
+                query,
+                search.POST,
+                limit
+            ),
+            'like': lambda query: search.like_search(
+                search.terms(query),
+                search.POST,
+                limit,
+                0
+            ),
+        }
+        self.stdout.write('Постов: {0}'.format(Post.objects.count()))
+        self.stdout.write('{0:<10} {1:<6} {2:>9} {3:>9} {4:>7}'.format(
+            'query', 'method', 'p50 ms', 'p99 ms', 'found'
+        ))
+        for kind in QUERIES:
+            queries = make_queries(kind, options['queries'], rng)
+            for method, function in methods.items():
+                timings, found = measure(function, queries)
+                self.stdout.write(
+                    '{0:<10} {1:<6} {2:>9.2f} {3:>9.2f} {4:>7}'.format(
+                        kind,
+                        method,
+                        percentile(timings, 50),
+                        percentile(timings, 99),
+                        found
+                    )
+                )
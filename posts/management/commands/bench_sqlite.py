@@ -0,0 +1,190 @@
+import multiprocessing
+
+import os
+
+import random
+
+import sqlite3
+
+import tempfile
+
+import time
+
+from django.conf import settings
+
+from django.core.management.base import BaseCommand
+
+from yatube.sqlite.base import configure
+
+from posts.management.commands.bench_feeds import percentile
+
+# Режим: PRAGMA соединений. 'delete' — настройки SQLite по умолчанию.
+MODES = {
+    'delete': {'journal_mode': 'DELETE'},
+    'wal': settings.SQLITE_PRAGMAS,
+}
+TIMEOUT = 5
+
+
+def connect(path, pragmas, read_only=False):
+    if read_only:
+        path = 'file:{0}?mode=ro'.format(path)
+    connection = sqlite3.connect(
+        path,
+        timeout=TIMEOUT,
+        uri=True,
+        isolation_level=None
+    )
+    configure(connection, {
+        name: value for name, value in pragmas.items()
+        if not read_only or name != 'journal_mode'
+    })
+    return connection
+
+
+def create(path, pragmas, rows):
+    connection = connect(path, pragmas)
+    connection.execute(
+        'CREATE TABLE item (id INTEGER PRIMARY KEY, payload BLOB)'
+    )
+    connection.executemany(
+        'INSERT INTO item (payload) VALUES (?)',
+        ((os.urandom(256),) for _ in range(rows))
+    )
+    connection.close()
+
+
+def writer(path, pragmas, options, stop, results):
+    """Пишущий: транзакции по rows_per_write строк без пауз."""
+    connection = connect(path, pragmas)
+    commits = 0
+    while not stop.is_set():
+        connection.execute('BEGIN IMMEDIATE')
+        connection.executemany(
+            'INSERT INTO item (payload) VALUES (?)',
+            (
+                (os.urandom(256),)
+                for _ in range(options['rows_per_write'])
+            )
+        )
+        connection.execute('COMMIT')
+        commits += 1
+    connection.close()
+    results.put({'commits': commits})
+
+
+def reader(path, pragmas, options, stop, results):
+    """Читатель: короткие выборки по случайному диапазону ключей,
+    время каждой и число ошибок «database is locked»."""
+    connection = connect(path, pragmas, read_only=True)
+    durations = []
+    errors = 0
+    while not stop.is_set():
+        first = random.randint(1, options['rows'])
+        started = time.perf_counter()
+        try:
+            connection.execute(
+                'SELECT count(*), sum(length(payload)) FROM item '
+                'WHERE id BETWEEN ? AND ?',
+                (first, first + 100)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        durations.append((time.perf_counter() - started) * 1000)
+    connection.close()
+    results.put({'durations': durations, 'errors': errors})
+
+
+def run(mode, options):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite3')
+        pragmas = MODES[mode]
+        create(path, pragmas, options['rows'])
+        stop = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=reader,
+                args=(path, pragmas, options, stop, results)
+            )
+            for _ in range(options['readers'])
+        ]
+        if options['rows_per_write']:
+            processes.append(multiprocessing.Process(
+                target=writer,
+                args=(path, pragmas, options, stop, results)
+            ))
+        for process in processes:
+            process.start()
+        time.sleep(options['duration'])
+        stop.set()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    durations = sorted(
+        duration
+        for result in collected
+        for duration in result.get('durations', ())
+    )
+    reads = len(durations)
+    if not durations:
+        durations = [0]
+    return {
+        'mode': mode,
+        'reads': reads,
+        'p50_ms': percentile(durations, 50),
+        'p99_ms': percentile(durations, 99),
+        'max_ms': durations[-1],
+        'errors': sum(result.get('errors', 0) for result in collected),
+        'commits': sum(result.get('commits', 0) for result in collected),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: один пишущий и несколько читающих '
+        'процессов. Сравнивает журнал по умолчанию (DELETE) с WAL '
+        'и PRAGMA из SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5,
+            help='Секунд на каждый режим.'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=20000,
+            help='Строк в таблице до начала теста.'
+        )
+        parser.add_argument(
+            '--rows-per-write',
+            type=int,
+            default=500,
+            help='Строк в одной транзакции пишущего; 0 — без записи.'
+        )
+        parser.add_argument(
+            '--mode',
+            action='append',
+            choices=sorted(MODES),
+            help='Можно указать несколько раз; по умолчанию все.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            '{0:<8} {1:>8} {2:>8} {3:>8} {4:>9} {5:>7} {6:>8}'.format(
+                'mode', 'reads', 'p50 ms', 'p99 ms', 'max ms', 'locked',
+                'commits'
+            )
+        )
+        for mode in options['mode'] or ('delete', 'wal'):
+            result = run(mode, options)
+            self.stdout.write(
+                '{mode:<8} {reads:>8} {p50_ms:>8.2f} {p99_ms:>8.2f} '
+                '{max_ms:>9.2f} {errors:>7} {commits:>8}'.format(**result)
+            )
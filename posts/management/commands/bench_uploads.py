@@ -0,0 +1,148 @@
+import multiprocessing
+
+import resource
+
+import threading
+
+import time
+
+from io import BytesIO
+
+from django import forms
+
+from django.conf import global_settings
+
+from django.core.management.base import BaseCommand
+
+from django.test import RequestFactory
+
+from django.test.utils import override_settings
+
+from PIL import Image
+
+from posts.forms import PostForm
+
+from posts.models import Post
+
+MODES = ('default', 'streaming')
+
+
+class DefaultPostForm(forms.ModelForm):
+    class Meta:
+        model = Post
+        fields = ('text', 'group', 'image')
+
+
+def make_photo(megapixels):
+    """JPEG из шума: сжимается плохо, как настоящая фотография."""
+    height = int((megapixels * 1000000 * 3 / 4) ** 0.5)
+    width = height * 4 // 3
+    image = Image.effect_noise((width, height), 80).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def max_rss():
+    # На Linux ru_maxrss — в килобайтах.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def worker(mode, photo, options, results):
+    """Один прогон в отдельном процессе, чтобы пиковый RSS
+    не смешивался с другими режимами."""
+    if mode == 'default':
+        handlers = global_settings.FILE_UPLOAD_HANDLERS
+        form_class = DefaultPostForm
+    else:
+        handlers = ['posts.uploads.StreamingImageUploadHandler']
+        form_class = PostForm
+    factory = RequestFactory()
+    with override_settings(FILE_UPLOAD_HANDLERS=handlers):
+        requests = []
+        for number in range(options['uploads']):
+            upload = BytesIO(photo)
+            upload.name = 'photo{0}.jpg'.format(number)
+            requests.append(factory.post(
+                '/new/',
+                {'text': 'Тестовая загрузка', 'image': upload}
+            ))
+        baseline = max_rss()
+        valid = []
+        lock = threading.Lock()
+        semaphore = threading.Semaphore(options['concurrency'])
+
+        def handle(request):
+            with semaphore:
+                form = form_class(request.POST, request.FILES)
+                is_valid = form.is_valid()
+                for upload in request.FILES.values():
+                    upload.close()
+                with lock:
+                    valid.append(is_valid)
+
+        threads = [
+            threading.Thread(target=handle, args=(request,))
+            for request in requests
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    results.put({
+        'mode': mode,
+        'peak_rss_growth': max_rss() - baseline,
+        'valid': sum(valid),
+        'elapsed': elapsed,
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает прирост пикового RSS при одновременной обработке '
+        'больших загрузок стандартными обработчиками Django '
+        'и потоковыми (posts.uploads).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=20)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument(
+            '--megapixels',
+            type=float,
+            default=12,
+            help='Размер тестовой фотографии.'
+        )
+        parser.add_argument(
+            '--mode',
+            action='append',
+            choices=MODES,
+            help='Можно указать несколько раз; по умолчанию все.'
+        )
+
+    def handle(self, *args, **options):
+        photo = make_photo(options['megapixels'])
+        self.stdout.write('Фотография: {0:.1f} МБ, загрузок: {1}'.format(
+            len(photo) / 2 ** 20,
+            options['uploads']
+        ))
+        self.stdout.write('{0:<10} {1:>14} {2:>7} {3:>9}'.format(
+            'mode', 'RSS growth MB', 'valid', 'seconds'
+        ))
+        for mode in options['mode'] or MODES:
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=worker,
+                args=(mode, photo, options, results)
+            )
+            process.start()
+            result = results.get()
+            process.join()
+            self.stdout.write('{0:<10} {1:>14.1f} {2:>7} {3:>9.2f}'.format(
+                result['mode'],
+                result['peak_rss_growth'] / 2 ** 20,
+                result['valid'],
+                result['elapsed']
+            ))
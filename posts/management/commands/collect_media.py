@@ -0,0 +1,98 @@
+import time
+
+from django.core.files.storage import default_storage
+
+from django.core.management.base import BaseCommand
+
+from django.template.defaultfilters import filesizeformat
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет осиротевшие оригиналы картинок и миниатюры (включая '
+        'старый кэш sorl-thumbnail) и печатает занятое место по авторам '
+        'и группам. Работает пачками, подходит для запуска по cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько файлов проверять одним запросом.'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе стольких секунд.'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Пауза в секундах между пачками.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не удалять.'
+        )
+        parser.add_argument(
+            '--usage',
+            action='store_true',
+            help='Напечатать место, занятое картинками авторов и групп.'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Сколько авторов и групп показывать в --usage.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Повторять уборку каждые столько секунд (0 — один раз).'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.collect(options)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        if options['usage']:
+            self.usage(options)
+
+    def collect(self, options):
+        report = media.collect(
+            default_storage,
+            batch_size=options['batch_size'],
+            min_age=options['min_age'],
+            pause=options['pause'],
+            dry_run=options['dry_run']
+        )
+        verb = 'Можно удалить' if options['dry_run'] else 'Удалено'
+        for area, (deleted, freed) in report.items():
+            self.stdout.write('{0} ({1}): {2} файлов, {3}'.format(
+                verb,
+                area,
+                deleted,
+                filesizeformat(freed)
+            ))
+
+    def usage(self, options):
+        by_author, by_group = media.usage(
+            default_storage,
+            options['batch_size']
+        )
+        for title, counter in (('Авторы', by_author), ('Группы', by_group)):
+            self.stdout.write(title + ':')
+            for name, size in counter.most_common(options['top']):
+                self.stdout.write('  {0:<30} {1:>12}'.format(
+                    name,
+                    filesizeformat(size)
+                ))
@@ -0,0 +1,131 @@
+import re
+
+from django.conf import settings
+
+from django.core.cache import cache
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from django.test import Client
+
+from django.urls import reverse
+
+from posts.models import Post
+
+from yatube import assets
+
+
+def body(response):
+    if response.streaming:
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+    return response.content
+
+
+def saved(raw, compressed):
+    if not raw or compressed is None:
+        return '-'
+    return '{0:.0%}'.format(1 - compressed / raw)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сколько байт экономит сжатие: размер страниц лент, поста и API '
+        'без сжатия и с gzip, размер статики из base.html без сжатия, '
+        'с gzip и brotli и её заголовок Cache-Control. Статика — '
+        'после collectstatic.'
+    )
+
+    def pages(self):
+        post = Post.objects.select_related('author', 'group').filter(
+            group__isnull=False
+        ).order_by('-pub_date').first()
+        if post is None:
+            raise CommandError('Нет данных: сначала запустите seed_bench.')
+        return [
+            ('index', reverse('index')),
+            ('group', reverse('group', args=[post.group.slug])),
+            ('profile', reverse('profile', args=[post.author.username])),
+            ('post_view', reverse(
+                'post_view',
+                args=[post.author.username, post.pk]
+            )),
+            ('api_index', reverse('api_index')),
+        ]
+
+    def fetch(self, client, url, encoding=''):
+        response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+        if response.status_code != 200:
+            raise CommandError('{0}: ответ {1}'.format(
+                url,
+                response.status_code
+            ))
+        return response, body(response)
+
+    def handle(self, *args, **options):
+        cache.clear()
+        client = Client()
+        self.stdout.write('{0:<44} {1:>9} {2:>9} {3:>6}'.format(
+            'page', 'bytes', 'gzip', 'saved'
+        ))
+        total_raw = total_gzip = 0
+        html = ''
+        for name, url in self.pages():
+            _, raw = self.fetch(client, url)
+            response, compressed = self.fetch(client, url, 'gzip')
+            if response.get('Content-Encoding') != 'gzip':
+                compressed = raw
+            if name == 'index':
+                html = raw.decode()
+            total_raw += len(raw)
+            total_gzip += len(compressed)
+            self.stdout.write('{0:<44} {1:>9} {2:>9} {3:>6}'.format(
+                url[:44],
+                len(raw),
+                len(compressed),
+                saved(len(raw), len(compressed))
+            ))
+        self.stdout.write('{0:<44} {1:>9} {2:>9} {3:>6}'.format(
+            'total',
+            total_raw,
+            total_gzip,
+            saved(total_raw, total_gzip)
+        ))
+
+        self.stdout.write('')
+        self.stdout.write(
+            '{0:<44} {1:>9} {2:>9} {3:>9} {4:>6}  {5}'.format(
+                'static', 'bytes', 'gzip', 'br', 'saved', 'cache-control'
+            )
+        )
+        urls = re.findall(
+            r'(?:href|src)="({0}[^"]+)"'.format(
+                re.escape(settings.STATIC_URL)
+            ),
+            html
+        )
+        encodings = [encoding for encoding, _, _ in assets.encodings()]
+        for url in urls:
+            response = client.get(url)
+            if response.status_code != 200:
+                self.stdout.write('{0:<44} нет в STATIC_ROOT'.format(url[:44]))
+                continue
+            raw = len(body(response))
+            sizes = {}
+            for encoding in encodings:
+                encoded = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                if encoded.get('Content-Encoding') == encoding:
+                    sizes[encoding] = len(body(encoded))
+            best = min(sizes.values()) if sizes else None
+            self.stdout.write(
+                '{0:<44} {1:>9} {2:>9} {3:>9} {4:>6}  {5}'.format(
+                    url[-44:],
+                    raw,
+                    sizes.get('gzip', '-'),
+                    sizes.get('br', '-'),
+                    saved(raw, best),
+                    response.get('Cache-Control', '')
+                )
+            )
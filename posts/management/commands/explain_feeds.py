@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from django.db import connection
+
+from posts import timeline
+
+from posts.models import Group
+from posts.models import Post
+
+from posts.paginator import CursorPaginator
+
+from yatube.settings import POSTS_LIMIT
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает план выполнения (EXPLAIN QUERY PLAN в SQLite, '
+        'EXPLAIN в PostgreSQL) для запросов лент.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='Автор для профиля и читатель для ленты подписок.'
+        )
+        parser.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='EXPLAIN ANALYZE (только PostgreSQL).'
+        )
+
+    def get_paginators(self, options):
+        user = User.objects.order_by('pk').first()
+        group = Group.objects.order_by('pk').first()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    'Пользователь {0} не найден'.format(options['username'])
+                )
+        if options['group']:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(
+                    'Группа {0} не найдена'.format(options['group'])
+                )
+        feeds = {'index': Post.objects.for_feed()}
+        if group is not None:
+            feeds['group_post'] = group.posts.for_feed()
+        if user is not None:
+            feeds['profile'] = user.posts.for_feed()
+        feeds = {
+            name: CursorPaginator(queryset, POSTS_LIMIT)
+            for name, queryset in feeds.items()
+        }
+        if user is not None:
+            feeds['follow_index'] = timeline.follow_paginator(
+                user,
+                POSTS_LIMIT
+            )
+        return feeds
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError(
+                    '--analyze поддерживается только PostgreSQL'
+                )
+            explain_options['analyze'] = True
+
+        for name, paginator in self.get_paginators(options).items():
+            pages = {'первая страница': None}
+            first_page = paginator.get_page()
+            if first_page.has_next():
+                pages['следующая страница'] = first_page.next_cursor
+            for title, cursor in pages.items():
+                page_queryset, _ = paginator.page_queryset(cursor)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    '{0} ({1}, {2}):'.format(name, title, connection.vendor)
+                ))
+                self.stdout.write(str(page_queryset.query))
+                self.stdout.write(page_queryset.explain(**explain_options))
+                self.stdout.write('')
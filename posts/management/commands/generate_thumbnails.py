@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для постов с картинкой, у которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить миниатюры всех постов (после смены размеров).'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            posts = posts.filter(thumbnails='')
+        done = failed = 0
+        sizes = {}
+        for post in posts.iterator():
+            try:
+                thumbnails.generate(post)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write('Пост {0}: {1}'.format(post.pk, error))
+            else:
+                done += 1
+                storage = post.image.storage
+                for image_format, names in post.thumbnail_variants().items():
+                    sizes[image_format] = sizes.get(image_format, 0) + sum(
+                        storage.size(name) for name in names.values()
+                    )
+        self.stdout.write(self.style.SUCCESS(
+            'Готово: {0}, с ошибками: {1}'.format(done, failed)
+        ))
+        # Объём миниатюр по форматам: сколько трафика экономят
+        # WebP и AVIF по сравнению с JPEG.
+        jpeg = sizes.get('jpeg')
+        for image_format, size in sizes.items():
+            self.stdout.write('{0:<5} {1:>10.1f} КБ{2}'.format(
+                image_format,
+                size / 1024,
+                ' ({0:.0%} от JPEG)'.format(size / jpeg) if jpeg else ''
+            ))
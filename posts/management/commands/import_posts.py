@@ -0,0 +1,48 @@
+import sys
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты, комментарии и подписки из JSON Lines '
+        '(формат — в posts/transfer.py) пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл JSONL; «-» — читать из stdin.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько записей сохранять в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        importer = transfer.Importer(options['batch_size'])
+        try:
+            if options['path'] == '-':
+                counts = importer.run(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as lines:
+                    counts = importer.run(lines)
+        except (OSError, transfer.TransferError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено за {0:.1f} с: {1}'.format(
+                time.perf_counter() - started,
+                ', '.join(
+                    '{0}: {1}'.format(record_type, count)
+                    for record_type, count in counts.items()
+                )
+            )
+        ))
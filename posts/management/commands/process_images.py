@@ -0,0 +1,96 @@
+import multiprocessing
+
+import os
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from django.db import connections
+
+from posts import image_jobs
+
+from posts.models import ImageJob
+
+
+def _close_connections():
+    # Дочерний процесс не должен пользоваться соединением с базой,
+    # унаследованным от родителя при fork.
+    connections.close_all()
+
+
+def _process(job_id):
+    try:
+        return image_jobs.process(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди картинок: очищает EXIF, уменьшает оригиналы '
+        'и строит миниатюры в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help=(
+                'Размер пула процессов; 0 — обработать очередь '
+                'в текущем процессе и выйти.'
+            )
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Сколько заданий забирать из очереди за раз.'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Пауза в секундах, когда очередь пуста.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes <= 0:
+            image_jobs.requeue_stale()
+            done = image_jobs.run_pending()
+            self.stdout.write(self.style.SUCCESS(
+                'Обработано заданий: {0}'.format(done)
+            ))
+            return
+
+        connections.close_all()
+        pool = multiprocessing.Pool(processes, initializer=_close_connections)
+        done = 0
+        try:
+            while True:
+                image_jobs.requeue_stale()
+                batch = image_jobs.claim(options['batch_size'])
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                for status in pool.imap_unordered(_process, batch):
+                    done += 1
+                    if status == ImageJob.FAILED:
+                        self.stderr.write('Задание завершилось с ошибкой')
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.close()
+            pool.join()
+        self.stdout.write(self.style.SUCCESS(
+            'Обработано заданий: {0}'.format(done)
+        ))
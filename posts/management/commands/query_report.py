@@ -0,0 +1,95 @@
+import json
+
+from django.conf import settings
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+KINDS = ('slow', 'n+1')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала запросов (yatube.metrics): медленные запросы '
+        'и кандидаты в N+1, сгруппированные по представлению и форме SQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            default=settings.QUERY_LOG_FILE,
+            help='Файл журнала; по умолчанию QUERY_LOG_FILE.'
+        )
+        parser.add_argument('--kind', choices=KINDS)
+        parser.add_argument('--view', help='Только это представление.')
+        parser.add_argument('--top', type=int, default=20)
+
+    def read(self, options):
+        """Группы (вид, представление, SQL) -> сводка; журнал читается
+        построчно."""
+        groups = {}
+        try:
+            log = open(options['log'], encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        with log:
+            for line in log:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if options['kind'] and event['kind'] != options['kind']:
+                    continue
+                if options['view'] and event['view'] != options['view']:
+                    continue
+                key = (event['kind'], event['view'], event['sql'])
+                group = groups.setdefault(key, {
+                    'events': 0,
+                    'max_count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'origins': set(),
+                })
+                group['events'] += 1
+                group['max_count'] = max(group['max_count'], event['count'])
+                milliseconds = event.get('ms', 0)
+                group['total_ms'] += milliseconds
+                group['max_ms'] = max(group['max_ms'], milliseconds)
+                group['origins'].add(' / '.join(filter(
+                    None,
+                    (event['template'], event['code'])
+                )))
+        return groups
+
+    def handle(self, *args, **options):
+        groups = self.read(options)
+        if not groups:
+            self.stdout.write('Журнал пуст.')
+            return
+        # N+1 — по числу повторов за запрос, медленные — по общему
+        # времени: сверху то, что обходится дороже всего.
+        ordered = sorted(
+            groups.items(),
+            key=lambda item: (
+                item[1]['events'] * item[1]['max_count']
+                if item[0][0] == 'n+1' else item[1]['total_ms']
+            ),
+            reverse=True
+        )
+        for (kind, view, sql), group in ordered[:options['top']]:
+            if kind == 'n+1':
+                summary = '{0} запросов, до {1} повторов за запрос'.format(
+                    group['events'],
+                    group['max_count']
+                )
+            else:
+                summary = '{0} раз, среднее {1:.1f} мс, максимум {2:.1f} мс'
+                summary = summary.format(
+                    group['events'],
+                    group['total_ms'] / group['events'],
+                    group['max_ms']
+                )
+            self.stdout.write('[{0}] {1}: {2}'.format(kind, view, summary))
+            self.stdout.write('    ' + sql[:300])
+            for origin in sorted(group['origins']):
+                self.stdout.write('    <- ' + origin)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from django.db import connection
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит поисковый индекс (posts.search) заново по всем постам, '
+        'комментариям и группам.'
+    )
+
+    def handle(self, *args, **options):
+        if search.get_index(connection.vendor) is None:
+            self.stdout.write(
+                'Для {0} индекса нет, поиск идёт через LIKE.'.format(
+                    connection.vendor
+                )
+            )
+            return
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Индекс построен.'))
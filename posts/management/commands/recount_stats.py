@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики AuthorStats '
+        'и Post.comment_count, исправляя расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей или постов читать за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        comments_fixed = stats.recount_comments(options['batch_size'])
+        authors_fixed = stats.recount_authors(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Исправлено постов: {0}, авторов: {1}'.format(
+                comments_fixed,
+                authors_fixed
+            )
+        ))
@@ -0,0 +1,169 @@
+import itertools
+
+import random
+
+from datetime import timedelta
+
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+
+from django.core.files.storage import default_storage
+
+from django.core.management.base import BaseCommand
+
+from django.utils import timezone
+
+from PIL import Image
+
+from posts import transfer
+
+USERNAME = 'bench_user_{0}'
+GROUP_SLUG = 'bench-group-{0}'
+
+# Словарь для текстов постов: слова из двух и трёх слогов, частоты
+# слов тоже подчиняются закону Ципфа — есть и частые, и редкие.
+SYLLABLES = (
+    'ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ла', 'ме', 'но',
+    'пу', 'ро', 'са', 'ти', 'ху', 'це', 'ша', 'ка', 'ле', 'мо',
+)
+VOCABULARY = [
+    ''.join(parts)
+    for length in (2, 3)
+    for parts in itertools.product(SYLLABLES, repeat=length)
+]
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса закона Ципфа: элемент ранга r выбирается
+    с вероятностью ~ 1 / r ** exponent."""
+    return list(itertools.accumulate(
+        1 / (rank + 1) ** exponent for rank in range(count)
+    ))
+
+
+def make_image(rng):
+    buffer = BytesIO()
+    color = tuple(rng.randrange(256) for _ in range(3))
+    Image.new('RGB', (64, 48), color=color).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue())
+
+
+def records(options):
+    """Записи для posts.transfer: популярность авторов и групп
+    подчиняется закону Ципфа, число комментариев — распределению
+    Парето, подписки чаще всего ведут на популярных авторов."""
+    rng = random.Random(options['seed'])
+    users = options['users']
+    groups = options['groups']
+    posts = options['posts']
+    author_weights = zipf_weights(users, options['skew'])
+    group_weights = zipf_weights(groups, options['skew'])
+    word_weights = zipf_weights(len(VOCABULARY), 1.0)
+
+    for number in range(groups):
+        yield {
+            'type': 'group',
+            'slug': GROUP_SLUG.format(number),
+            'title': 'Группа {0}'.format(number),
+            'description': 'Группа для нагрузочных тестов',
+        }
+
+    started = timezone.now() - timedelta(days=365)
+    step = timedelta(days=365) / posts
+    for number in range(posts):
+        author = rng.choices(range(users), cum_weights=author_weights)[0]
+        group = None
+        if rng.random() < options['group_ratio']:
+            group = GROUP_SLUG.format(
+                rng.choices(range(groups), cum_weights=group_weights)[0]
+            )
+        image = None
+        if rng.random() < options['image_ratio']:
+            image = default_storage.save(
+                'posts/bench_{0}.jpg'.format(number),
+                make_image(rng)
+            )
+        pub_date = started + step * number
+        yield {
+            'type': 'post',
+            'id': number,
+            'author': USERNAME.format(author),
+            'group': group,
+            'text': 'Пост {0} для нагрузочного теста. '.format(number) * (
+                1 + rng.randrange(10)
+            ) + ' '.join(rng.choices(
+                VOCABULARY,
+                cum_weights=word_weights,
+                k=5 + rng.randrange(20)
+            )),
+            'pub_date': pub_date.isoformat(),
+            'image': image,
+        }
+        comments = min(int(rng.paretovariate(1.2)) - 1, 300)
+        for _ in range(comments):
+            yield {
+                'type': 'comment',
+                'post': number,
+                'author': USERNAME.format(rng.randrange(users)),
+                'text': 'Комментарий',
+                'created': pub_date.isoformat(),
+            }
+
+    for user in range(users):
+        following = min(int(rng.paretovariate(1.0)), users - 1)
+        authors = set(rng.choices(
+            range(users),
+            cum_weights=author_weights,
+            k=following
+        )) - {user}
+        for author in authors:
+            yield {
+                'type': 'follow',
+                'user': USERNAME.format(user),
+                'author': USERNAME.format(author),
+            }
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт данные для нагрузочных тестов лент (bench_feeds): '
+        'авторы и группы с популярностью по закону Ципфа, посты '
+        'с картинками и длинными ветками комментариев, подписки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--users',
+            type=int,
+            help='По умолчанию — один автор на 20 постов.'
+        )
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Показатель закона Ципфа для авторов и групп.'
+        )
+        parser.add_argument('--group-ratio', type=float, default=0.7)
+        parser.add_argument('--image-ratio', type=float, default=0.05)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['users'] is None:
+            options['users'] = max(options['posts'] // 20, 2)
+        counts = transfer.Importer(options['batch_size']).load(
+            records(options)
+        )
+        self.stdout.write(self.style.SUCCESS('Создано: {0}'.format(
+            ', '.join(
+                '{0}: {1}'.format(record_type, count)
+                for record_type, count in counts.items()
+            )
+        )))
+        if counts['post'] and options['image_ratio']:
+            self.stdout.write(
+                'Миниатюры строит воркер: manage.py process_images --once'
+            )
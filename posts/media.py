@@ -0,0 +1,182 @@
+"""Уборка осиротевших файлов и учёт места в media/.
+
+Оригиналы картинок (posts/), миниатюры (posts/thumbs/) и старый кэш
+sorl-thumbnail (cache/) обходятся пачками: на пачку оригиналов — один
+короткий SELECT по индексу, на пачку миниатюр — SELECT постов, чьи
+картинки могли их породить (по имени оригинала в имени миниатюры),
+с проверкой по их Post.thumbnails. Всё без транзакций и блокировок
+таблиц, поэтому уборку можно запускать на работающем сервере
+(например, из cron: `manage.py collect_media --pause 0.1`). Свежие
+файлы не трогаются: картинка сохраняется в хранилище раньше, чем пост
+в базе, а миниатюры пишет фоновый воркер.
+"""
+import os
+
+import re
+
+import time
+
+from collections import Counter
+
+from datetime import timedelta
+
+from django.conf import settings
+
+from django.core.exceptions import SuspiciousFileOperation
+
+from django.db.models import Q
+
+from django.utils import timezone
+
+from posts.models import Post
+from posts.thumbnails import THUMBNAILS_DIR
+
+ORIGINALS_DIR = Post._meta.get_field('image').upload_to.rstrip('/')
+
+SIZE_RE = re.compile(r'_\d+x\d+')
+
+
+def delete_files(storage, names):
+    """Удаляет файлы, пропуская пути вне хранилища (в базе могут
+    оказаться имена, записанные в обход формы)."""
+    for name in names:
+        try:
+            storage.delete(name)
+        except (SuspiciousFileOperation, OSError):
+            pass
+
+
+def walk(storage, path, recursive=True):
+    """Имена файлов в каталоге хранилища, без загрузки всего
+    списка поддерева в память."""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield '{0}/{1}'.format(path, name)
+    if recursive:
+        for directory in directories:
+            yield from walk(storage, '{0}/{1}'.format(path, directory))
+
+
+def batches(names, batch_size):
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def referenced_originals(batch):
+    return set(Post.objects.filter(image__in=batch).values_list(
+        'image',
+        flat=True
+    ))
+
+
+def thumbnail_stems(name):
+    """Возможные имена оригинала без расширения для файла миниатюры
+    <имя>_<ширина>x<высота>[_<суффикс>].<расширение>: суффикс
+    дописывает хранилище к совпавшему имени (cat.png и cat.jpg дают
+    cat_960x339.webp и cat_960x339_AbC1234.webp), а в самом имени
+    оригинала тоже может встретиться _<число>x<число>."""
+    base = os.path.basename(name)
+    return {base[:match.start()] for match in SIZE_RE.finditer(base)}
+
+
+def referenced_thumbnails(batch):
+    """Имена из пачки, которые есть в Post.thumbnails. Читаются только
+    посты с картинкой posts/<имя>.* для имён из пачки."""
+    stems = sorted(set().union(*map(thumbnail_stems, batch)))
+    names = set()
+    # Старые SQLite принимают не больше 999 параметров.
+    for start in range(0, len(stems), 500):
+        condition = Q()
+        for stem in stems[start:start + 500]:
+            condition |= Q(image__startswith='{0}/{1}.'.format(
+                ORIGINALS_DIR,
+                stem
+            ))
+        posts = Post.objects.filter(condition).exclude(
+            thumbnails=''
+        ).order_by().values_list('thumbnails', flat=True)
+        for thumbnails in posts:
+            names.update(Post(thumbnails=thumbnails).thumbnail_names())
+    return names & set(batch)
+
+
+def sorl_prefix():
+    from sorl.thumbnail.conf import settings as sorl_settings
+    return sorl_settings.THUMBNAIL_PREFIX.rstrip('/')
+
+
+def collect(storage, batch_size=500, min_age=3600, pause=0, dry_run=False):
+    """Удаляет осиротевшие файлы; возвращает {область: (файлов, байт)}.
+
+    Миниатюры sorl-thumbnail больше ничем не показываются, поэтому
+    его кэш удаляется целиком, а хранилище ключей sorl очищается."""
+    deadline = timezone.now() - timedelta(seconds=min_age)
+    areas = (
+        ('originals', walk(storage, ORIGINALS_DIR, recursive=False),
+         referenced_originals),
+        ('thumbnails', walk(storage, THUMBNAILS_DIR), referenced_thumbnails),
+        ('sorl', walk(storage, sorl_prefix()), lambda batch: set()),
+    )
+    report = {}
+    for area, names, referenced in areas:
+        deleted = freed = 0
+        for batch in batches(names, batch_size):
+            orphans = [
+                name for name in set(batch) - referenced(batch)
+                if storage.get_modified_time(name) < deadline
+            ]
+            for name in orphans:
+                freed += storage.size(name)
+            if not dry_run:
+                delete_files(storage, orphans)
+            deleted += len(orphans)
+            if pause:
+                time.sleep(pause)
+        report[area] = (deleted, freed)
+    if not dry_run and 'sorl.thumbnail' in settings.INSTALLED_APPS:
+        from sorl.thumbnail import default
+        default.kvstore.clear()
+    return report
+
+
+def file_size(storage, name):
+    try:
+        return storage.size(name)
+    except (SuspiciousFileOperation, OSError):
+        return 0
+
+
+def usage(storage, batch_size=500):
+    """Место, занятое картинками и миниатюрами, по авторам и группам:
+    два Counter, {username: байт} и {slug: байт}."""
+    by_author = Counter()
+    by_group = Counter()
+    posts = Post.objects.exclude(image='').exclude(
+        image__isnull=True
+    ).values_list(
+        'pk',
+        'image',
+        'thumbnails',
+        'author__username',
+        'group__slug'
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return by_author, by_group
+        last_pk = batch[-1][0]
+        for _, image, thumbnails, username, slug in batch:
+            names = [image] + Post(thumbnails=thumbnails).thumbnail_names()
+            size = sum(file_size(storage, name) for name in names)
+            by_author[username] += size
+            if slug is not None:
+                by_group[slug] += size
@@ -0,0 +1,98 @@
+import hashlib
+
+from django.conf import settings
+
+from django.core.cache import cache
+
+from django.urls import Resolver404
+from django.urls import resolve
+
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+
+from django.utils.http import http_date
+
+from posts import feed_cache
+
+PAGE_PREFIX = 'anon_page'
+
+
+def page_scopes(url_name, kwargs):
+    """Области feed_cache, от которых зависит страница;
+    None — страница не кэшируется."""
+    if url_name == 'index':
+        return (feed_cache.INDEX,)
+    if url_name == 'group':
+        return (feed_cache.group_scope(kwargs['slug']),)
+    if url_name == 'profile':
+        return (feed_cache.author_scope(kwargs['username']),)
+    if url_name in ('post_view', 'post_comments'):
+        return (
+            feed_cache.post_scope(kwargs['post_id']),
+            feed_cache.author_scope(kwargs['username']),
+        )
+    return None
+
+
+def page_etag(full_path, tokens):
+    """ETag страницы: адрес (с параметрами) и поколения её областей."""
+    return '"{0}"'.format(hashlib.md5(
+        '{0}|{1}'.format(full_path, '|'.join(tokens)).encode()
+    ).hexdigest())
+
+
+class AnonymousPageCacheMiddleware:
+    """Полностраничный кэш для анонимных GET-запросов к лентам и постам.
+
+    Ответ хранится под ключом из пути и поколений feed_cache, поэтому
+    сигналы постов, комментариев и подписок сбрасывают его так же, как
+    кэш лент. ETag и Last-Modified строятся из тех же поколений, так что
+    и попадание в кэш, и ответ 304 обходятся без запросов к базе.
+    Запросы с сессионной кукой проходят мимо: для них страница может
+    зависеть от пользователя."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        scopes = self.get_scopes(request)
+        if scopes is None:
+            return self.get_response(request)
+
+        tokens = feed_cache.generations(*scopes)
+        etag = page_etag(request.get_full_path(), tokens)
+        last_modified = feed_cache.last_modified(tokens)
+
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+        key = '{0}:{1}'.format(PAGE_PREFIX, etag.strip('"'))
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+        response = self.get_response(request)
+        if response.status_code != 200 or response.streaming:
+            return response
+        if response.cookies:
+            return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+        cache.set(key, response, settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        return response
+
+    def get_scopes(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return page_scopes(match.url_name, match.kwargs)
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, default='', editable=False, help_text='JSON: ширина миниатюры -> имя файла в хранилище', verbose_name='Миниатюры картинки'),
+        ),
+    ]
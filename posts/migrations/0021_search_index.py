@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db import migrations
+
+# Копия схемы индекса posts.search на момент миграции: миграция не
+# зависит от живого модуля и не меняется вместе с ним.
+TABLE = 'posts_search'
+# Вид -> (модель, столбец текста, номер вида в id строки индекса).
+SOURCES = (
+    ('Post', 'text', 0),
+    ('Comment', 'text', 1),
+    ('Group', 'title', 2),
+)
+KINDS = len(SOURCES)
+
+
+def create_sqlite(cursor, sources):
+    cursor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5('
+        "text, tokenize = 'unicode61 remove_diacritics 2')".format(TABLE)
+    )
+    for table, column, kind in sources:
+        cursor.execute(
+            'INSERT OR REPLACE INTO {0} (rowid, text) '
+            'SELECT id * %s + %s, {2} FROM {1}'.format(TABLE, table, column),
+            [KINDS, kind]
+        )
+
+
+def create_postgresql(cursor, sources):
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS {0} ('
+        'id bigint PRIMARY KEY, '
+        'kind smallint NOT NULL, '
+        'document tsvector NOT NULL)'.format(TABLE)
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS {0}_document_idx '
+        'ON {0} USING gin (document)'.format(TABLE)
+    )
+    for table, column, kind in sources:
+        cursor.execute(
+            'INSERT INTO {0} (id, kind, document) '
+            'SELECT id * %s + %s, %s, to_tsvector(%s, {2}) FROM {1} '
+            'ON CONFLICT (id) DO UPDATE '
+            'SET document = EXCLUDED.document'.format(TABLE, table, column),
+            [KINDS, kind, kind, settings.SEARCH_POSTGRES_CONFIG]
+        )
+
+
+CREATE = {
+    'sqlite': create_sqlite,
+    'postgresql': create_postgresql,
+}
+
+
+def create_index(apps, schema_editor):
+    # В других базах индекса нет, поиск идёт через LIKE.
+    create = CREATE.get(schema_editor.connection.vendor)
+    if create is None:
+        return
+    sources = [
+        (apps.get_model('posts', model)._meta.db_table, column, kind)
+        for model, column, kind in SOURCES
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(TABLE))
+        create(cursor, sources)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in CREATE:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_image_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
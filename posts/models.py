@@ -1,3 +1,7 @@
+import json
+
+from django.conf import settings
+
 from django.contrib.auth import get_user_model
 
 from django.db import models
@@ -5,6 +9,13 @@ from django.db import models
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа подгружаются одним JOIN,
+        число комментариев хранится в самом посте (comment_count)."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст сообщения',
@@ -14,6 +25,10 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -35,13 +50,101 @@ class Post(models.Model):
         null=True,
         help_text='Вставьте картинку для своего сообщения'
     )
+    comment_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    thumbnails = models.TextField(
+        verbose_name='Миниатюры картинки',
+        help_text='JSON: ширина миниатюры -> имя файла в хранилище',
+        blank=True,
+        default='',
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Индексы повторяют сортировку курсорного паджинатора
+        # (-pub_date, -id) для главной, группы и профиля.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def thumbnail_variants(self):
+        """Миниатюры: {формат: {ширина: имя файла}}. Миниатюры,
+        построенные до появления форматов, хранились как
+        {ширина: имя файла} и были в JPEG."""
+        variants = json.loads(self.thumbnails) if self.thumbnails else {}
+        if any(isinstance(name, str) for name in variants.values()):
+            return {'jpeg': variants}
+        return variants
+
+    def thumbnail_names(self):
+        return [
+            name
+            for names in self.thumbnail_variants().values()
+            for name in names.values()
+        ]
+
+    def _srcset(self, names):
+        storage = self.image.storage
+        return ', '.join(
+            '{0} {1}w'.format(storage.url(name), width)
+            for width, name in sorted(
+                names.items(),
+                key=lambda item: int(item[0])
+            )
+        )
+
+    @property
+    def thumbnail_url(self):
+        """Адрес JPEG-миниатюры шириной POST_THUMBNAIL_SRC_WIDTH
+        (или ближайшей к ней); пока миниатюр нет — адрес оригинала."""
+        names = self.thumbnail_variants().get('jpeg')
+        if not names:
+            return self.image.url if self.image else ''
+        width = min(
+            names,
+            key=lambda width: abs(
+                int(width) - settings.POST_THUMBNAIL_SRC_WIDTH
+            )
+        )
+        return self.image.storage.url(names[width])
+
+    @property
+    def thumbnail_srcset(self):
+        return self._srcset(self.thumbnail_variants().get('jpeg', {}))
+
+    @property
+    def thumbnail_sources(self):
+        """(MIME-тип, srcset) современных форматов для <source>
+        в <picture>, в порядке предпочтения."""
+        variants = self.thumbnail_variants()
+        return [
+            ('image/{0}'.format(image_format), self._srcset(
+                variants[image_format]
+            ))
+            for image_format in settings.POST_THUMBNAIL_FORMATS
+            if image_format != 'jpeg' and image_format in variants
+        ]
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -87,6 +190,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:5]
@@ -117,3 +226,125 @@ class Follow(models.Model):
 
     def __str__(self):
         return self.author[:15]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на каждый пост автора,
+    на которого подписан пользователь."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель ленты'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Сообщение в ленте'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации сообщения',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+        ordering = ['-pub_date']
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.user, self.post)
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя для карточки автора."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0,
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Записей',
+        default=0,
+    )
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class ImageJob(models.Model):
+    """Задание фоновой обработки картинки поста (process_images):
+    очистка EXIF, уменьшение оригинала и построение миниатюр."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+        verbose_name='Сообщение'
+    )
+    status = models.CharField(
+        verbose_name='Состояние',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток',
+        default=0,
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True,
+        default='',
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата постановки в очередь',
+        auto_now_add=True,
+    )
+    started = models.DateTimeField(
+        verbose_name='Дата начала обработки',
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'created'],
+                name='image_job_status_idx'
+            ),
+        ]
+        ordering = ['created']
+
+    def __str__(self):
+        return '{0}: {1}'.format(self.post_id, self.status)
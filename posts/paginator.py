@@ -0,0 +1,127 @@
+import base64
+
+from collections.abc import Sequence
+
+from django.db.models import Q
+
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Sequence):
+    """Страница ленты, построенная по курсору (дата, id).
+
+    В отличие от django.core.paginator.Page не знает общего числа
+    страниц: ссылки ведут только на предыдущую и следующую."""
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of {0} objects>'.format(len(self))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-паджинатор: страница выбирается условием
+    `(date_field, pk_field) < (курсор)` вместо OFFSET, поэтому любая
+    страница стоит столько же, сколько первая, и COUNT(*) не нужен."""
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 pk_field='pk'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.date_field = date_field
+        self.pk_field = pk_field
+
+    def encode_cursor(self, obj, direction):
+        value = '{0}|{1}|{2}'.format(
+            direction,
+            getattr(obj, self.date_field).isoformat(),
+            getattr(obj, self.pk_field)
+        )
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            direction, date, pk = value.split('|')
+            date = parse_datetime(date)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise InvalidCursor(cursor)
+        if direction not in (NEXT, PREVIOUS) or date is None:
+            raise InvalidCursor(cursor)
+        return direction, date, pk
+
+    def page_queryset(self, cursor=None):
+        """Запрос одной страницы (с лишней строкой для has_next)
+        и направление обхода."""
+        date_field, pk_field = self.date_field, self.pk_field
+        if cursor is None:
+            direction = NEXT
+            queryset = self.object_list
+        else:
+            direction, date, pk = self.decode_cursor(cursor)
+            lookup = 'lt' if direction == NEXT else 'gt'
+            # Условие с OR индекс как диапазон не использует, поэтому
+            # рядом стоит избыточная граница date <= курсор (>= назад):
+            # по ней план — SEARCH по индексу, а не SCAN всей ленты.
+            queryset = self.object_list.filter(
+                Q(**{'{0}__{1}e'.format(date_field, lookup): date}),
+                Q(**{'{0}__{1}'.format(date_field, lookup): date})
+                | Q(**{
+                    date_field: date,
+                    '{0}__{1}'.format(pk_field, lookup): pk
+                })
+            )
+        if direction == NEXT:
+            queryset = queryset.order_by('-' + date_field, '-' + pk_field)
+        else:
+            queryset = queryset.order_by(date_field, pk_field)
+        return queryset[:self.per_page + 1], direction
+
+    def page(self, cursor=None):
+        """Возвращает страницу после (или до) курсора."""
+        queryset, direction = self.page_queryset(cursor)
+        object_list = list(queryset)
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == PREVIOUS:
+            object_list.reverse()
+
+        next_cursor = previous_cursor = None
+        if object_list:
+            if has_more or direction == PREVIOUS:
+                next_cursor = self.encode_cursor(object_list[-1], NEXT)
+            if cursor is not None and (has_more or direction == NEXT):
+                previous_cursor = self.encode_cursor(object_list[0], PREVIOUS)
+        return CursorPage(object_list, self, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        """Как page(), но при некорректном курсоре отдаёт первую страницу."""
+        try:
+            return self.page(cursor or None)
+        except InvalidCursor:
+            return self.page()
@@ -0,0 +1,348 @@
+"""Полнотекстовый поиск по постам, комментариям и группам.
+
+Тексты Post.text, Comment.text и Group.title лежат в отдельном
+обратном индексе — таблице posts_search: в SQLite это виртуальная
+таблица FTS5, в PostgreSQL — столбец tsvector с GIN-индексом. Индекс
+обновляют сигналы сохранения и удаления (posts.signals), массовый
+импорт дописывает новые строки в конце (posts.transfer), а команда
+rebuild_search_index строит его заново.
+
+Строка индекса одна на объект, её id — id объекта и вид: id * 3 + вид.
+Поиск ищет все слова запроса как префиксы («кош» найдёт «кошка»);
+результаты упорядочены по релевантности (bm25 в FTS5, ts_rank
+в PostgreSQL). В других базах индекса нет, и поиск идёт через LIKE.
+"""
+import re
+
+from django.conf import settings
+
+from django.db import connection
+from django.db import connections
+from django.db import router
+
+from django.db.models import Max
+from django.db.models import Q
+
+from posts.models import Comment
+from posts.models import Group
+from posts.models import Post
+
+from posts.paginator import CursorPage
+
+TABLE = 'posts_search'
+
+POST = 'post'
+COMMENT = 'comment'
+GROUP = 'group'
+# Вид -> номер вида в id строки индекса.
+KINDS = {POST: 0, COMMENT: 1, GROUP: 2}
+MODELS = {POST: Post, COMMENT: Comment, GROUP: Group}
+FIELDS = {POST: 'text', COMMENT: 'text', GROUP: 'title'}
+
+
+def document_id(kind, object_id):
+    return object_id * len(KINDS) + KINDS[kind]
+
+
+def object_id(document_id):
+    return document_id // len(KINDS)
+
+
+def terms(query):
+    """Слова запроса: только буквы и цифры, поэтому их можно
+    подставлять в язык запросов FTS5 и tsquery без экранирования."""
+    return re.findall(r'\w+', query.lower())[:settings.SEARCH_MAX_TERMS]
+
+
+def sources():
+    """Вид -> (таблица, столбец текста). Миграция 0021 держит свою
+    копию: при изменении схемы индекса нужна новая миграция."""
+    return {
+        kind: (model._meta.db_table, FIELDS[kind])
+        for kind, model in MODELS.items()
+    }
+
+
+class SQLiteIndex:
+    def create(self, cursor):
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5('
+            "text, tokenize = 'unicode61 remove_diacritics 2')".format(TABLE)
+        )
+
+    def drop(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(TABLE))
+
+    def copy(self, cursor, kind, table, column, after_id=0):
+        cursor.execute(
+            'INSERT OR REPLACE INTO {0} (rowid, text) '
+            'SELECT id * %s + %s, {2} FROM {1} WHERE id > %s'.format(
+                TABLE,
+                table,
+                column
+            ),
+            [len(KINDS), KINDS[kind], after_id]
+        )
+
+    def save(self, cursor, document_id, text):
+        cursor.execute(
+            'INSERT OR REPLACE INTO {0} (rowid, text) '
+            'VALUES (%s, %s)'.format(TABLE),
+            [document_id, text]
+        )
+
+    def delete(self, cursor, document_id):
+        cursor.execute(
+            'DELETE FROM {0} WHERE rowid = %s'.format(TABLE),
+            [document_id]
+        )
+
+    def delete_related(self, cursor, kind, table, column, value):
+        cursor.execute(
+            'DELETE FROM {0} WHERE rowid IN ('
+            'SELECT id * %s + %s FROM {1} WHERE {2} = %s)'.format(
+                TABLE,
+                table,
+                column
+            ),
+            [len(KINDS), KINDS[kind], value]
+        )
+
+    def search(self, cursor, words, kind, limit, offset):
+        cursor.execute(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s '
+            'AND rowid %% %s = %s ORDER BY rank, rowid '
+            'LIMIT %s OFFSET %s'.format(TABLE),
+            [
+                ' '.join('"{0}"*'.format(word) for word in words),
+                len(KINDS),
+                KINDS[kind],
+                limit,
+                offset,
+            ]
+        )
+        return [object_id(row[0]) for row in cursor.fetchall()]
+
+
+class PostgresIndex:
+    def create(self, cursor):
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS {0} ('
+            'id bigint PRIMARY KEY, '
+            'kind smallint NOT NULL, '
+            'document tsvector NOT NULL)'.format(TABLE)
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS {0}_document_idx '
+            'ON {0} USING gin (document)'.format(TABLE)
+        )
+
+    def drop(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS {0}'.format(TABLE))
+
+    def copy(self, cursor, kind, table, column, after_id=0):
+        cursor.execute(
+            'INSERT INTO {0} (id, kind, document) '
+            'SELECT id * %s + %s, %s, to_tsvector(%s, {2}) '
+            'FROM {1} WHERE id > %s '
+            'ON CONFLICT (id) DO UPDATE '
+            'SET document = EXCLUDED.document'.format(TABLE, table, column),
+            [
+                len(KINDS),
+                KINDS[kind],
+                KINDS[kind],
+                settings.SEARCH_POSTGRES_CONFIG,
+                after_id,
+            ]
+        )
+
+    def save(self, cursor, document_id, text):
+        cursor.execute(
+            'INSERT INTO {0} (id, kind, document) '
+            'VALUES (%s, %s, to_tsvector(%s, %s)) '
+            'ON CONFLICT (id) DO UPDATE '
+            'SET document = EXCLUDED.document'.format(TABLE),
+            [
+                document_id,
+                document_id % len(KINDS),
+                settings.SEARCH_POSTGRES_CONFIG,
+                text,
+            ]
+        )
+
+    def delete(self, cursor, document_id):
+        cursor.execute(
+            'DELETE FROM {0} WHERE id = %s'.format(TABLE),
+            [document_id]
+        )
+
+    def delete_related(self, cursor, kind, table, column, value):
+        cursor.execute(
+            'DELETE FROM {0} WHERE id IN ('
+            'SELECT id * %s + %s FROM {1} WHERE {2} = %s)'.format(
+                TABLE,
+                table,
+                column
+            ),
+            [len(KINDS), KINDS[kind], value]
+        )
+
+    def search(self, cursor, words, kind, limit, offset):
+        cursor.execute(
+            'SELECT id FROM {0}, to_tsquery(%s, %s) query '
+            'WHERE kind = %s AND document @@ query '
+            'ORDER BY ts_rank(document, query) DESC, id '
+            'LIMIT %s OFFSET %s'.format(TABLE),
+            [
+                settings.SEARCH_POSTGRES_CONFIG,
+                ' & '.join('{0}:*'.format(word) for word in words),
+                KINDS[kind],
+                limit,
+                offset,
+            ]
+        )
+        return [object_id(row[0]) for row in cursor.fetchall()]
+
+
+INDEXES = {
+    'sqlite': SQLiteIndex(),
+    'postgresql': PostgresIndex(),
+}
+
+
+def get_index(vendor):
+    """Индекс для базы или None — тогда поиск идёт через LIKE."""
+    return INDEXES.get(vendor)
+
+
+def like_search(words, kind, limit, offset):
+    """Поиск без индекса: все слова через LIKE, новые объекты первыми.
+    Это же — база для сравнения в bench_search."""
+    field = FIELDS[kind]
+    condition = Q()
+    for word in words:
+        condition &= Q(**{field + '__icontains': word})
+    return list(
+        MODELS[kind].objects.filter(condition).order_by('-pk').values_list(
+            'pk',
+            flat=True
+        )[offset:offset + limit]
+    )
+
+
+def search_ids(query, kind=POST, limit=None, offset=0):
+    """id объектов вида kind по запросу, самые релевантные первыми."""
+    words = terms(query)
+    if not words:
+        return []
+    limit = limit or settings.POSTS_LIMIT
+    alias = router.db_for_read(MODELS[kind])
+    index = get_index(connections[alias].vendor)
+    if index is None:
+        return like_search(words, kind, limit, offset)
+    with connections[alias].cursor() as cursor:
+        return index.search(cursor, words, kind, limit, offset)
+
+
+def index_object(kind, instance):
+    index = get_index(connection.vendor)
+    if index is None:
+        return
+    with connection.cursor() as cursor:
+        index.save(
+            cursor,
+            document_id(kind, instance.pk),
+            getattr(instance, FIELDS[kind])
+        )
+
+
+def remove_object(kind, instance):
+    index = get_index(connection.vendor)
+    if index is None:
+        return
+    with connection.cursor() as cursor:
+        index.delete(cursor, document_id(kind, instance.pk))
+
+
+def remove_comments(post):
+    """Убирает из индекса все комментарии поста одним запросом
+    (перед каскадным удалением поста)."""
+    index = get_index(connection.vendor)
+    if index is None:
+        return
+    field = Comment._meta.get_field('post')
+    with connection.cursor() as cursor:
+        index.delete_related(
+            cursor,
+            COMMENT,
+            Comment._meta.db_table,
+            field.column,
+            post.pk
+        )
+
+
+def last_ids():
+    """Наибольшие id по видам: после массового импорта в индекс
+    дописываются объекты с большими id (index_after)."""
+    return {
+        kind: model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for kind, model in MODELS.items()
+    }
+
+
+def index_after(ids):
+    """Индексирует объекты с id больше ids[вид] одним INSERT ... SELECT
+    на вид; ids=None — все объекты."""
+    index = get_index(connection.vendor)
+    if index is None:
+        return
+    with connection.cursor() as cursor:
+        for kind, (table, column) in sources().items():
+            index.copy(
+                cursor,
+                kind,
+                table,
+                column,
+                (ids or {}).get(kind, 0)
+            )
+
+
+def rebuild():
+    """Создаёт индекс заново по всем постам, комментариям и группам."""
+    index = get_index(connection.vendor)
+    if index is None:
+        return
+    with connection.cursor() as cursor:
+        index.drop(cursor)
+        index.create(cursor)
+        for kind, (table, column) in sources().items():
+            index.copy(cursor, kind, table, column)
+
+
+def get_page(query, kind, cursor=None):
+    """Страница результатов. Курсор — смещение: порядок по
+    релевантности не даёт keyset-курсора, поэтому глубина поиска
+    ограничена SEARCH_MAX_RESULTS."""
+    per_page = settings.POSTS_LIMIT
+    try:
+        offset = min(max(int(cursor or 0), 0), settings.SEARCH_MAX_RESULTS)
+    except ValueError:
+        offset = 0
+    ids = search_ids(query, kind, per_page + 1, offset)
+    has_more = (
+        len(ids) > per_page
+        and offset + per_page < settings.SEARCH_MAX_RESULTS
+    )
+    ids = ids[:per_page]
+    objects = MODELS[kind].objects.all()
+    if kind == POST:
+        objects = objects.for_feed()
+    elif kind == COMMENT:
+        objects = objects.select_related('author', 'post__author')
+    found = objects.in_bulk(ids)
+    return CursorPage(
+        [found[pk] for pk in ids if pk in found],
+        None,
+        str(offset + per_page) if has_more else None,
+        str(max(offset - per_page, 0)) if offset else None
+    )
@@ -0,0 +1,139 @@
+import threading
+
+from django.db import connection
+
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_init
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+
+from django.dispatch import receiver
+
+from django.utils import timezone
+
+from posts import feed_cache
+from posts import media
+from posts import search
+from posts import stats
+from posts import timeline
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+
+
+# id постов, которые сейчас удаляются вместе с комментариями.
+_deleting = threading.local()
+
+
+def deleting_posts():
+    posts = getattr(_deleting, 'posts', None)
+    if posts is None:
+        posts = _deleting.posts = set()
+    elif posts and not connection.in_atomic_block:
+        # Удаление откатилось, и post_delete не пришёл: Collector
+        # удаляет внутри atomic, так что вне транзакции id устарели.
+        posts.clear()
+    return posts
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Группа и картинка на момент загрузки: при переносе поста
+    # сбрасывается и лента прежней группы, а заменённая картинка
+    # удаляется из хранилища. Значения берутся из __dict__, чтобы не
+    # загружать отложенные (.only/.defer) поля.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    instance._loaded_image = instance.__dict__.get('image')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    search.index_object(search.POST, instance)
+    if created:
+        stats.change(instance.author_id, 'posts_count', 1)
+        timeline.fan_out_post(instance)
+    elif instance._loaded_image and instance._loaded_image != str(
+        instance.image
+    ):
+        media.delete_files(instance.image.storage, [instance._loaded_image])
+    feed_cache.bump_post(instance, instance._loaded_group_id)
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = instance.image.name
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Комментарии удаляются каскадом раньше поста, по сигналу на
+    # каждый. Их строки индекса убираются здесь одним запросом,
+    # а comment_deleted для них не трогает ни счётчик, ни кэш:
+    # ленты поста один раз сбросит post_deleted.
+    deleting_posts().add(instance.pk)
+    search.remove_comments(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts().discard(instance.pk)
+    search.remove_object(search.POST, instance)
+    stats.change(instance.author_id, 'posts_count', -1)
+    if instance.image:
+        media.delete_files(
+            instance.image.storage,
+            [instance.image.name] + instance.thumbnail_names()
+        )
+    feed_cache.bump_post(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    search.index_object(search.GROUP, instance)
+    # Название и slug группы входят в закэшированную карточку поста
+    # и в посты, сохранённые в кэше страниц любых лент.
+    if not created:
+        instance.posts.update(updated=timezone.now())
+        feed_cache.bump(feed_cache.ALL)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    search.remove_object(search.GROUP, instance)
+    feed_cache.bump(feed_cache.group_scope(instance.slug))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    search.index_object(search.COMMENT, instance)
+    if created:
+        stats.change_comment_count(instance.post_id, 1)
+        feed_cache.bump_post(instance.post)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id in deleting_posts():
+        return
+    search.remove_object(search.COMMENT, instance)
+    stats.change_comment_count(instance.post_id, -1)
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        feed_cache.bump_post(post)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, 'followers_count', 1)
+        stats.change(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        feed_cache.bump_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'followers_count', -1)
+    stats.change(instance.user_id, 'following_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.followers_dropped(instance.author_id)
+    feed_cache.bump_follow(instance)
@@ -0,0 +1,155 @@
+"""Денормализованные счётчики: AuthorStats и Post.comment_count.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + 1 (F-выражения) из
+сигналов сохранения и удаления, а recount_stats пересчитывает их заново,
+если они разошлись с данными.
+"""
+from django.conf import settings
+
+from django.contrib.auth import get_user_model
+
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
+
+from django.db.models.functions import Coalesce
+
+from django.utils import timezone
+
+from posts import timeline
+
+from posts.models import AuthorStats
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Post
+
+User = get_user_model()
+
+STATS_FIELDS = ('followers_count', 'following_count', 'posts_count')
+
+
+def _count(model, field):
+    """Коррелированный подзапрос COUNT(*) по внешнему ключу field."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def actual_stats(users):
+    """Пользователи с аннотацией фактических значений счётчиков."""
+    return users.annotate(
+        actual_followers_count=_count(Follow, 'author'),
+        actual_following_count=_count(Follow, 'user'),
+        actual_posts_count=_count(Post, 'author'),
+    )
+
+
+def create_stats(user_id):
+    """Создаёт AuthorStats по фактическим данным."""
+    user = actual_stats(User.objects.filter(pk=user_id)).first()
+    if user is None:
+        return None
+    values = {
+        field: getattr(user, 'actual_' + field) for field in STATS_FIELDS
+    }
+    stats, _ = AuthorStats.objects.get_or_create(
+        user_id=user_id,
+        defaults=values
+    )
+    return stats
+
+
+def get_stats(user):
+    """Счётчики пользователя; при отсутствии строки она создаётся."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return create_stats(user.pk)
+
+
+def change(user_id, field, delta):
+    """Атомарно сдвигает счётчик. Строка без счётчиков создаётся
+    только при увеличении: при удалениях (в том числе каскадных,
+    вместе с пользователем) отсутствующая строка не нужна."""
+    rows = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        rows = rows.filter(**{field + '__gte': -delta})
+    updated = rows.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        create_stats(user_id)
+
+
+def change_comment_count(post_id, delta):
+    rows = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        rows = rows.filter(comment_count__gte=-delta)
+    rows.update(comment_count=F('comment_count') + delta)
+
+
+def recount_comments(batch_size=1000):
+    """Пересчитывает Post.comment_count пачками постов, возвращает
+    число исправлений. Переписываются только разошедшиеся строки,
+    и у них сдвигается updated — ключ кэша карточки поста."""
+    fixed = 0
+    posts = Post.objects.annotate(
+        actual=_count(Comment, 'post')
+    ).order_by('pk').values_list('pk', 'comment_count', 'actual')
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return fixed
+        last_pk = batch[-1][0]
+        for pk, comment_count, actual in batch:
+            if comment_count == actual:
+                continue
+            Post.objects.filter(pk=pk).update(
+                comment_count=actual,
+                updated=timezone.now()
+            )
+            fixed += 1
+
+
+def recount_authors(batch_size=1000):
+    """Пересчитывает AuthorStats пачками пользователей,
+    возвращает число созданных и исправленных строк."""
+    fixed = 0
+    users = actual_stats(User.objects.select_related('stats')).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return fixed
+        last_pk = batch[-1].pk
+        for user in batch:
+            values = {
+                field: getattr(user, 'actual_' + field)
+                for field in STATS_FIELDS
+            }
+            try:
+                stats = user.stats
+            except AuthorStats.DoesNotExist:
+                stats = None
+            if stats is not None and all(
+                getattr(stats, field) == value
+                for field, value in values.items()
+            ):
+                continue
+            AuthorStats.objects.update_or_create(
+                user_id=user.pk,
+                defaults=values
+            )
+            fixed += 1
+            if (
+                stats is not None
+                and stats.followers_count > settings.TIMELINE_FANOUT_LIMIT
+                and values['followers_count'] <= (
+                    settings.TIMELINE_FANOUT_LIMIT
+                )
+            ):
+                # Исправленный счётчик вернул автора под порог
+                # раскладки: его посты снова нужны в TimelineEntry.
+                timeline.fan_out_author(user.pk)
@@ -0,0 +1,137 @@
+import gzip
+
+import json
+
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+
+from django.test import Client
+from django.test import TestCase
+
+from django.urls import reverse
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+
+
+class FeedApiTest(TestCase):
+    '''JSON API лент'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовое сообщение',
+            author=cls.author,
+            group=cls.group
+        )
+        Comment.objects.create(
+            post=cls.post,
+            author=cls.reader,
+            text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds(self):
+        """Ленты отдают те же посты, что и HTML-страницы."""
+        urls = {
+            reverse('api_index'): self.guest_client,
+            reverse('api_group', args=[self.group.slug]): self.guest_client,
+            reverse('api_profile', args=[self.author]): self.guest_client,
+            reverse('api_follow'): self.reader_client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                data = client.get(url).json()
+                self.assertEqual(data['results'], [{
+                    'id': self.post.pk,
+                    'text': 'Тестовое сообщение',
+                    'pub_date': self.post.pub_date.isoformat(),
+                    'author': 'Avtor',
+                    'group': 'test-slug',
+                    'image': None,
+                    'comment_count': 1,
+                }])
+                self.assertIsNone(data['next_cursor'])
+
+    def test_post_and_errors(self):
+        response = self.guest_client.get(
+            reverse('api_post', args=[self.author, self.post.pk]),
+            {'fields': 'id,text'}
+        )
+        data = response.json()
+        self.assertEqual(
+            data['post'],
+            {'id': self.post.pk, 'text': 'Тестовое сообщение'}
+        )
+        self.assertEqual(data['comments']['results'][0]['author'], 'Chitatel')
+
+        response = self.guest_client.get(
+            reverse('api_index'),
+            {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+        response = self.guest_client.get(
+            reverse('api_group', args=['no-such-group'])
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            self.guest_client.get(reverse('api_follow')).status_code,
+            401
+        )
+
+    def test_conditional_requests(self):
+        """Повторный запрос с If-None-Match — 304 без запросов к базе,
+        новый пост меняет ETag."""
+        url = reverse('api_index')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Post.objects.create(text='Новый пост', author=self.author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_cache_control(self):
+        """Ответ пользователю — private, анонимам — без private."""
+        url = reverse('api_index')
+        cache_control = self.guest_client.get(url)['Cache-Control']
+        self.assertIn('must-revalidate', cache_control)
+        self.assertNotIn('private', cache_control)
+        self.assertIn(
+            'private',
+            self.reader_client.get(url)['Cache-Control']
+        )
+
+    def test_gzip(self):
+        Post.objects.bulk_create(
+            Post(text='Сообщение {0}'.format(number), author=self.author)
+            for number in range(10)
+        )
+        response = self.guest_client.get(
+            reverse('api_index'),
+            HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), 10)
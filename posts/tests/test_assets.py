@@ -0,0 +1,215 @@
+import gzip
+
+import json
+
+import os
+
+import re
+
+import shutil
+
+import tempfile
+
+from io import StringIO
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+from django.core.cache import cache
+
+from django.core.management import call_command
+
+from django.test import Client
+from django.test import TestCase
+from django.test import override_settings
+
+from django.urls import reverse
+
+from django.utils.http import http_date
+
+from posts.models import Group
+from posts.models import Post
+
+CSS = 'bootstrap/dist/css/bootstrap.min.css'
+
+
+def read(response):
+    content = b''.join(response.streaming_content)
+    response.close()
+    return content
+
+
+class CompressedStaticFilesTest(TestCase):
+    '''collectstatic с хешами и сжатием, отдача статики'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.static_settings = override_settings(STATIC_ROOT=cls.static_root)
+        cls.static_settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed = staticfiles_storage.stored_name(CSS)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.static_settings.disable()
+        shutil.rmtree(cls.static_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def path(self, name):
+        return os.path.join(self.static_root, name)
+
+    def test_collectstatic_hashes_and_compresses(self):
+        """Манифест ведёт к имени с хешем, рядом лежит .gz того же
+        содержимого; маленькие и нетекстовые файлы не сжимаются."""
+        with open(self.path('staticfiles.json')) as manifest:
+            paths = json.load(manifest)['paths']
+        self.assertEqual(paths[CSS], self.hashed)
+        self.assertRegex(self.hashed, r'\.[0-9a-f]{12}\.css$')
+        with open(self.path(self.hashed), 'rb') as original:
+            with gzip.open(self.path(self.hashed) + '.gz') as compressed:
+                self.assertEqual(compressed.read(), original.read())
+        for name in ('jquery/src/event/support.js', 'bootstrap/LICENSE'):
+            with self.subTest(name=name):
+                self.assertTrue(os.path.exists(self.path(name)))
+                self.assertFalse(os.path.exists(self.path(name) + '.gz'))
+
+    def test_hashed_file_cached_forever(self):
+        """Файл с хешем — сжатый по Accept-Encoding и с immutable."""
+        response = self.client.get(
+            '/static/' + self.hashed,
+            HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        with open(self.path(self.hashed), 'rb') as original:
+            self.assertEqual(gzip.decompress(read(response)), original.read())
+
+        plain = self.client.get('/static/' + self.hashed)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(
+            int(plain['Content-Length']),
+            os.path.getsize(self.path(self.hashed))
+        )
+        plain.close()
+
+    def test_unhashed_file_revalidated(self):
+        """Файл без хеша кэшируется ненадолго и отвечает 304."""
+        response = self.client.get('/static/' + CSS)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+        response.close()
+        not_modified = self.client.get(
+            '/static/' + CSS,
+            HTTP_IF_MODIFIED_SINCE=http_date(
+                os.path.getmtime(self.path(CSS)) + 1
+            )
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_missing_and_outside_files_not_served(self):
+        for url in ('/static/nothing.css', '/static/../manage.py'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_file_missing_from_manifest_fails(self):
+        """С манифестом файл не из него — ошибка, а не адрес с 404."""
+        with self.assertRaises(ValueError):
+            staticfiles_storage.stored_name('nothing.css')
+
+    def test_pages_link_hashed_assets(self):
+        """base.html подключает статику по именам с хешем."""
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '/static/' + self.hashed)
+        self.assertNotContains(response, '/static/' + CSS)
+
+
+class UncollectedStaticFilesTest(TestCase):
+    '''Статика без collectstatic: манифеста нет'''
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_pages_link_unhashed_assets(self):
+        """Без манифеста base.html подключает файлы по их именам,
+        не читая их ради хеша, и эти файлы отдаются."""
+        self.assertFalse(staticfiles_storage.hashed_files)
+        with mock.patch.object(
+            staticfiles_storage.__class__,
+            'hashed_name'
+        ) as hashed_name:
+            response = self.client.get(reverse('index'))
+        hashed_name.assert_not_called()
+        self.assertContains(response, '/static/' + CSS)
+        static = self.client.get('/static/' + CSS)
+        self.assertEqual(static.status_code, 200)
+        static.close()
+
+
+class PageCompressionTest(TestCase):
+    '''Сжатие HTML-страниц'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.group = Group.objects.create(title='Группа', slug='gruppa')
+        for number in range(5):
+            Post.objects.create(
+                text='Тестовое сообщение {0}'.format(number),
+                author=cls.author,
+                group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_cached_page_compressed_per_client(self):
+        """Страница из кэша для анонимов сжимается тем, кто принимает
+        gzip, и отдаётся как есть остальным."""
+        url = reverse('index')
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertLess(len(compressed.content), len(plain.content))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertTrue(compressed['ETag'].startswith('W/'))
+
+        not_modified = self.client.get(
+            url,
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=compressed['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_compression_report(self):
+        out = StringIO()
+        call_command('compression_report', stdout=out)
+        report = out.getvalue()
+        for url in (
+            reverse('index'),
+            reverse('group', args=[self.group.slug]),
+            reverse('api_index'),
+        ):
+            with self.subTest(url=url):
+                self.assertRegex(
+                    report,
+                    r'{0}\s+\d+\s+\d+\s+\d+%'.format(re.escape(url))
+                )
+        self.assertIn('total', report)
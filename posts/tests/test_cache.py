@@ -0,0 +1,59 @@
+from django.core.cache import caches
+
+from django.test import SimpleTestCase
+from django.test import override_settings
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'yatube.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_KEY_PREFIXES': ['feed_page:'],
+            'LOCAL_MAX_ENTRIES': 2,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-shared',
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTest(SimpleTestCase):
+    '''Двухуровневый кэш'''
+    def setUp(self):
+        self.cache = caches['default']
+        self.shared = caches['shared']
+        self.cache.clear()
+
+    def test_versioned_keys_are_served_locally(self):
+        """Ключи с версией читаются из памяти процесса,
+        остальные всегда из общего кэша."""
+        self.cache.set('feed_page:1', ['пост'])
+        self.cache.set('feed_gen:index', 'a')
+        self.shared.delete('feed_page:1')
+        self.shared.set('feed_gen:index', 'b')
+
+        self.assertEqual(self.cache.get('feed_page:1'), ['пост'])
+        self.assertEqual(self.cache.get('feed_gen:index'), 'b')
+        self.assertEqual(
+            self.cache.get_many(['feed_page:1', 'feed_gen:index']),
+            {'feed_page:1': ['пост'], 'feed_gen:index': 'b'}
+        )
+
+    def test_local_tier_is_lru_bounded(self):
+        """Локальный уровень вытесняет давно не читавшиеся ключи."""
+        for number in range(3):
+            self.cache.set('feed_page:{0}'.format(number), number)
+        self.cache.get('feed_page:1')
+        self.shared.clear()
+        self.assertIsNone(self.cache.get('feed_page:0'))
+        self.assertEqual(self.cache.get('feed_page:1'), 1)
+        self.assertEqual(self.cache.get('feed_page:2'), 2)
+
+    def test_delete_reaches_both_tiers(self):
+        self.cache.set('feed_page:1', 'страница')
+        self.cache.delete('feed_page:1')
+        self.assertIsNone(self.cache.get('feed_page:1'))
+        self.assertIsNone(self.shared.get('feed_page:1'))
@@ -0,0 +1,390 @@
+import json
+
+import shutil
+
+import tempfile
+
+from datetime import datetime
+from datetime import timezone
+
+from io import BytesIO
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+
+from django.core.files.base import ContentFile
+
+from django.core.files.storage import default_storage
+
+from django.core.management import call_command
+from django.core.management import CommandError
+
+from django.db import connection
+
+from django.test import TestCase
+from django.test import override_settings
+
+from django.test.utils import CaptureQueriesContext
+
+from PIL import Image
+
+from posts import media
+from posts import search
+from posts import stats
+from posts import thumbnails
+
+from posts.models import AuthorStats
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import TimelineEntry
+
+
+class ExplainFeedsCommandTest(TestCase):
+    '''Команда explain_feeds'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.create(
+            text='Тестовое сообщение!!!',
+            author=cls.author,
+            group=cls.group
+        )
+
+    def test_feed_queries_use_indexes(self):
+        """Планы лент используют составные индексы."""
+        out = StringIO()
+        call_command('explain_feeds', username='Chitatel', stdout=out)
+        output = out.getvalue()
+        for index in (
+            'post_pub_date_idx',
+            'post_group_pub_date_idx',
+            'timeline_user_pub_date_idx',
+        ):
+            with self.subTest(index=index):
+                self.assertIn(index, output)
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', output)
+
+        out = StringIO()
+        call_command('explain_feeds', username='Avtor', stdout=out)
+        self.assertIn('post_author_pub_date_idx', out.getvalue())
+
+
+class RecountStatsCommandTest(TestCase):
+    '''Команда recount_stats'''
+    def test_recount_repairs_drift(self):
+        """Разошедшиеся счётчики пересчитываются по данным."""
+        User = get_user_model()
+        author = User.objects.create(username='Avtor')
+        reader = User.objects.create(username='Chitatel')
+        post = Post.objects.create(text='Пост', author=author)
+        Comment.objects.create(post=post, author=reader, text='Текст')
+        Follow.objects.create(user=reader, author=author)
+        Post.objects.update(comment_count=7)
+        AuthorStats.objects.update(posts_count=3, followers_count=0)
+        AuthorStats.objects.filter(user=reader).delete()
+
+        out = StringIO()
+        call_command('recount_stats', stdout=out)
+        self.assertIn('Исправлено постов: 1, авторов: 2', out.getvalue())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        author_stats = AuthorStats.objects.get(user=author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=reader).following_count,
+            1
+        )
+
+    def test_recount_comments_in_batches(self):
+        """Пересчёт идёт пачками и трогает только разошедшиеся посты,
+        сдвигая у них updated."""
+        author = get_user_model().objects.create(username='Avtor')
+        posts = [
+            Post.objects.create(text='Пост {0}'.format(number), author=author)
+            for number in range(3)
+        ]
+        Comment.objects.create(post=posts[1], author=author, text='Текст')
+        Post.objects.filter(pk=posts[1].pk).update(comment_count=5)
+        Post.objects.filter(pk=posts[2].pk).update(comment_count=2)
+        updated = {
+            post.pk: post.updated for post in Post.objects.all()
+        }
+
+        self.assertEqual(stats.recount_comments(batch_size=1), 2)
+        for post in Post.objects.all():
+            with self.subTest(post=post.text):
+                self.assertEqual(
+                    post.comment_count,
+                    post.comments.count()
+                )
+                if post.pk == posts[0].pk:
+                    self.assertEqual(post.updated, updated[post.pk])
+                else:
+                    self.assertGreater(post.updated, updated[post.pk])
+        self.assertEqual(stats.recount_comments(batch_size=1), 0)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_recount_below_limit_fans_out(self):
+        """Если пересчёт вернул автора под порог раскладки, его посты
+        дописываются в ленты подписчиков."""
+        User = get_user_model()
+        author = User.objects.create(username='Avtor')
+        reader = User.objects.create(username='Chitatel')
+        AuthorStats.objects.create(user=author, followers_count=5)
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(text='Пост', author=author)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        call_command('recount_stats', stdout=StringIO())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists()
+        )
+
+
+class CollectMediaCommandTest(TestCase):
+    '''Команда collect_media и удаление файлов вместе с постом'''
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.author = get_user_model().objects.create(username='Avtor')
+
+    def make_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (20, 10)).save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue())
+
+    def make_post(self, name):
+        post = Post(text='Пост с картинкой', author=self.author)
+        post.image.save(name, self.make_image(), save=False)
+        post.save()
+        thumbnails.generate(post)
+        return post
+
+    def test_orphans_removed_referenced_kept(self):
+        """Удаляются только файлы, на которые не ссылается ни один пост."""
+        post = self.make_post('kept.jpg')
+        orphans = [
+            default_storage.save('posts/lost.jpg', self.make_image()),
+            default_storage.save(
+                'posts/thumbs/kept_100x100.jpg',
+                self.make_image()
+            ),
+            default_storage.save('cache/ab/cd/old.jpg', self.make_image()),
+        ]
+
+        out = StringIO()
+        call_command('collect_media', min_age=0, usage=True, stdout=out)
+
+        for name in orphans:
+            with self.subTest(name=name):
+                self.assertFalse(default_storage.exists(name))
+        for name in [post.image.name] + post.thumbnail_names():
+            with self.subTest(name=name):
+                self.assertTrue(default_storage.exists(name))
+        self.assertIn('Удалено (originals): 1 файлов', out.getvalue())
+        self.assertIn('Avtor', out.getvalue())
+
+    def test_thumbnails_with_deduplicated_names_kept(self):
+        """Миниатюры картинок с одинаковым именем (хранилище дописало
+        суффикс) не удаляются, даже в разных пачках."""
+        posts = [self.make_post('cat.png'), self.make_post('cat.jpg')]
+        names = [name for post in posts for name in post.thumbnail_names()]
+        self.assertEqual(len(set(names)), len(names))
+
+        media.collect(default_storage, batch_size=1, min_age=0)
+        for name in names:
+            with self.subTest(name=name):
+                self.assertTrue(default_storage.exists(name))
+
+    def test_thumbnail_batch_checks_only_its_posts(self):
+        """Пачка миниатюр сверяется только с постами, чьи картинки
+        совпадают по имени, а не со всеми миниатюрами в базе."""
+        cat = self.make_post('cat.png')
+        dog = self.make_post('dog.png')
+        orphan = 'posts/thumbs/ghost_1x1.webp'
+        batch = dog.thumbnail_names() + [orphan]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                media.referenced_thumbnails(batch),
+                set(dog.thumbnail_names())
+            )
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn(cat.image.name.split('.')[0], queries[0]['sql'])
+        self.assertEqual(media.referenced_thumbnails([]), set())
+
+    def test_recent_files_kept(self):
+        """Свежие файлы не удаляются: пост может быть ещё не сохранён."""
+        name = default_storage.save('posts/uploading.jpg', self.make_image())
+        call_command('collect_media', stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_post_files_deleted_with_post(self):
+        """Заменённая и удалённая вместе с постом картинки не остаются
+        в хранилище."""
+        post = self.make_post('first.jpg')
+        first_image = post.image.name
+        post.image.save('second.jpg', self.make_image())
+        self.assertFalse(default_storage.exists(first_image))
+
+        names = [post.image.name] + post.thumbnail_names()
+        post.delete()
+        for name in names:
+            with self.subTest(name=name):
+                self.assertFalse(default_storage.exists(name))
+
+
+class TransferCommandsTest(TestCase):
+    '''Команды export_posts и import_posts'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = self.directory + '/posts.jsonl'
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка сохраняют данные, даты и денормализованные
+        счётчики и ленты."""
+        User = get_user_model()
+        author = User.objects.create(username='Avtor')
+        reader = User.objects.create(username='Chitatel')
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        post = Post.objects.create(text='Пост', author=author, group=group)
+        Post.objects.filter(pk=post.pk).update(pub_date='2020-01-01T00:00Z')
+        comment = Comment.objects.create(post=post, author=reader, text='Т')
+        Comment.objects.filter(pk=comment.pk).update(
+            created='2020-01-02T00:00Z'
+        )
+        Follow.objects.create(user=reader, author=author)
+
+        call_command('export_posts', output=self.path)
+        Group.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.filter(username='Avtor').delete()
+
+        out = StringIO()
+        call_command('import_posts', self.path, batch_size=2, stdout=out)
+        self.assertIn(
+            'group: 1, post: 1, comment: 1, follow: 1',
+            out.getvalue()
+        )
+        imported = Post.objects.select_related('author', 'group').get()
+        self.assertEqual(imported.author.username, 'Avtor')
+        self.assertEqual(imported.group.slug, 'test-slug')
+        self.assertEqual(
+            imported.pub_date,
+            datetime(2020, 1, 1, tzinfo=timezone.utc)
+        )
+        # id удалённого поста не выдаётся повторно.
+        self.assertGreater(imported.pk, post.pk)
+        self.assertEqual(imported.comment_count, 1)
+        self.assertEqual(imported.comments.get().author, reader)
+        self.assertEqual(
+            imported.comments.get().created,
+            datetime(2020, 1, 2, tzinfo=timezone.utc)
+        )
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.assertEqual(imported.author.stats.followers_count, 1)
+        self.assertEqual(imported.author.stats.posts_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader,
+            post=imported
+        ).exists())
+        self.assertEqual(search.search_ids('пост'), [imported.pk])
+        # Новые посты после импорта получают свободные id.
+        later = Post.objects.create(text='После импорта', author=reader)
+        self.assertGreater(later.pk, imported.pk)
+
+    def test_unknown_reference_rejected(self):
+        """Комментарий к посту не из файла — ошибка команды."""
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.write(
+                '{"type": "comment", "post": 5, "author": "Avtor", '
+                '"text": "Текст"}\n'
+            )
+        with self.assertRaisesMessage(CommandError, 'неизвестному посту 5'):
+            call_command('import_posts', self.path, stdout=StringIO())
+        self.assertFalse(Comment.objects.exists())
+
+
+class BenchCommandsTest(TestCase):
+    '''Команды seed_bench, bench_feeds и bench_search'''
+    def test_seed_and_bench_report(self):
+        """seed_bench создаёт данные, bench_feeds пишет отчёт по всем
+        страницам и сравнивает его с прошлым."""
+        out = StringIO()
+        call_command(
+            'seed_bench',
+            posts=60,
+            users=6,
+            groups=3,
+            image_ratio=0,
+            stdout=out
+        )
+        self.assertIn('post: 60', out.getvalue())
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertTrue(Follow.objects.exists())
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = directory + '/report.json'
+        # Без --clear-cache чужие ключи общего кэша не трогаются.
+        cache.set('ratelimit:test', 1)
+        call_command(
+            'bench_feeds',
+            requests=2,
+            urls=2,
+            output=path,
+            stdout=StringIO()
+        )
+        self.assertEqual(cache.get('ratelimit:test'), 1)
+        with open(path, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report['meta']['posts'], 60)
+        self.assertEqual(report['meta']['cold'], 'feed_cache')
+        for view in ('index', 'group_post', 'profile', 'post_view',
+                     'follow_index'):
+            with self.subTest(view=view):
+                self.assertGreater(
+                    report['views'][view]['cold']['queries_mean'],
+                    0
+                )
+
+        out = StringIO()
+        call_command(
+            'bench_feeds',
+            requests=2,
+            urls=2,
+            view=['index'],
+            compare=path,
+            tolerance=100,
+            clear_cache=True,
+            stdout=out
+        )
+        self.assertIn('index         cold  p99', out.getvalue())
+        self.assertIsNone(cache.get('ratelimit:test'))
+
+        out = StringIO()
+        call_command('bench_search', queries=2, stdout=out)
+        self.assertIn('rare       index', out.getvalue())
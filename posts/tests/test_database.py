@@ -0,0 +1,103 @@
+import os
+
+import shutil
+
+import tempfile
+
+from io import StringIO
+
+from unittest import mock
+
+from django.core.management import call_command
+
+from django.db import connections
+from django.db import transaction
+
+from django.test import TestCase
+
+from posts.models import Post
+
+from yatube import routers
+
+
+class SQLiteBackendTest(TestCase):
+    '''PRAGMA соединения и маршрутизация чтения'''
+    def test_pragmas_applied(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64000)
+
+    def test_reads_go_to_replica_outside_transaction(self):
+        router = routers.ReadReplicaRouter()
+        replica = connections[routers.REPLICA].settings_dict
+        name = replica['NAME']
+        # В тестах реплика — зеркало 'default'.
+        self.assertEqual(router.db_for_read(Post), 'default')
+        replica['NAME'] = 'file:replica?mode=ro'
+        try:
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Post), 'default')
+            # TestCase держит транзакцию открытой: имитируем её отсутствие.
+            connection = connections['default']
+            in_atomic_block = connection.in_atomic_block
+            connection.in_atomic_block = False
+            try:
+                self.assertEqual(router.db_for_read(Post), routers.REPLICA)
+            finally:
+                connection.in_atomic_block = in_atomic_block
+        finally:
+            replica['NAME'] = name
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate(routers.REPLICA, 'posts'))
+
+    def test_bench_sqlite(self):
+        out = StringIO()
+        call_command(
+            'bench_sqlite',
+            readers=1,
+            duration=0.3,
+            rows=100,
+            rows_per_write=10,
+            stdout=out
+        )
+        output = out.getvalue()
+        self.assertIn('delete', output)
+        self.assertIn('wal', output)
+
+
+class HealthCheckTest(TestCase):
+    '''Проверка постоянного соединения в начале запроса'''
+    def setUp(self):
+        # Соединение с базой в памяти Django не закрывает, нужен файл.
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connection = connections['default']
+        settings_dict = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory, 'health.sqlite3'),
+            CONN_MAX_AGE=60,
+            CONN_HEALTH_CHECKS=True
+        )
+        self.connection = connection.__class__(settings_dict, alias='health')
+        self.addCleanup(self.connection.close)
+
+    def test_connection_reused_until_unusable(self):
+        self.connection.cursor().close()
+        first = self.connection.connection
+        self.connection.close_if_unusable_or_obsolete()
+        self.connection.cursor().close()
+        self.assertIs(self.connection.connection, first)
+
+        self.connection.close_if_unusable_or_obsolete()
+        with mock.patch.object(
+            self.connection,
+            'is_usable',
+            return_value=False
+        ) as is_usable:
+            self.connection.cursor().close()
+            self.connection.cursor().close()
+        # Проверка — один раз на запрос.
+        self.assertEqual(is_usable.call_count, 1)
+        self.assertIsNot(self.connection.connection, first)
@@ -2,19 +2,38 @@ import shutil
 
 import tempfile
 
+from datetime import timedelta
+
+from io import BytesIO
+from io import StringIO
+
+from unittest import mock
+
 from django.conf import settings
 
 from django.contrib.auth import get_user_model
 
+from django.core.cache import cache
+
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from django.core.management import call_command
+
 from django.test import Client
 from django.test import TestCase
 from django.test import override_settings
 
 from django.urls import reverse
 
+from django.utils import timezone
+
+from PIL import Image
+
+from posts import image_jobs
+from posts import thumbnails
+
 from posts.models import Group
+from posts.models import ImageJob
 from posts.models import Post
 
 
@@ -51,6 +70,7 @@ class PostFormTests(TestCase):
             description='Тестовое описание',
         )
 
+        cls.small_gif = small_gif
         cls.test_post = Post.objects.create(
             text='Тестовое сообщение!!!',
             author=cls.user,
@@ -120,3 +140,218 @@ class PostFormTests(TestCase):
         self.assertEqual(new_post.text, form_new_data['text'])
         self.assertEqual(new_post.author, form_new_data['author'])
         self.assertEqual(new_post.group.id, form_new_data['group'])
+
+    def test_new_post_image_processed_in_background(self):
+        """Форма только ставит картинку в очередь: до обработки лента
+        показывает заглушку, после process_images — миниатюры, и лента
+        не открывает картинки через Pillow."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=self.small_gif,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Пост с миниатюрами', 'image': uploaded},
+        )
+        new_post = Post.objects.get(text='Пост с миниатюрами')
+        self.assertEqual(new_post.thumbnail_names(), [])
+        self.assertTrue(new_post.image_jobs.filter(
+            status=ImageJob.PENDING
+        ).exists())
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, 'Картинка обрабатывается')
+
+        call_command('process_images', processes=0, stdout=StringIO())
+        new_post.refresh_from_db()
+        self.assertTrue(new_post.image_jobs.filter(
+            status=ImageJob.DONE
+        ).exists())
+        variants = new_post.thumbnail_variants()
+        self.assertEqual(list(variants), thumbnails.available_formats())
+        for image_format, names in variants.items():
+            self.assertEqual(
+                sorted(names, key=int),
+                [
+                    str(width)
+                    for width, _ in sorted(settings.POST_THUMBNAIL_SIZES)
+                ]
+            )
+            for name in names.values():
+                with self.subTest(name=name):
+                    self.assertTrue(new_post.image.storage.exists(name))
+
+        cache.clear()
+        with mock.patch('PIL.Image.open', side_effect=AssertionError):
+            response = self.authorized_client.get(reverse('index'))
+        storage = new_post.image.storage
+        self.assertContains(response, new_post.thumbnail_url)
+        self.assertContains(response, 'srcset="{0}'.format(
+            storage.url(variants['jpeg']['480'])
+        ))
+        self.assertContains(
+            response,
+            '<source type="image/webp" srcset="{0}'.format(
+                storage.url(variants['webp']['480'])
+            )
+        )
+
+    def test_image_job_strips_exif_and_resizes(self):
+        """Воркер поворачивает картинку по EXIF, убирает метаданные
+        и уменьшает оригинал до POST_IMAGE_MAX_SIZE."""
+        image = Image.new('RGB', (100, 3000), color=(200, 0, 0))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°
+        exif[0x010f] = 'Camera'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        uploaded = SimpleUploadedFile(
+            name='photo.jpg',
+            content=buffer.getvalue(),
+            content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={'text': 'Пост с фотографией', 'image': uploaded},
+        )
+        call_command('process_images', processes=0, stdout=StringIO())
+
+        new_post = Post.objects.get(text='Пост с фотографией')
+        with new_post.image.open() as source:
+            processed = Image.open(source)
+            self.assertEqual(
+                processed.size,
+                (settings.POST_IMAGE_MAX_SIZE, 64)
+            )
+            self.assertEqual(len(processed.getexif()), 0)
+
+    def test_image_job_strips_exif_from_png(self):
+        """EXIF не переносится в пересохранённый PNG."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'PNG', exif=exif.tobytes())
+        self.upload('photo.png', buffer.getvalue())
+        call_command('process_images', processes=0, stdout=StringIO())
+
+        new_post = Post.objects.get(text='Пост с проверкой картинки')
+        with new_post.image.open() as source:
+            processed = Image.open(source)
+            self.assertNotIn('exif', processed.info)
+            self.assertEqual(len(processed.getexif()), 0)
+
+    def test_failed_save_keeps_original(self):
+        """Если новый файл не сохранился, пост остаётся со старым."""
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'PNG')
+        self.upload('photo.png', buffer.getvalue())
+        post = Post.objects.get(text='Пост с проверкой картинки')
+        name = post.image.name
+        with mock.patch.object(
+            post.image.storage.__class__,
+            'save',
+            side_effect=OSError('нет места')
+        ):
+            call_command('process_images', processes=0, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, name)
+        self.assertTrue(post.image.storage.exists(name))
+
+    def test_unexpected_error_fails_job_not_worker(self):
+        """Любое исключение при обработке записывается в задание,
+        а зависшее задание без попыток не возвращается в очередь."""
+        self.authorized_client.post(
+            reverse('new_post'),
+            data={
+                'text': 'Пост с битой картинкой',
+                'image': SimpleUploadedFile(
+                    name='broken.gif',
+                    content=self.small_gif,
+                    content_type='image/gif'
+                ),
+            },
+        )
+        job = ImageJob.objects.get(post__text='Пост с битой картинкой')
+        with mock.patch(
+            'posts.image_jobs.prepare_original',
+            side_effect=RuntimeError('сбой декодера')
+        ):
+            self.assertEqual(image_jobs.run_pending(limit=1), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.PENDING)
+        self.assertEqual(job.error, 'сбой декодера')
+
+        long_ago = timezone.now() - timedelta(
+            seconds=settings.IMAGE_JOB_STALE_TIMEOUT + 1
+        )
+        ImageJob.objects.filter(pk=job.pk).update(
+            status=ImageJob.RUNNING,
+            started=long_ago,
+            attempts=settings.IMAGE_JOB_MAX_ATTEMPTS
+        )
+        self.assertEqual(image_jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.FAILED)
+
+        ImageJob.objects.filter(pk=job.pk).update(
+            status=ImageJob.RUNNING,
+            attempts=1
+        )
+        self.assertEqual(image_jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.PENDING)
+
+    def upload(self, name, content, content_type='image/png'):
+        return self.authorized_client.post(
+            reverse('new_post'),
+            data={
+                'text': 'Пост с проверкой картинки',
+                'image': SimpleUploadedFile(
+                    name=name,
+                    content=content,
+                    content_type=content_type
+                ),
+            },
+        )
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_upload_over_size_limit_rejected(self):
+        """Файл больше POST_IMAGE_MAX_UPLOAD_SIZE отклоняется формой."""
+        response = self.upload('big.gif', self.small_gif * 10, 'image/gif')
+        self.assertFormError(
+            response,
+            'form',
+            'image',
+            'Файл больше 100\xa0байт.'
+        )
+        self.assertFalse(
+            Post.objects.filter(text='Пост с проверкой картинки').exists()
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000000)
+    def test_decompression_bomb_rejected_by_header(self):
+        """Картинка с огромным числом пикселей отклоняется по заголовку,
+        без декодирования."""
+        buffer = BytesIO()
+        Image.new('L', (2000, 1000)).save(buffer, 'PNG')
+        with mock.patch.object(Image.Image, 'load') as load:
+            response = self.upload('bomb.png', buffer.getvalue())
+        load.assert_not_called()
+        self.assertFormError(
+            response,
+            'form',
+            'image',
+            'Картинка 2000×1000 слишком большая: не больше 1 Мп.'
+        )
+
+    def test_unsupported_format_rejected(self):
+        """Картинки в форматах вне POST_IMAGE_FORMATS не принимаются."""
+        buffer = BytesIO()
+        Image.new('RGB', (2, 2)).save(buffer, 'BMP')
+        response = self.upload('image.png', buffer.getvalue())
+        self.assertFormError(
+            response,
+            'form',
+            'image',
+            'Формат BMP не поддерживается.'
+        )
@@ -0,0 +1,292 @@
+import json
+
+import shutil
+
+import tempfile
+
+import warnings
+
+from io import StringIO
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+
+from django.core.management import call_command
+
+from django.db import connections
+
+from django.db.models import QuerySet
+
+from django.test import Client
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+
+from django.test.utils import CaptureQueriesContext
+
+from django.urls import reverse
+
+from posts.management.commands.bench_feeds import Command as BenchFeeds
+
+from posts.models import Comment
+from posts.models import Post
+
+from yatube import metrics
+from yatube import routers
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_TOKEN='secret')
+class MetricsMiddlewareTest(TestCase):
+    '''Замеры времени ответа и /metrics/'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.staff = User.objects.create(username='Admin', is_staff=True)
+        Post.objects.create(text='Тестовое сообщение!!!', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_server_timing_header(self):
+        """Замеренный запрос отдаёт время SQL, шаблонов и общее."""
+        response = self.client.get(reverse('index'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_not_sampled_request_only_total(self):
+        """Запрос вне выборки получает только общее время и не попадает
+        в гистограммы."""
+        response = self.client.get(reverse('index'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+$')
+        self.assertEqual(metrics.summary(), {})
+
+    def test_summary_per_view(self):
+        """Сводка ведётся по представлениям, включая классы."""
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.client.get(reverse('about:author'))
+        summary = metrics.summary()
+
+        index = summary['posts.views.index']
+        self.assertEqual(index['count'], 2)
+        self.assertGreater(index['queries_mean'], 0)
+        self.assertGreater(index['template_ms_mean'], 0)
+        self.assertEqual(sum(index['histogram_ms'].values()), 2)
+        self.assertIn('about.views.AboutAuthorView', summary)
+
+    def test_page_cache_hits_counted_separately(self):
+        """Ответ из кэша страниц учитывается под отдельным именем,
+        которое годится в ключ любого бэкенда кэша."""
+        anonymous = Client()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            anonymous.get(reverse('index'))
+            anonymous.get(reverse('index'))
+            summary = metrics.summary()
+        self.assertEqual(summary['posts.views.index']['count'], 1)
+        self.assertEqual(
+            summary['posts.views.index' + metrics.PAGE_CACHE_SUFFIX]['count'],
+            1
+        )
+
+    def test_endpoint_protected(self):
+        """Сводку видят персонал и обладатель токена."""
+        url = reverse('metrics')
+        self.client.get(reverse('index'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(
+            Client().get(url, HTTP_X_METRICS_TOKEN='wrong').status_code,
+            403
+        )
+        response = Client().get(url, HTTP_X_METRICS_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sample_rate'], 1)
+
+        staff_client = Client()
+        staff_client.force_login(self.staff)
+        response = staff_client.get(url)
+        self.assertIn('posts.views.index', response.json()['views'])
+
+
+@override_settings(METRICS_SAMPLE_RATE=1)
+class ReplicaMetricsTest(TransactionTestCase):
+    '''Замеры запросов, которые идут через реплику'''
+    databases = {'default', routers.REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        # В тестах реплика — зеркало 'default'. Отдельное соединение
+        # с другим именем той же базы в памяти делает её настоящей:
+        # чтение вне транзакции уходит на него.
+        replica = connections[routers.REPLICA]
+        name = replica.settings_dict['NAME']
+        replica.close()
+        replica.settings_dict['NAME'] = name + '&replica=1'
+        self.addCleanup(replica.settings_dict.__setitem__, 'NAME', name)
+        self.addCleanup(replica.close)
+        self.assertTrue(routers.replica_available())
+
+        User = get_user_model()
+        author = User.objects.create(username='Avtor')
+        Post.objects.create(text='Тестовое сообщение!!!', author=author)
+
+    def capture(self):
+        return [
+            CaptureQueriesContext(connections[alias])
+            for alias in ('default', routers.REPLICA)
+        ]
+
+    def test_replica_queries_counted(self):
+        """Server-Timing и сводка считают и запросы к реплике."""
+        default, replica = self.capture()
+        with default, replica:
+            response = Client().get(reverse('index'))
+        self.assertTrue(replica.captured_queries)
+        queries = len(default.captured_queries) + len(
+            replica.captured_queries
+        )
+        self.assertIn(
+            'desc="{0} queries"'.format(queries),
+            response['Server-Timing']
+        )
+        summary = metrics.summary()
+        self.assertEqual(
+            summary['posts.views.index']['queries_mean'],
+            queries
+        )
+
+    def test_bench_counts_replica_queries(self):
+        default, replica = self.capture()
+        with default, replica:
+            result = BenchFeeds().measure(
+                Client(),
+                [reverse('index')],
+                'cold',
+                1
+            )
+        self.assertTrue(replica.captured_queries)
+        self.assertEqual(
+            result['queries_max'],
+            len(default.captured_queries) + len(replica.captured_queries)
+        )
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, N_PLUS_ONE_THRESHOLD=3)
+class QueryLogTest(TestCase):
+    '''Журнал медленных и повторяющихся запросов'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.post = Post.objects.create(text='Тестовое', author=cls.author)
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create(username='Reader{0}'.format(
+                    number
+                )),
+                text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def events(self, url):
+        cache.clear()
+        with self.assertLogs('yatube.queries') as logs:
+            self.client.get(url)
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_repeated_query_flagged(self):
+        """Повторяющийся в цикле шаблона запрос помечается как N+1
+        с местом в шаблоне."""
+        url = '/{0}/{1}/'.format(self.author.username, self.post.id)
+        with self.assertRaises(AssertionError):
+            self.events(url)
+        # Без select_related авторы комментариев читаются по одному.
+        with mock.patch.object(
+            QuerySet,
+            'select_related',
+            lambda queryset, *fields: queryset
+        ):
+            with override_settings(N_PLUS_ONE_THRESHOLD=100):
+                with self.assertRaises(AssertionError):
+                    self.events(url)
+            events = [
+                event for event in self.events(url)
+                if event['kind'] == 'n+1'
+            ]
+        self.assertTrue(events)
+        event = events[0]
+        self.assertEqual(event['view'], 'posts.views.post_view')
+        self.assertGreaterEqual(event['count'], 3)
+        self.assertRegex(event['template'], r'\.html:\d+$')
+        self.assertNotIn("'Reader", event['sql'])
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_query_logged(self):
+        """Запросы дольше SLOW_QUERY_MS попадают в журнал с местом
+        в коде проекта."""
+        events = [
+            event for event in self.events('/')
+            if event['kind'] == 'slow'
+        ]
+        self.assertTrue(events)
+        self.assertTrue(any(
+            (event['code'] or '').startswith('posts/') for event in events
+        ))
+
+    @override_settings(METRICS_SAMPLE_RATE=0, SLOW_QUERY_MS=0)
+    def test_slow_query_logged_outside_sample(self):
+        """Медленные запросы попадают в журнал и из незамеренных
+        HTTP-запросов, поиск N+1 — только в замеренных."""
+        url = '/{0}/{1}/'.format(self.author.username, self.post.id)
+        with mock.patch.object(
+            QuerySet,
+            'select_related',
+            lambda queryset, *fields: queryset
+        ):
+            events = self.events(url)
+        self.assertEqual({event['kind'] for event in events}, {'slow'})
+        self.assertEqual(events[0]['view'], 'posts.views.post_view')
+
+    def test_report(self):
+        """query_report сводит журнал по представлению и форме SQL."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = directory + '/queries.log'
+        event = {
+            'kind': 'n+1',
+            'sql': 'SELECT * FROM auth_user WHERE id = %s',
+            'view': 'posts.views.post_view',
+            'count': 12,
+            'template': 'includes/comments.html:7',
+            'code': None,
+        }
+        with open(path, 'w', encoding='utf-8') as log:
+            for count in (12, 30):
+                log.write(json.dumps(dict(event, count=count)) + '\n')
+            log.write('не JSON\n')
+
+        out = StringIO()
+        call_command('query_report', log=path, stdout=out)
+        report = out.getvalue()
+        self.assertIn(
+            '[n+1] posts.views.post_view: 2 запросов, до 30 повторов',
+            report
+        )
+        self.assertIn('<- includes/comments.html:7', report)
@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+
+from django.test import Client
+from django.test import TestCase
+
+from django.urls import reverse
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Post
+
+
+class AnonymousPageCacheTest(TestCase):
+    '''Полностраничный кэш для анонимных посетителей'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.post = Post.objects.create(
+            text='Тестовое сообщение!!!',
+            author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.post_url = reverse('post_view', kwargs={
+            'username': self.author,
+            'post_id': self.post.id
+        })
+
+    def test_repeated_anonymous_get_skips_orm(self):
+        """Повторная анонимная страница отдаётся без запросов к базе."""
+        for url in (
+            reverse('index'),
+            reverse('profile', kwargs={'username': self.author}),
+            self.post_url,
+        ):
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first['ETag'], second['ETag'])
+                self.assertTrue(second.has_header('Last-Modified'))
+
+    def test_conditional_get_returns_304(self):
+        """If-None-Match и If-Modified-Since дают 304 без тела."""
+        response = self.guest_client.get(self.post_url)
+        with self.assertNumQueries(0):
+            not_modified = self.guest_client.get(
+                self.post_url,
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        not_modified = self.guest_client.get(
+            self.post_url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_comment_and_follow_invalidate_pages(self):
+        """Комментарий и подписка меняют ETag и содержимое страниц."""
+        response = self.guest_client.get(self.post_url)
+        Comment.objects.create(
+            post=self.post,
+            author=self.reader,
+            text='Свежий комментарий'
+        )
+        fresh = self.guest_client.get(
+            self.post_url,
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(fresh.status_code, 200)
+        self.assertContains(fresh, 'Свежий комментарий')
+
+        profile_url = reverse('profile', kwargs={'username': self.author})
+        response = self.guest_client.get(profile_url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        fresh = self.guest_client.get(profile_url)
+        self.assertNotEqual(response['ETag'], fresh['ETag'])
+        self.assertEqual(fresh.context['author_stats'].followers_count, 1)
+
+    def test_logged_in_user_is_not_served_cached_page(self):
+        """Страница из анонимного кэша не отдаётся вошедшему
+        пользователю."""
+        self.guest_client.get(reverse('index'))
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = reader_client.get(reverse('index'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertContains(response, 'Chitatel')
@@ -0,0 +1,99 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+
+from django.db import connection
+
+from django.test import Client
+from django.test import TestCase
+
+from django.urls import reverse
+
+from posts.models import Post
+
+from posts.paginator import CursorPaginator
+
+from yatube.settings import POSTS_LIMIT
+
+
+class CursorPaginatorTest(TestCase):
+    '''Курсорная паджинация лент'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        # Все посты с одной датой: порядок держится только на id.
+        Post.objects.bulk_create([
+            Post(text='Сообщение {0}'.format(number), author=cls.author)
+            for number in range(POSTS_LIMIT * 2 + 3)
+        ])
+        pub_date = Post.objects.first().pub_date
+        Post.objects.update(pub_date=pub_date)
+        cls.all_posts = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_walk_forward_and_back(self):
+        """Страницы покрывают ленту без пропусков и повторов
+        в обе стороны."""
+        paginator = CursorPaginator(Post.objects.all(), POSTS_LIMIT)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual(
+            [post for page in pages for post in page],
+            self.all_posts
+        )
+        self.assertEqual([len(page) for page in pages], [10, 10, 3])
+        self.assertFalse(pages[0].has_previous())
+
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        first = paginator.get_page(previous.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор не ломает страницу."""
+        paginator = CursorPaginator(Post.objects.all(), POSTS_LIMIT)
+        for cursor in ('мусор', 'bnwyMDIxfHg=', ''):
+            with self.subTest(cursor=cursor):
+                page = paginator.get_page(cursor)
+                self.assertEqual(list(page), self.all_posts[:POSTS_LIMIT])
+
+    def test_deep_page_has_no_count_query(self):
+        """Глубокая страница стоит один запрос, без COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), POSTS_LIMIT)
+        cursor = paginator.get_page().next_cursor
+        url = '{0}?cursor={1}'.format(reverse('index'), cursor)
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url)
+        self.assertEqual(
+            list(response.context['page']),
+            self.all_posts[POSTS_LIMIT:POSTS_LIMIT * 2]
+        )
+        self.assertContains(response, '?cursor=')
+
+    @skipUnless(connection.vendor == 'sqlite', 'план запроса SQLite')
+    def test_next_page_uses_index_range(self):
+        """Страница по курсору — диапазон по индексу даты, а не обход
+        ленты с начала."""
+        paginator = CursorPaginator(Post.objects.all(), POSTS_LIMIT)
+        cursor = paginator.get_page().next_cursor
+        for direction_cursor in (
+            cursor,
+            paginator.get_page(cursor).previous_cursor,
+        ):
+            with self.subTest(cursor=direction_cursor):
+                queryset, _ = paginator.page_queryset(direction_cursor)
+                self.assertRegex(
+                    queryset.explain(),
+                    r'SEARCH .*pub_date[<>]\?'
+                )
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+
+from django.core.cache import cache
+
+from django.test import Client
+from django.test import TestCase
+from django.test import override_settings
+
+from django.urls import reverse
+
+from posts.models import Post
+
+from yatube import ratelimit
+
+
+@override_settings(
+    RATELIMITS={'post': (2, 60), 'signup': (1, 60)},
+    RATELIMIT_IP_FACTOR=2
+)
+class RateLimitTest(TestCase):
+    '''Ограничение частоты записей'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.users = [
+            User.objects.create(username='Avtor{0}'.format(number))
+            for number in range(3)
+        ]
+        cls.staff = User.objects.create(username='Admin', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def new_post(self, client):
+        return client.post(reverse('new_post'), {'text': 'Пост'})
+
+    def test_user_bucket(self):
+        """Третий пост за минуту — 429 с Retry-After, форма (GET)
+        жетонов не тратит."""
+        client = self.client_for(self.users[0])
+        self.assertEqual(client.get(reverse('new_post')).status_code, 200)
+        for _ in range(2):
+            self.assertEqual(self.new_post(client).status_code, 302)
+        response = self.new_post(client)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Post.objects.count(), 2)
+
+        # Через 30 секунд в ведре снова есть жетон.
+        now = ratelimit.time.time()
+        with mock.patch('yatube.ratelimit.time.time', return_value=now + 31):
+            self.assertEqual(self.new_post(client).status_code, 302)
+
+    def test_ip_bucket(self):
+        """Ведро адреса общее для пользователей: больше
+        capacity * RATELIMIT_IP_FACTOR постов с одного IP не пройдёт."""
+        statuses = [
+            self.new_post(self.client_for(user)).status_code
+            for user in self.users
+            for _ in range(2)
+        ]
+        self.assertEqual(statuses, [302] * 4 + [429] * 2)
+        other = Client(REMOTE_ADDR='10.0.0.2')
+        other.force_login(self.users[2])
+        self.assertEqual(self.new_post(other).status_code, 302)
+
+    def test_rejected_request_keeps_ip_tokens(self):
+        """Запрос, отклонённый ведром пользователя, не тратит жетон
+        ведра адреса: соседи по адресу его не теряют."""
+        client = self.client_for(self.users[0])
+        statuses = [self.new_post(client).status_code for _ in range(3)]
+        self.assertEqual(statuses, [302, 302, 429])
+        neighbour = self.client_for(self.users[1])
+        statuses = [self.new_post(neighbour).status_code for _ in range(2)]
+        self.assertEqual(statuses, [302, 302])
+
+    def test_signup_limited_and_counted(self):
+        """Анонимные запросы ограничиваются только по адресу ровно
+        на capacity, без RATELIMIT_IP_FACTOR; счётчики видны
+        в /metrics/."""
+        data = {'username': 'novichok', 'password1': 'x', 'password2': 'y'}
+        statuses = [
+            Client().post(reverse('signup'), data).status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [200, 429, 429])
+
+        response = self.client_for(self.staff).get(reverse('metrics'))
+        self.assertEqual(
+            response.json()['ratelimit']['signup'],
+            {'allowed': 1, 'limited': 2}
+        )
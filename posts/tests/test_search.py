@@ -0,0 +1,150 @@
+from importlib import import_module
+
+from types import SimpleNamespace
+
+from django.apps import apps
+
+from django.contrib.auth import get_user_model
+
+from django.db import connection
+
+from django.test import Client
+from django.test import TestCase
+from django.test import override_settings
+
+from django.urls import reverse
+
+from posts import search
+
+from posts.models import Comment
+from posts.models import Group
+from posts.models import Post
+
+
+class SearchTest(TestCase):
+    '''Поисковый индекс и страница /search/'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.staff = User.objects.create(
+            username='Admin',
+            is_staff=True,
+            is_superuser=True
+        )
+        cls.group = Group.objects.create(
+            title='Кошки и собаки',
+            slug='cats',
+            description='Группа о животных'
+        )
+        cls.cat = Post.objects.create(
+            text='Кошка кошка кошка спит на диване',
+            author=cls.author,
+            group=cls.group
+        )
+        cls.dog = Post.objects.create(
+            text='Собака лает, кошка убегает',
+            author=cls.author
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.dog,
+            author=cls.author,
+            text='Хороший пёс'
+        )
+
+    def test_ranked_prefix_search(self):
+        """Слова ищутся как префиксы, чаще упомянутое — выше."""
+        self.assertEqual(search.search_ids('кошк'), [self.cat.pk, self.dog.pk])
+        self.assertEqual(search.search_ids('кошка собака'), [self.dog.pk])
+        self.assertEqual(search.search_ids('!!!'), [])
+        self.assertEqual(
+            search.search_ids('пёс', search.COMMENT),
+            [self.comment.pk]
+        )
+        self.assertEqual(
+            search.search_ids('кошки', search.GROUP),
+            [self.group.pk]
+        )
+
+    def test_index_follows_changes(self):
+        """Сигналы обновляют индекс при правке и удалении."""
+        dog = Post.objects.get(pk=self.dog.pk)
+        dog.text = 'Собака спит'
+        dog.save()
+        self.assertEqual(search.search_ids('кошка'), [self.cat.pk])
+        Comment.objects.get(pk=self.comment.pk).delete()
+        self.assertEqual(search.search_ids('пёс', search.COMMENT), [])
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Коты'
+        group.save()
+        self.assertEqual(search.search_ids('кошки', search.GROUP), [])
+
+    def test_post_delete_removes_its_comments(self):
+        """Комментарии удалённого поста уходят из индекса вместе
+        с ним."""
+        Post.objects.get(pk=self.dog.pk).delete()
+        self.assertEqual(search.search_ids('собака'), [])
+        self.assertEqual(search.search_ids('пёс', search.COMMENT), [])
+        self.assertEqual(
+            search.search_ids('кошк', search.POST),
+            [self.cat.pk]
+        )
+
+    def test_migration_builds_same_index(self):
+        """Миграция 0021 строит индекс своей копией схемы, которая
+        совпадает с posts.search."""
+        migration = import_module('posts.migrations.0021_search_index')
+        schema_editor = SimpleNamespace(connection=connection)
+        migration.drop_index(apps, schema_editor)
+        migration.create_index(apps, schema_editor)
+        self.assertEqual(search.search_ids('кошк'), [self.cat.pk, self.dog.pk])
+        self.assertEqual(
+            search.search_ids('пёс', search.COMMENT),
+            [self.comment.pk]
+        )
+        self.assertEqual(
+            search.search_ids('кошки', search.GROUP),
+            [self.group.pk]
+        )
+        self.assertEqual(migration.TABLE, search.TABLE)
+        self.assertEqual(
+            list(migration.SOURCES),
+            [
+                (search.MODELS[name].__name__, search.FIELDS[name], kind)
+                for name, kind in search.KINDS.items()
+            ]
+        )
+
+    @override_settings(POSTS_LIMIT=1)
+    def test_search_page(self):
+        """Страница результатов показывает записи и листается."""
+        response = Client().get(reverse('search'), {'q': 'кошка'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page']), [self.cat])
+        self.assertContains(response, 'cursor=1')
+
+        response = Client().get(
+            reverse('search'),
+            {'q': 'кошка', 'cursor': '1'}
+        )
+        self.assertEqual(list(response.context['page']), [self.dog])
+
+        response = Client().get(
+            reverse('search'),
+            {'q': 'пёс', 'type': 'comment'}
+        )
+        self.assertContains(response, 'Хороший пёс')
+
+    def test_admin_uses_index(self):
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(
+            reverse('admin:posts_post_changelist'),
+            {'q': 'диван'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list),
+            [self.cat]
+        )
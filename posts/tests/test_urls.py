@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 
+from django.core.cache import cache
+
 from django.test import Client
 from django.test import TestCase
 
@@ -21,6 +23,7 @@ class TaskURLTests(TestCase):
 class StaticURLTests(TestCase):
     def setUp(self):
         """Создание экземпляра неавторизованного клиента."""
+        cache.clear()
         self.guest_client = Client()
 
     def test_homepage(self):
@@ -57,6 +60,7 @@ class PostModelTest(TestCase):
     def setUp(self):
         """ Создание неавторизованного клиента и
         клиента с авторизованным пользователем"""
+        cache.clear()
         self.guest_client = Client()
 
         user_1 = get_user_model()
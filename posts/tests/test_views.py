@@ -2,7 +2,7 @@ import shutil
 
 import tempfile
 
-import time
+from unittest import mock
 
 from django import forms
 
@@ -10,16 +10,26 @@ from django.conf import settings
 
 from django.contrib.auth import get_user_model
 
+from django.core.cache import cache
+
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from django.db import connection
+
 from django.test import Client
 from django.test import TestCase
+from django.test import override_settings
+
+from django.test.utils import CaptureQueriesContext
 
 from django.urls import reverse
 
+from posts.models import AuthorStats
+from posts.models import Comment
 from posts.models import Follow
 from posts.models import Group
 from posts.models import Post
+from posts.models import TimelineEntry
 
 from yatube.settings import MEDIA_ROOT, POSTS_LIMIT
 
@@ -61,6 +71,7 @@ class PostPagesTest(TestCase):
     def setUp(self):
         """ Создание неавторизованного клиента и
         клиента с авторизованным пользователем"""
+        cache.clear()
         self.guest_client = Client()
 
         user_1 = get_user_model()
@@ -253,21 +264,40 @@ class PostPagesTest(TestCase):
         self.assertEqual(test_profile_image, tim_post.image)
         self.assertEqual(test_post_view_image, tim_post.image)
 
-    # Проверка кэширования стартовой страницы
-    def test_cached_index_page(self):
-        """Стартовая страница сохранена в кэше."""
-        cached_response_1 = self.authorized_client_1.get(reverse('index'))
+    # Проверка кэширования карточек постов
+    def test_cached_post_card(self):
+        """Карточка поста берётся из кэша, пока пост не изменён."""
+        cache.clear()
+        self.authorized_client_1.get(reverse('index'))
 
-        Post.objects.filter(id=self.test_post.id).delete()
-        cached_response_2 = self.authorized_client_1.get(reverse('index'))
-        self.assertEqual(cached_response_1.content, cached_response_2.content)
+        Post.objects.filter(id=self.test_post.id).update(
+            text='Текст в обход сигналов'
+        )
+        cached_response = self.authorized_client_1.get(reverse('index'))
+        self.assertContains(cached_response, 'Тестовое сообщение!!!')
+
+        post = Post.objects.get(id=self.test_post.id)
+        post.text = 'Отредактированное сообщение'
+        post.save()
+        fresh_response = self.authorized_client_1.get(reverse('index'))
+        self.assertContains(fresh_response, 'Отредактированное сообщение')
+
+    def test_cached_post_card_keeps_edit_link_per_user(self):
+        """Кнопка «Редактировать» не попадает в общий кэш карточки."""
+        cache.clear()
+        edit_url = reverse('post_edit', kwargs={
+            'username': self.test_post.author,
+            'post_id': self.test_post.id
+        })
+        author_response = self.authorized_client_1.get(reverse('index'))
+        self.assertContains(author_response, edit_url)
+        other_response = self.authorized_client_2.get(reverse('index'))
+        self.assertNotContains(other_response, edit_url)
 
-        time.sleep(20)
-        cached_response_3 = self.authorized_client_1.get(reverse('index'))
-        self.assertNotEqual(
-            cached_response_1.content,
-            cached_response_3.content
+        group_response = self.authorized_client_1.get(
+            reverse('group', kwargs={'slug': self.ok_group.slug})
         )
+        self.assertContains(group_response, edit_url)
 
     # Проверка работоcпособности подписки/отписки
     def test_follow(self):
@@ -319,3 +349,374 @@ class PostPagesTest(TestCase):
         response = self.authorized_client_1.get(reverse('follow_index'))
         follow_index_page_view_2 = response.context.get('page')
         self.assertNotIn(kat_post, follow_index_page_view_2)
+
+
+class FeedQueriesTest(TestCase):
+    """Количество SQL-запросов ленты не зависит от числа постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.group = Group.objects.create(
+            title='Группа для ленты',
+            slug='feed-slug',
+            description='Описание группы для ленты'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(POSTS_LIMIT):
+            post = Post.objects.create(
+                text='Сообщение номер {0}'.format(number),
+                author=cls.author,
+                group=cls.group
+            )
+            for _ in range(2):
+                Comment.objects.create(
+                    post=post,
+                    author=cls.reader,
+                    text='Комментарий'
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_pages_num_queries(self):
+        """Лента из POSTS_LIMIT постов строится фиксированным
+        числом запросов."""
+        # Запросы: страница постов (без COUNT, паджинатор курсорный),
+        # плюс выборка группы/автора и сессия с пользователем.
+        feed_pages = {
+            reverse('index'): (self.guest_client, 1),
+            reverse('group', kwargs={'slug': self.group.slug}): (
+                self.guest_client, 2
+            ),
+            reverse('profile', kwargs={'username': self.author}): (
+                self.guest_client, 2
+            ),
+            reverse('follow_index'): (self.reader_client, 5),
+        }
+        for url, (client, num_queries) in feed_pages.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(num_queries):
+                    response = client.get(url)
+                self.assertEqual(len(response.context['page']), POSTS_LIMIT)
+
+    def test_post_comments_paginated(self):
+        """Комментарии к посту выводятся страницами вместе с авторами,
+        следующая страница отдаётся в JSON."""
+        post = Post.objects.filter(author=self.author).first()
+        for number in range(5):
+            Comment.objects.create(
+                post=post,
+                author=get_user_model().objects.create(
+                    username='Reader{0}'.format(number)
+                ),
+                text='Ответ {0}'.format(number)
+            )
+        url = reverse('post_view', args=(self.author, post.id))
+        with mock.patch('posts.views.COMMENTS_LIMIT', 3):
+            # Пост с автором и его счётчиками и одна страница
+            # комментариев с их авторами.
+            with self.assertNumQueries(2):
+                response = self.guest_client.get(url)
+            page = response.context['comment_page']
+            self.assertEqual(
+                [comment.text for comment in page],
+                ['Ответ 4', 'Ответ 3', 'Ответ 2']
+            )
+            self.assertContains(response, 'Показать ещё')
+
+            response = self.guest_client.get(
+                reverse('post_comments', args=(self.author, post.id)),
+                {'cursor': page.next_cursor}
+            )
+        data = response.json()
+        self.assertIn('Ответ 1', data['html'])
+        self.assertIn('Ответ 0', data['html'])
+        self.assertIn('Reader0', data['html'])
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_feed_comment_count_annotation(self):
+        """Количество комментариев берётся из аннотации for_feed."""
+        response = self.guest_client.get(reverse('index'))
+        for post in response.context['page']:
+            with self.subTest(post=post.pk):
+                self.assertEqual(post.comment_count, 2)
+        self.assertContains(response, 'Комментариев: 2', count=POSTS_LIMIT)
+
+
+class FollowTimelineTest(TestCase):
+    """Материализованная лента подписок."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('follow_index'))
+        return list(response.context['page'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дописывает старые посты автора в ленту,
+        отписка их убирает."""
+        self.reader_client.get(reverse(
+            'profile_follow',
+            kwargs={'username': self.author}
+        ))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader,
+            post=self.old_post
+        ).exists())
+        self.assertEqual(self.feed(), [self.old_post])
+
+        self.reader_client.get(reverse(
+            'profile_unfollow',
+            kwargs={'username': self.author}
+        ))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков при сохранении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(
+            text='Пост после подписки',
+            author=self.author
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader,
+            post=new_post
+        ).exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_request(self):
+        """Посты авторов с множеством подписчиков не раскладываются,
+        а подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(
+            text='Пост знаменитости',
+            author=self.author
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_author_below_limit_fans_out_again(self):
+        """Когда подписчиков снова не больше порога, посты, написанные
+        «знаменитостью», попадают в ленты всех подписчиков, в том числе
+        подписавшихся в это время."""
+        User = get_user_model()
+        second = User.objects.create(username='Vtoroy')
+        late = User.objects.create(username='Pozdniy')
+        for user in (self.reader, second, late):
+            Follow.objects.create(user=user, author=self.author)
+        celebrity_post = Post.objects.create(
+            text='Пост знаменитости',
+            author=self.author
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=celebrity_post).exists()
+        )
+
+        Follow.objects.filter(user=second).delete()
+        for user in (self.reader, late):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    set(TimelineEntry.objects.filter(user=user).values_list(
+                        'post',
+                        flat=True
+                    )),
+                    {self.old_post.pk, celebrity_post.pk}
+                )
+        self.assertEqual(self.feed(), [celebrity_post, self.old_post])
+
+
+class AuthorStatsTest(TestCase):
+    """Денормализованные счётчики автора и комментариев."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.reader = User.objects.create(username='Chitatel')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def assertStats(self, user, **expected):
+        stats = AuthorStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(user=user.username, field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при публикации, комментарии,
+        подписке и удалениях."""
+        self.author_client.post(reverse('new_post'), {'text': 'Новый пост'})
+        post = Post.objects.get(author=self.author)
+        self.assertStats(self.author, posts_count=1)
+
+        self.reader_client.post(
+            reverse('add_comment', args=(self.author, post.id)),
+            {'text': 'Комментарий'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        self.reader_client.get(reverse('profile_follow', args=(self.author,)))
+        self.assertStats(self.author, followers_count=1)
+        self.assertStats(self.reader, following_count=1)
+
+        self.reader_client.get(
+            reverse('profile_unfollow', args=(self.author,))
+        )
+        self.assertStats(self.author, followers_count=0)
+        self.assertStats(self.reader, following_count=0)
+
+        Comment.objects.filter(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        post.delete()
+        self.assertStats(self.author, posts_count=0)
+
+    def test_profile_shows_stats_without_count_queries(self):
+        """Карточка автора берёт числа из AuthorStats."""
+        Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(
+            reverse('profile', args=(self.author,))
+        )
+        self.assertEqual(response.context['author_stats'].posts_count, 1)
+        self.assertEqual(
+            response.context['author_stats'].followers_count,
+            1
+        )
+
+
+class FeedCacheTest(TestCase):
+    """Кэш страниц лент сбрасывается сигналами, а не по таймауту."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        User = get_user_model()
+        cls.author = User.objects.create(username='Avtor')
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.group = Group.objects.create(
+            title='Группа для кэша',
+            slug='cache-slug',
+            description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Первый пост',
+            author=cls.author,
+            group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_cached_feed_page_has_no_queries(self):
+        """Повторный запрос ленты не обращается к базе за постами:
+        остаются только сессия и пользователь."""
+        self.reader_client.get(reverse('index'))
+        with self.assertNumQueries(2):
+            response = self.reader_client.get(reverse('index'))
+        self.assertEqual(list(response.context['page']), [self.post])
+
+    def test_writes_invalidate_affected_feeds(self):
+        """Новый пост, комментарий и правка группы видны сразу."""
+        group_url = reverse('group', kwargs={'slug': self.group.slug})
+        profile_url = reverse('profile', kwargs={'username': self.author})
+        for url in (reverse('index'), group_url, profile_url):
+            self.guest_client.get(url)
+
+        new_post = Post.objects.create(
+            text='Второй пост',
+            author=self.author,
+            group=self.group
+        )
+        for url in (reverse('index'), group_url, profile_url):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.context['page'][0], new_post)
+
+        Comment.objects.create(post=new_post, author=self.reader, text='Да')
+        response = self.guest_client.get(group_url)
+        self.assertEqual(response.context['page'][0].comment_count, 1)
+
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Новое название')
+
+    def test_follow_invalidates_follow_feed(self):
+        """Подписка и новый пост автора сразу видны в ленте подписок."""
+        self.reader_client.get(reverse('follow_index'))
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']), [self.post])
+
+        new_post = Post.objects.create(text='Новый', author=self.author)
+        response = self.reader_client.get(reverse('follow_index'))
+        self.assertEqual(response.context['page'][0], new_post)
+
+    def test_post_delete_cost_does_not_grow_with_comments(self):
+        """Удаление поста с комментариями сбрасывает кэш один раз:
+        число запросов не зависит от числа комментариев."""
+        counts = []
+        for comments in (2, 30):
+            post = Post.objects.create(text='Обсуждаемый', author=self.author)
+            Comment.objects.bulk_create([
+                Comment(post=post, author=self.reader, text='Комментарий')
+                for _ in range(comments)
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Comment.objects.filter(text='Комментарий').exists())
+
+    def test_comment_delete_updates_post(self):
+        """Удаление отдельного комментария по-прежнему меняет счётчик
+        и сбрасывает ленты поста."""
+        comment = Comment.objects.create(
+            post=self.post,
+            author=self.reader,
+            text='Лишний'
+        )
+        self.guest_client.get(reverse('index'))
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        response = self.guest_client.get(reverse('index'))
+        self.assertEqual(response.context['page'][0].comment_count, 0)
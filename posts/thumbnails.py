@@ -0,0 +1,120 @@
+"""Миниатюры картинок постов, подготовленные при загрузке.
+
+Миниатюры всех размеров из POST_THUMBNAIL_SIZES строятся один раз
+фоновым заданием после загрузки (posts.image_jobs), а их адреса хранятся
+в Post.thumbnails. Шаблоны лент берут готовые адреса и не обращаются ни
+к Pillow, ни к хранилищу ключей sorl-thumbnail.
+
+Каждый размер сохраняется в нескольких форматах (AVIF, WebP и JPEG
+в порядке предпочтения). Формат выбирает браузер по <source type> в
+<picture>: сам он знает, что умеет показывать, а HTML страницы остаётся
+одинаковым для всех клиентов и кэшируется без Vary: Accept.
+"""
+import json
+
+import os
+
+from io import BytesIO
+
+from django.conf import settings
+
+from django.core.files.base import ContentFile
+
+from PIL import Image
+from PIL import ImageOps
+
+THUMBNAILS_DIR = 'posts/thumbs'
+
+# Формат миниатюры: (формат Pillow, расширение, параметры кодировщика).
+FORMATS = {
+    'avif': ('AVIF', 'avif', {'quality': 60}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': (
+        'JPEG',
+        'jpg',
+        {'quality': 85, 'optimize': True, 'progressive': True}
+    ),
+}
+# Запасной формат для <img>, его понимает любой браузер.
+FALLBACK_FORMAT = 'jpeg'
+
+
+def available_formats():
+    """Форматы из POST_THUMBNAIL_FORMATS, которые умеет сохранять
+    установленный Pillow (AVIF — только с плагином); JPEG есть всегда."""
+    Image.init()
+    formats = [
+        name for name in settings.POST_THUMBNAIL_FORMATS
+        if name != FALLBACK_FORMAT and FORMATS[name][0] in Image.SAVE
+    ]
+    return formats + [FALLBACK_FORMAT]
+
+
+def thumbnail_name(image_name, width, height, image_format=FALLBACK_FORMAT):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return '{0}/{1}_{2}x{3}.{4}'.format(
+        THUMBNAILS_DIR,
+        stem,
+        width,
+        height,
+        FORMATS[image_format][1]
+    )
+
+
+def crop(image, width, height):
+    """Обрезка по центру до нужных пропорций (с увеличением маленьких
+    картинок, как crop="center" upscale=True у sorl)."""
+    thumbnail = ImageOps.fit(
+        image,
+        (width, height),
+        method=Image.LANCZOS,
+        centering=(0.5, 0.5)
+    )
+    if thumbnail.mode != 'RGB':
+        thumbnail = thumbnail.convert('RGB')
+    return thumbnail
+
+
+def encode(thumbnail, image_format):
+    pillow_format, _, params = FORMATS[image_format]
+    buffer = BytesIO()
+    thumbnail.save(buffer, pillow_format, **params)
+    return buffer.getvalue()
+
+
+def delete(post):
+    """Удаляет файлы миниатюр поста."""
+    storage = post.image.storage
+    for name in post.thumbnail_names():
+        storage.delete(name)
+
+
+def generate(post, image=None):
+    """Строит миниатюры картинки поста во всех размерах и форматах
+    и сохраняет их адреса в посте: {формат: {ширина: имя файла}}.
+    Уже открытую картинку можно передать в image."""
+    delete(post)
+    variants = {}
+    if post.image:
+        storage = post.image.storage
+        if image is None:
+            with storage.open(post.image.name) as source:
+                image = Image.open(source)
+                image.load()
+        formats = available_formats()
+        for width, height in settings.POST_THUMBNAIL_SIZES:
+            thumbnail = crop(image, width, height)
+            for image_format in formats:
+                variants.setdefault(image_format, {})[str(width)] = (
+                    storage.save(
+                        thumbnail_name(
+                            post.image.name,
+                            width,
+                            height,
+                            image_format
+                        ),
+                        ContentFile(encode(thumbnail, image_format))
+                    )
+                )
+    post.thumbnails = json.dumps(variants) if variants else ''
+    post.save(update_fields=['thumbnails', 'updated'])
@@ -0,0 +1,165 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Новый пост раскладывается по лентам всех подписчиков автора, поэтому
+страница /follow/ читает готовый диапазон из TimelineEntry. Для авторов
+с числом подписчиков больше TIMELINE_FANOUT_LIMIT раскладка не
+делается: их посты подмешиваются в ленту при чтении (fan-out on read).
+
+Пока автор «знаменитость», его новые посты и новые подписки на него
+в TimelineEntry не попадают. Когда число подписчиков опускается до
+порога (отписка, recount_stats), fan_out_author дописывает в ленты
+всех подписчиков все его посты, и лента снова читается только из
+TimelineEntry без пропусков.
+"""
+from django.conf import settings
+
+from django.db import connection
+
+from django.db.models import F
+from django.db.models import Q
+
+from posts.models import AuthorStats
+from posts.models import Follow
+from posts.models import Post
+from posts.models import TimelineEntry
+
+from posts.paginator import CursorPaginator
+
+BATCH_SIZE = 500
+
+
+def is_celebrity(author_id):
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).exists()
+
+
+def celebrity_ids(user):
+    """id авторов из подписок пользователя, чьи посты
+    не раскладываются по лентам."""
+    return list(AuthorStats.objects.filter(
+        user__in=Follow.objects.filter(user=user).values('author'),
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('user', flat=True))
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Кладёт пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(author=post.author_id).values_list(
+        'user',
+        flat=True
+    )
+    entries = []
+    for user_id in followers.iterator():
+        entries.append(TimelineEntry(
+            user_id=user_id,
+            post=post,
+            pub_date=post.pub_date
+        ))
+        if len(entries) >= BATCH_SIZE:
+            _bulk_insert(entries)
+            entries = []
+    _bulk_insert(entries)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя посты автора после подписки."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author=author_id).values_list(
+        'id',
+        'pub_date'
+    )
+    entries = []
+    for post_id, pub_date in posts.iterator():
+        entries.append(TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            pub_date=pub_date
+        ))
+        if len(entries) >= BATCH_SIZE:
+            _bulk_insert(entries)
+            entries = []
+    _bulk_insert(entries)
+
+
+def fan_out_author(author_id):
+    """Раскладывает все посты автора по лентам всех его подписчиков
+    (после массового импорта, который обходит сигналы). Строки
+    вставляются одним INSERT ... SELECT, не проходя через Python."""
+    if is_celebrity(author_id):
+        return
+    ops = connection.ops
+    sql = (
+        '{insert} {entry} (user_id, post_id, pub_date) '
+        'SELECT f.user_id, p.id, p.pub_date '
+        'FROM {follow} f INNER JOIN {post} p ON p.author_id = f.author_id '
+        'WHERE f.author_id = %s {suffix}'
+    ).format(
+        insert=ops.insert_statement(ignore_conflicts=True),
+        entry=ops.quote_name(TimelineEntry._meta.db_table),
+        follow=ops.quote_name(Follow._meta.db_table),
+        post=ops.quote_name(Post._meta.db_table),
+        suffix=ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [author_id])
+
+
+def followers_dropped(author_id):
+    """После отписки: автор, у которого подписчиков стало ровно
+    TIMELINE_FANOUT_LIMIT, только что перестал быть «знаменитостью» —
+    его посты раскладываются по лентам подписчиков заново."""
+    if AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT
+    ).exists():
+        fan_out_author(author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты пользователя после отписки."""
+    TimelineEntry.objects.filter(
+        user=user_id,
+        post__author=author_id
+    ).delete()
+
+
+def follow_feed(user):
+    """Лента подписок: готовые записи TimelineEntry плюс посты
+    авторов-«знаменитостей», читаемые напрямую.
+
+    Посты аннотированы ключами сортировки feed_date/feed_id для
+    CursorPaginator: в обычном случае это поля самой TimelineEntry,
+    и страница читается диапазоном индекса (user, -pub_date, -post)."""
+    posts = Post.objects.for_feed()
+    celebrities = celebrity_ids(user)
+    if not celebrities:
+        return posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_id=F('timeline_entries__post'),
+        )
+    return posts.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=celebrities)
+    ).annotate(feed_date=F('pub_date'), feed_id=F('pk'))
+
+
+def follow_paginator(user, per_page):
+    return CursorPaginator(
+        follow_feed(user),
+        per_page,
+        date_field='feed_date',
+        pk_field='feed_id'
+    )
@@ -0,0 +1,420 @@
+"""Массовый импорт и экспорт постов в JSON Lines.
+
+Каждая строка — одна запись с полем "type":
+
+    {"type": "group", "slug": ..., "title": ..., "description": ...}
+    {"type": "post", "id": 1, "author": "leo", "group": "cats",
+     "text": ..., "pub_date": "2021-03-01T10:00:00+00:00", "image": ...}
+    {"type": "comment", "post": 1, "author": ..., "text": ..., "created": ...}
+    {"type": "follow", "user": ..., "author": ...}
+
+Пользователи и группы указываются по username и slug, комментарии
+ссылаются на id поста из того же файла. Запись может ссылаться только
+на записи выше неё (export_posts пишет группы, посты, комментарии,
+подписки именно в таком порядке).
+
+Импорт читает файл потоком и сохраняет пачки через bulk_create, каждую
+в своей транзакции. Соответствие id поста в файле и в базе хранится не
+в памяти, а во временной таблице import_post_ids того же соединения:
+память импорта не растёт с размером файла. Даты из файла проставляются
+после bulk_create отдельным UPDATE: bulk_create заменяет их текущим
+временем (auto_now_add).
+
+bulk_create не вызывает сигналы, поэтому после импорта счётчики
+пересчитываются (posts.stats), ленты подписок раскладываются заново,
+новые записи попадают в поисковый индекс (posts.search), картинки
+ставятся в очередь обработки, а кэш лент сбрасывается.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+
+from django.contrib.auth.hashers import make_password
+
+from django.db import connection
+from django.db import transaction
+
+from django.db.models import Case
+from django.db.models import DateTimeField
+from django.db.models import Value
+from django.db.models import When
+
+from django.utils import timezone
+
+from django.utils.dateparse import parse_datetime
+
+from posts import feed_cache
+from posts import search
+from posts import stats
+from posts import timeline
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import ImageJob
+from posts.models import Post
+
+User = get_user_model()
+
+TYPES = ('group', 'post', 'comment', 'follow')
+
+POST_IDS_TABLE = 'import_post_ids'
+
+
+class TransferError(ValueError):
+    pass
+
+
+def reserve_ids(model, count):
+    """Резервирует count id в таблице SQLite с AUTOINCREMENT и возвращает
+    первый из них. Счётчик sqlite_sequence не опускается при удалении
+    строк, поэтому id удалённых постов не выдаются повторно. UPDATE
+    берёт блокировку записи до конца транзакции пачки: параллельная
+    запись получит id уже после зарезервированных."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s',
+            [count, table]
+        )
+        if not cursor.rowcount:
+            # В таблицу ещё ничего не вставляли.
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                [table, count]
+            )
+        cursor.execute(
+            'SELECT seq FROM sqlite_sequence WHERE name = %s',
+            [table]
+        )
+        return cursor.fetchone()[0] - count + 1
+
+
+def assign_ids(objects):
+    """Выдаёт id объектам до bulk_create там, где база не возвращает
+    их из вставки (SQLite). В PostgreSQL id выдаёт последовательность
+    и bulk_create их возвращает."""
+    if connection.features.can_return_ids_from_bulk_insert or not objects:
+        return
+    next_id = reserve_ids(objects[0].__class__, len(objects))
+    for number, instance in enumerate(objects):
+        instance.id = next_id + number
+
+
+def set_dates(model, field, dates):
+    """Проставляет даты из файла строкам, сохранённым bulk_create
+    с auto_now_add. dates — пары (id, дата)."""
+    dates = list(dates)
+    # Три параметра на строку: старые SQLite принимают не больше 999.
+    for start in range(0, len(dates), 300):
+        chunk = dates[start:start + 300]
+        model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(**{
+            field: Case(
+                *[
+                    When(pk=pk, then=Value(date, DateTimeField()))
+                    for pk, date in chunk
+                ],
+                output_field=DateTimeField()
+            )
+        })
+
+
+def _date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise TransferError('Некорректная дата: {0}'.format(value))
+    return date
+
+
+class Importer:
+    """Импорт потока записей пачками по batch_size.
+
+    Словари username -> id и slug -> id держатся в памяти: на каждую
+    пачку нужен один запрос только для ещё не встречавшихся имён.
+    id постов из файла комментарии пачки находят одним запросом
+    к временной таблице POST_IDS_TABLE."""
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.users = {}
+        self.groups = {}
+        self.authors = set()
+        self.counts = dict.fromkeys(TYPES, 0)
+        self.last_ids = {}
+
+    def resolve_users(self, usernames):
+        missing = set(usernames) - set(self.users) - {None}
+        if not missing:
+            return
+        self.users.update(User.objects.filter(
+            username__in=missing
+        ).values_list('username', 'id'))
+        new = missing - set(self.users)
+        if new:
+            # Авторы, которых нет в базе, создаются без пароля.
+            User.objects.bulk_create(
+                [
+                    User(username=username, password=make_password(None))
+                    for username in new
+                ],
+                batch_size=self.batch_size
+            )
+            self.users.update(User.objects.filter(
+                username__in=new
+            ).values_list('username', 'id'))
+
+    def resolve_groups(self, slugs):
+        missing = set(slugs) - set(self.groups) - {None}
+        if missing:
+            self.groups.update(Group.objects.filter(
+                slug__in=missing
+            ).values_list('slug', 'id'))
+        unknown = missing - set(self.groups)
+        if unknown:
+            raise TransferError('Неизвестные группы: {0}'.format(
+                ', '.join(sorted(unknown))
+            ))
+
+    def save_groups(self, records):
+        Group.objects.bulk_create(
+            [
+                Group(
+                    slug=record['slug'],
+                    title=record['title'],
+                    description=record.get('description', '')
+                )
+                for record in records
+            ],
+            ignore_conflicts=True
+        )
+        self.resolve_groups(record['slug'] for record in records)
+
+    def save_posts(self, records):
+        self.resolve_users(record['author'] for record in records)
+        self.resolve_groups(record.get('group') for record in records)
+        dates = [_date(record.get('pub_date')) for record in records]
+        posts = [
+            Post(
+                text=record['text'],
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record.get('group')),
+                image=record.get('image') or None,
+            )
+            for record in records
+        ]
+        assign_ids(posts)
+        Post.objects.bulk_create(posts)
+        set_dates(Post, 'pub_date', zip((post.id for post in posts), dates))
+        self.authors.update(post.author_id for post in posts)
+        self.save_post_ids(
+            (record['id'], post.id)
+            for record, post in zip(records, posts)
+            if 'id' in record
+        )
+        ImageJob.objects.bulk_create(
+            ImageJob(post_id=post.id) for post in posts if post.image
+        )
+
+    def save_post_ids(self, pairs):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO {0} (source_id, post_id) '
+                'VALUES (%s, %s)'.format(POST_IDS_TABLE),
+                list(pairs)
+            )
+
+    def resolve_posts(self, source_ids):
+        """id в файле -> id в базе для постов, уже импортированных."""
+        source_ids = list(set(source_ids))
+        posts = {}
+        with connection.cursor() as cursor:
+            # Старые SQLite принимают не больше 999 параметров.
+            for start in range(0, len(source_ids), 500):
+                chunk = source_ids[start:start + 500]
+                cursor.execute(
+                    'SELECT source_id, post_id FROM {0} '
+                    'WHERE source_id IN ({1})'.format(
+                        POST_IDS_TABLE,
+                        ', '.join(['%s'] * len(chunk))
+                    ),
+                    chunk
+                )
+                posts.update(cursor.fetchall())
+        return posts
+
+    def save_comments(self, records):
+        self.resolve_users(record['author'] for record in records)
+        posts = self.resolve_posts(record['post'] for record in records)
+        comments = []
+        dates = []
+        for record in records:
+            if record['post'] not in posts:
+                raise TransferError(
+                    'Комментарий к неизвестному посту {0}'.format(
+                        record['post']
+                    )
+                )
+            comments.append(Comment(
+                post_id=posts[record['post']],
+                author_id=self.users[record['author']],
+                text=record['text'],
+            ))
+            dates.append(_date(record.get('created')))
+        assign_ids(comments)
+        Comment.objects.bulk_create(comments)
+        set_dates(
+            Comment,
+            'created',
+            zip((comment.id for comment in comments), dates)
+        )
+
+    def save_follows(self, records):
+        self.resolve_users(
+            username
+            for record in records
+            for username in (record['user'], record['author'])
+        )
+        follows = [
+            Follow(
+                user_id=self.users[record['user']],
+                author_id=self.users[record['author']],
+            )
+            for record in records
+            if record['user'] != record['author']
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.authors.update(follow.author_id for follow in follows)
+
+    def save_batch(self, batch):
+        by_type = {record_type: [] for record_type in TYPES}
+        for record in batch:
+            by_type[record['type']].append(record)
+        with transaction.atomic():
+            for record_type in TYPES:
+                records = by_type[record_type]
+                if not records:
+                    continue
+                try:
+                    getattr(self, 'save_{0}s'.format(record_type))(records)
+                except KeyError as error:
+                    raise TransferError('Запись {0} без поля {1}'.format(
+                        record_type,
+                        error
+                    ))
+                self.counts[record_type] += len(records)
+
+    def parse(self, lines):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise TransferError('Строка {0}: {1}'.format(number, error))
+            if record.get('type') not in TYPES:
+                raise TransferError(
+                    'Строка {0}: неизвестный тип {1}'.format(
+                        number,
+                        record.get('type')
+                    )
+                )
+            yield record
+
+    def run(self, lines):
+        """Импорт строк JSONL."""
+        return self.load(self.parse(lines))
+
+    def load(self, records):
+        """Импорт уже разобранных записей (словарей)."""
+        batch = []
+        self.last_ids = search.last_ids()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE {0} ('
+                'source_id bigint PRIMARY KEY, '
+                'post_id bigint NOT NULL)'.format(POST_IDS_TABLE)
+            )
+        try:
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self.save_batch(batch)
+                    batch = []
+            if batch:
+                self.save_batch(batch)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TABLE {0}'.format(POST_IDS_TABLE))
+        self.finish()
+        return self.counts
+
+    def finish(self):
+        """То, что при обычном сохранении делают сигналы."""
+        stats.recount_comments()
+        stats.recount_authors(self.batch_size)
+        for author_id in self.authors:
+            timeline.fan_out_author(author_id)
+        search.index_after(self.last_ids)
+        feed_cache.bump(feed_cache.ALL)
+
+
+def _line(record):
+    return json.dumps(record, ensure_ascii=False, default=str) + '\n'
+
+
+def export(batch_size=1000):
+    """Строки JSONL со всеми группами, постами, комментариями
+    и подписками; таблицы читаются потоком (iterator)."""
+    groups = Group.objects.order_by('pk').values(
+        'slug',
+        'title',
+        'description'
+    )
+    for group in groups.iterator(chunk_size=batch_size):
+        yield _line(dict(type='group', **group))
+
+    posts = Post.objects.order_by('pk').values_list(
+        'id',
+        'author__username',
+        'group__slug',
+        'text',
+        'pub_date',
+        'image'
+    )
+    for post_id, author, group, text, pub_date, image in posts.iterator(
+        chunk_size=batch_size
+    ):
+        yield _line({
+            'type': 'post',
+            'id': post_id,
+            'author': author,
+            'group': group,
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'image': image or None,
+        })
+
+    comments = Comment.objects.order_by('pk').values_list(
+        'post_id',
+        'author__username',
+        'text',
+        'created'
+    )
+    for post_id, author, text, created in comments.iterator(
+        chunk_size=batch_size
+    ):
+        yield _line({
+            'type': 'comment',
+            'post': post_id,
+            'author': author,
+            'text': text,
+            'created': created.isoformat(),
+        })
+
+    follows = Follow.objects.order_by('pk').values_list(
+        'user__username',
+        'author__username'
+    )
+    for user, author in follows.iterator(chunk_size=batch_size):
+        yield _line({'type': 'follow', 'user': user, 'author': author})
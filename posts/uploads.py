@@ -0,0 +1,70 @@
+"""Загрузка картинок постов с ограниченным расходом памяти.
+
+StreamingImageUploadHandler пишет каждый загружаемый файл сразу во
+временный файл кусками по 64 КБ (даже маленький — в память ничего не
+копится), поэтому ImageField открывает картинку по пути, а не копией
+в BytesIO. Данные сверх POST_IMAGE_MAX_UPLOAD_SIZE не сохраняются.
+
+validate_image проверяет формат и число пикселей по заголовку, который
+Image.open() уже прочитал, без декодирования пикселей, поэтому
+«декомпрессионная бомба» отклоняется до того, как воркер попытается её
+развернуть.
+"""
+from django.conf import settings
+
+from django.core.exceptions import ValidationError
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from django.template.defaultfilters import filesizeformat
+
+
+class StreamingImageUploadHandler(TemporaryFileUploadHandler):
+    """Сохраняет загрузки во временные файлы. Данные сверх лимита
+    отбрасываются, а у файла выставляется too_large — ошибку покажет
+    форма, а не обрыв соединения."""
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            if not self.file.too_large:
+                self.file.too_large = True
+                self.file.truncate(0)
+            return None
+        self.file.write(raw_data)
+        return None
+
+
+def too_large_error():
+    return ValidationError(
+        'Файл больше {0}.'.format(
+            filesizeformat(settings.POST_IMAGE_MAX_UPLOAD_SIZE)
+        ),
+        code='too_large',
+    )
+
+
+def validate_image(upload):
+    """Валидатор поля формы: формат и размеры из заголовка картинки
+    (forms.ImageField сохраняет открытую картинку в upload.image)."""
+    image = getattr(upload, 'image', None)
+    if image is None:
+        return
+    if image.format not in settings.POST_IMAGE_FORMATS:
+        raise ValidationError(
+            'Формат {0} не поддерживается.'.format(image.format),
+            code='invalid_format',
+        )
+    width, height = image.size
+    max_pixels = settings.POST_IMAGE_MAX_PIXELS
+    if width * height > max_pixels:
+        raise ValidationError(
+            'Картинка {0}×{1} слишком большая: не больше {2} Мп.'.format(
+                width,
+                height,
+                max_pixels // 1000000
+            ),
+            code='too_many_pixels',
+        )
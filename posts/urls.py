@@ -7,6 +7,7 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_post, name='group'),
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search_results, name='search'),
     path('404/', views.page_not_found, name='404'),
     path('500/', views.server_error, name='500'),
     path('<str:username>/', views.profile, name='profile'),
@@ -16,6 +17,11 @@ urlpatterns = [
         views.post_edit,
         name='post_edit'
     ),
+    path(
+        '<str:username>/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         '<str:username>/<int:post_id>/comment/',
         views.add_comment,
@@ -2,12 +2,22 @@ from django.contrib.auth import get_user_model
 
 from django.contrib.auth.decorators import login_required
 
-from django.core.paginator import Paginator
+from django.http import JsonResponse
 
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.shortcuts import render
 
+from django.template.loader import render_to_string
+
+from django.utils.http import urlencode
+
+from posts import feed_cache
+from posts import image_jobs
+from posts import search
+from posts import stats
+from posts import timeline
+
 from posts.forms import CommentForm
 from posts.forms import PostForm
 
@@ -15,17 +25,25 @@ from posts.models import Follow
 from posts.models import Group
 from posts.models import Post
 
+from posts.paginator import CursorPaginator
+
+from yatube.ratelimit import ratelimit
+
+from yatube.settings import COMMENTS_LIMIT
 from yatube.settings import POSTS_LIMIT
 
 User = get_user_model()
 
 
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
 
-    paginator = Paginator(post_list, POSTS_LIMIT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(post_list, POSTS_LIMIT)
+    page = feed_cache.get_page(
+        paginator,
+        request.GET.get('cursor'),
+        feed_cache.INDEX
+    )
     return render(request, 'index.html', {
         'page': page,
         'paginator': paginator,
@@ -35,10 +53,13 @@ def index(request):
 
 def group_post(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, POSTS_LIMIT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = group.posts.for_feed()
+    paginator = CursorPaginator(posts, POSTS_LIMIT)
+    page = feed_cache.get_page(
+        paginator,
+        request.GET.get('cursor'),
+        feed_cache.group_scope(group.slug)
+    )
     return render(request, 'group.html', {
         'group': group,
         'page': page,
@@ -47,17 +68,21 @@ def group_post(request, slug):
 
 
 @login_required
+@ratelimit('post')
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            image_jobs.enqueue(post)
         return redirect('index')
     return render(request, 'new_post.html', {'form': form, 'is_edit': False, })
 
 
 @login_required
+@ratelimit('comment')
 def add_comment(request, username, post_id):
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -74,11 +99,17 @@ def add_comment(request, username, post_id):
 
 
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    paginator = Paginator(posts, POSTS_LIMIT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    user = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    posts = user.posts.for_feed()
+    paginator = CursorPaginator(posts, POSTS_LIMIT)
+    page = feed_cache.get_page(
+        paginator,
+        request.GET.get('cursor'),
+        feed_cache.author_scope(user.username)
+    )
     if request.user.is_authenticated is True:
         following = Follow.objects.filter(user=request.user, author=user)
     else:
@@ -86,16 +117,37 @@ def profile(request, username):
     context = {
         'page': page,
         'author': user,
+        'author_stats': stats.get_stats(user),
         'following': following,
         'paginator': paginator,
     }
     return render(request, 'profile.html', context)
 
 
+def comments_page(post, cursor):
+    """Комментарии к посту и одна их страница: новые первыми, автор
+    подгружается тем же запросом, следующая страница — по курсору
+    (created, id)."""
+    comments = post.comments.select_related('author')
+    paginator = CursorPaginator(
+        comments,
+        COMMENTS_LIMIT,
+        date_field='created'
+    )
+    return comments, paginator.get_page(cursor)
+
+
 def post_view(request, username, post_id):
-    user = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments_under_post = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        author__username=username,
+        id=post_id
+    )
+    user = post.author
+    comments_under_post, comment_page = comments_page(
+        post,
+        request.GET.get('cursor')
+    )
     form = CommentForm(request or None)
     if request.user.is_authenticated is True:
         following = Follow.objects.filter(user=request.user, author=user)
@@ -104,14 +156,36 @@ def post_view(request, username, post_id):
     context = {
         'post': post,
         'comments': comments_under_post,
+        'comment_page': comment_page,
         'author': post.author,
+        'author_stats': stats.get_stats(post.author),
         'following': following,
         'form': form,
     }
     return render(request, 'post.html', context)
 
 
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев в JSON для кнопки «Показать ещё»:
+    готовый HTML карточек и курсор следующей страницы."""
+    post = get_object_or_404(
+        Post.objects.only('id'),
+        author__username=username,
+        id=post_id
+    )
+    _, page = comments_page(post, request.GET.get('cursor'))
+    return JsonResponse({
+        'html': render_to_string(
+            'includes/comment_list.html',
+            {'comments': page},
+            request
+        ),
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required
+@ratelimit('post')
 def post_edit(request, username, post_id):
     edit_post = get_object_or_404(Post, author__username=username, id=post_id)
     if request.user != edit_post.author:
@@ -122,7 +196,9 @@ def post_edit(request, username, post_id):
         instance=edit_post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            image_jobs.enqueue(post)
         return redirect('post_view', edit_post.author, post_id)
     context = {'form': form, 'post': edit_post, 'is_edit': True, }
     return render(request, 'new_post.html', context)
@@ -138,11 +214,14 @@ def server_error(request):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, POSTS_LIMIT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    followers_cnt = request.user.follower.all().count()
+    paginator = timeline.follow_paginator(request.user, POSTS_LIMIT)
+    page = feed_cache.get_page(
+        paginator,
+        request.GET.get('cursor'),
+        feed_cache.follow_scope(request.user.pk),
+        feed_cache.CELEBRITIES
+    )
+    followers_cnt = stats.get_stats(request.user).following_count
     return render(request, 'follow.html', {
         'page': page,
         'followers_cnt': followers_cnt,
@@ -152,6 +231,7 @@ def follow_index(request):
 
 
 @login_required
+@ratelimit('follow', methods=None)
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -160,7 +240,27 @@ def profile_follow(request, username):
 
 
 @login_required
+@ratelimit('follow', methods=None)
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('profile', username=username)
+
+
+def search_results(request):
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type')
+    if kind not in search.KINDS:
+        kind = search.POST
+    page = search.get_page(query, kind, request.GET.get('cursor'))
+    return render(request, 'search.html', {
+        'query': query,
+        'kind': kind,
+        'kinds': (
+            (search.POST, 'Записи'),
+            (search.COMMENT, 'Комментарии'),
+            (search.GROUP, 'Группы'),
+        ),
+        'page': page,
+        'query_string': urlencode({'q': query, 'type': kind}) + '&',
+    })
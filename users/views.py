@@ -1,10 +1,15 @@
+from django.utils.decorators import method_decorator
+
 from django.views.generic import CreateView
 
 from django.urls import reverse_lazy
 
 from users.forms import CreationForm
 
+from yatube.ratelimit import ratelimit
+
 
+@method_decorator(ratelimit('signup'), name='dispatch')
 class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy("index")
@@ -0,0 +1,214 @@
+"""Статика с хешами в именах, заранее сжатая, с долгим кэшированием.
+
+collectstatic с CompressedManifestStaticFilesStorage копирует файлы
+в STATIC_ROOT под именами с хешем содержимого
+(bootstrap.min.css -> bootstrap.min.1a2b3c4d5e6f.css), записывает
+манифест staticfiles.json (по нему тег {% static %} выдаёт адреса
+с хешем) и кладёт рядом сжатые копии: .gz (gzip -9) и .br (brotli,
+если установлен пакет brotli).
+
+StaticFilesMiddleware отдаёт эти файлы сам, без nginx: сжатую копию
+выбирает по Accept-Encoding, а файлы с хешем из манифеста отдаёт
+с Cache-Control: max-age на год и immutable — новая версия файла
+получит новое имя, так что браузеру незачем перепроверять старое.
+Файлы без хеша кэшируются на STATIC_REVALIDATE_MAX_AGE и дальше
+проверяются по Last-Modified.
+"""
+import gzip
+
+import mimetypes
+
+import os
+
+import re
+
+from django.conf import settings
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.exceptions import SuspiciousFileOperation
+
+from django.http import FileResponse
+
+from django.utils._os import safe_join
+
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.cache import patch_vary_headers
+
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def compress_gzip(data):
+    # mtime=0: одинаковый файл даёт одинаковый .gz при каждой сборке.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def encodings():
+    """Доступные сжатия в порядке предпочтения:
+    (Content-Encoding, расширение файла, функция)."""
+    available = [('gzip', '.gz', compress_gzip)]
+    if brotli is not None:
+        available.insert(0, ('br', '.br', compress_brotli))
+    return available
+
+
+def compressible(name):
+    return os.path.splitext(name)[1].lower() in (
+        settings.STATIC_COMPRESS_EXTENSIONS
+    )
+
+
+def accepts(request, encoding):
+    return re.search(
+        r'\b{0}\b'.format(encoding),
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    ) is not None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, которое после хеширования сжимает
+    текстовые файлы (и с хешем, и без) во все доступные форматы.
+
+    Без манифеста (collectstatic не запускали — в тестах и при
+    разработке) {% static %} выдаёт имена без хеша: такие файлы есть
+    в STATIC_ROOT. С манифестом действует manifest_strict: файл, которого
+    в нём нет, — ValueError, а не адрес, который отдаст 404."""
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not compressible(name) or not self.exists(name):
+                continue
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        """Пишет сжатые копии файла, если они меньше оригинала;
+        возвращает имена записанных копий. Копии новее оригинала
+        не пересобираются."""
+        path = self.path(name)
+        if os.path.getsize(path) < settings.STATIC_COMPRESS_MIN_SIZE:
+            return []
+        written = []
+        data = None
+        for _, suffix, compress in encodings():
+            target = path + suffix
+            if (
+                os.path.exists(target)
+                and os.path.getmtime(target) >= os.path.getmtime(path)
+            ):
+                continue
+            if data is None:
+                with open(path, 'rb') as source:
+                    data = source.read()
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                if os.path.exists(target):
+                    os.remove(target)
+                continue
+            with open(target, 'wb') as output:
+                output.write(compressed)
+            written.append(name + suffix)
+        return written
+
+
+class StaticFilesMiddleware:
+    """Отдаёт STATIC_URL из STATIC_ROOT до остальных middleware:
+    запросы статики не трогают ни сессии, ни базу, ни замеры.
+
+    Стоит первым в MIDDLEWARE. STATIC_SERVE = False выключает его,
+    когда статику отдаёт веб-сервер."""
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE or '://' in settings.STATIC_URL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        # Имена с хешем из манифеста: только их можно кэшировать
+        # навсегда. Манифест меняет collectstatic, после него
+        # процессы перезапускаются.
+        self.immutable = set(
+            getattr(staticfiles_storage, 'hashed_files', {}).values()
+        )
+
+    def __call__(self, request):
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.path_info.startswith(self.prefix)
+        ):
+            response = self.serve(
+                request,
+                request.path_info[len(self.prefix):]
+            )
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        """Ответ с файлом или None, если файла нет: тогда запрос идёт
+        дальше и заканчивается обычным 404."""
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        last_modified = int(os.stat(path).st_mtime)
+        variants = [
+            (encoding, path + suffix)
+            for encoding, suffix, _ in encodings()
+            if os.path.isfile(path + suffix)
+        ]
+        response = get_conditional_response(
+            request,
+            last_modified=last_modified
+        )
+        if response is None:
+            content_type = mimetypes.guess_type(path)[0]
+            served = path
+            for encoding, variant in variants:
+                if accepts(request, encoding):
+                    served = variant
+                    break
+            response = FileResponse(
+                open(served, 'rb'),
+                content_type=content_type or 'application/octet-stream'
+            )
+            if served != path:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = http_date(last_modified)
+        if variants:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        if name in self.immutable:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.STATIC_MAX_AGE,
+                immutable=True
+            )
+        else:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.STATIC_REVALIDATE_MAX_AGE
+            )
+        return response
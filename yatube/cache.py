@@ -0,0 +1,175 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+
+Общий уровень (файловый, DatabaseCache, memcached) виден всем воркерам
+gunicorn, поэтому инвалидация в одном воркере сразу видна остальным.
+Локальный уровень держит только ключи с префиксами LOCAL_KEY_PREFIXES —
+ключи, значение которых по построению не меняется: в них уже зашита
+версия данных (поколения лент в posts.feed_cache, Post.updated в кэше
+карточек). Проверка версии — это сам ключ: поколения всегда читаются из
+общего уровня, и после их сброса локальные записи просто перестают
+запрашиваться и вытесняются LRU.
+
+Пример настройки:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.TieredCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_KEY_PREFIXES': ['feed_page:'],
+                'LOCAL_MAX_ENTRIES': 1000,
+            },
+        },
+        'shared': {...},
+    }
+"""
+import pickle
+
+import threading
+
+import time
+
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.cache import caches
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.base import BaseCache
+
+
+def incr(key, delta=1):
+    """Счётчик в кэше по умолчанию. incr в Django-кэше не создаёт ключ;
+    add создаёт его атомарно, если другой воркер не успел раньше."""
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_prefixes = tuple(options.get('LOCAL_KEY_PREFIXES', ()))
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = int(options.get('LOCAL_TIMEOUT', 300))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = self.shared_hits = self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return key.startswith(self._local_prefixes)
+
+    def _local_get(self, key, version):
+        local_key = self.make_key(key, version)
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return None
+            expires, pickled = entry
+            if expires < time.monotonic():
+                del self._local[local_key]
+                return None
+            self._local.move_to_end(local_key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, key, value, version):
+        local_key = self.make_key(key, version)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[local_key] = (
+                time.monotonic() + self._local_timeout,
+                pickled
+            )
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key, version):
+        with self._lock:
+            self._local.pop(self.make_key(key, version), None)
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            value = self._local_get(key, version)
+            if value is not None:
+                self.local_hits += 1
+                return value
+        value = self.shared.get(key, version=version)
+        if value is None:
+            self.misses += 1
+            return default
+        self.shared_hits += 1
+        if self._is_local(key):
+            self._local_set(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        for key in keys:
+            value = (
+                self._local_get(key, version) if self._is_local(key) else None
+            )
+            if value is None:
+                remote.append(key)
+            else:
+                self.local_hits += 1
+                found[key] = value
+        if remote:
+            shared_found = self.shared.get_many(remote, version=version)
+            self.shared_hits += len(shared_found)
+            self.misses += len(remote) - len(shared_found)
+            for key, value in shared_found.items():
+                if self._is_local(key):
+                    self._local_set(key, value, version)
+            found.update(shared_found)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout=timeout, version=version)
+        if self._is_local(key):
+            self._local_set(key, value, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.add(key, value, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if self._is_local(key) and key not in failed:
+                self._local_set(key, value, version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(key, version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,383 @@
+"""Замеры времени ответа по представлениям.
+
+MetricsMiddleware для доли запросов METRICS_SAMPLE_RATE считает число
+и время SQL-запросов (execute_wrapper на всех соединениях из DATABASES:
+чтение идёт через реплику, yatube.routers), время отрисовки шаблонов
+(TimedDjangoTemplates) и общее время, отдаёт их заголовком
+Server-Timing и складывает в гистограммы в общем кэше — счётчики
+cache.incr, поэтому их видят все воркеры. Остальные запросы получают
+только общее время в Server-Timing.
+
+Сводка — JSON на /metrics/ для персонала или по заголовку
+X-Metrics-Token со значением METRICS_TOKEN; в ней же счётчики
+ограничения частоты записей (yatube.ratelimit).
+
+Журнал запросов к базе (логгер yatube.queries, по строке JSON на
+событие, отчёт — query_report) получает запросы дольше SLOW_QUERY_MS
+из всех HTTP-запросов: обёртка QueryLog на запросах вне выборки только
+сравнивает время с порогом. Запросы одной формы (SQL без параметров),
+повторённые за запрос N_PLUS_ONE_THRESHOLD раз и больше, — кандидаты
+в N+1 — ищутся только в замеренных запросах: для этого каждый запрос
+к базе приходится разбирать. Для события запоминаются строка шаблона
+и строка кода проекта, откуда пришёл запрос.
+"""
+import json
+
+import logging
+
+import os
+
+import random
+
+import re
+
+import sys
+
+import threading
+
+import time
+
+from collections import Counter
+
+from contextlib import ExitStack
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from django.core.cache import cache
+
+from django.db import connections
+
+from django.http import HttpResponseForbidden
+from django.http import JsonResponse
+
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template
+
+from django.urls import Resolver404
+from django.urls import URLPattern
+from django.urls import get_resolver
+from django.urls import resolve
+
+from yatube import ratelimit
+
+from yatube.cache import incr
+
+PREFIX = 'metrics'
+FIELDS = ('count', 'queries', 'sql_us', 'template_us', 'total_us')
+PAGE_CACHE_SUFFIX = ':page_cache'
+
+_current = threading.local()
+
+query_logger = logging.getLogger('yatube.queries')
+
+IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+SPACES_RE = re.compile(r'\s+')
+
+
+def view_name(view_func):
+    """'posts.views.index', 'users.views.SignUp' — класс, а не
+    функция, которую вернул as_view()."""
+    view = getattr(view_func, 'view_class', view_func)
+    return '{0}.{1}'.format(view.__module__, view.__qualname__)
+
+
+def bucket_bounds():
+    return tuple(settings.METRICS_BUCKETS) + ('inf',)
+
+
+def _key(view, field):
+    return '{0}:{1}:{2}'.format(PREFIX, view, field)
+
+
+def query_shape(sql):
+    """SQL без конкретных значений: списки IN (%s, %s, ...) и числа,
+    вписанные в текст (LIMIT 11), схлопываются."""
+    sql = IN_LIST_RE.sub('(%s...)', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+def query_origin():
+    """Строка шаблона и строка кода проекта, из которых выполняется
+    текущий запрос к базе."""
+    template = code = None
+    frame = sys._getframe(2)
+    while frame is not None and (template is None or code is None):
+        node = frame.f_locals.get('self')
+        if (
+            template is None
+            and frame.f_code.co_name == 'render_annotated'
+            and getattr(node, 'token', None) is not None
+        ):
+            template = '{0}:{1}'.format(
+                node.origin.template_name,
+                node.token.lineno
+            )
+        filename = frame.f_code.co_filename
+        if (
+            code is None
+            and filename.startswith(settings.BASE_DIR)
+            and filename != __file__
+        ):
+            code = '{0}:{1}'.format(
+                os.path.relpath(filename, settings.BASE_DIR),
+                frame.f_lineno
+            )
+        frame = frame.f_back
+    return template, code
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """execute_wrapper на всех соединениях из DATABASES, а не только
+    на 'default': чтение уходит на реплику (yatube.routers)."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        yield
+
+
+def is_slow(duration):
+    return duration * 1000 >= settings.SLOW_QUERY_MS
+
+
+class QueryLog:
+    """Журнал медленных запросов к базе для HTTP-запроса вне выборки:
+    на каждый запрос к базе — одно вычитание и сравнение с порогом,
+    SQL разбирается только у медленных."""
+    def __init__(self):
+        self.shapes = Counter()
+        self.events = []
+        self.repeated = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if is_slow(duration):
+                shape = query_shape(sql)
+                self.shapes[shape] += 1
+                self.slow(shape, duration)
+
+    def slow(self, shape, duration):
+        self.events.append({
+            'kind': 'slow',
+            'sql': shape,
+            'ms': round(duration * 1000, 2),
+            'origin': query_origin(),
+        })
+
+    def log_queries(self, view):
+        events = self.events + [
+            {'kind': 'n+1', 'sql': shape, 'origin': origin}
+            for shape, origin in self.repeated.items()
+        ]
+        for event in events:
+            template, code = event.pop('origin')
+            event.update(
+                view=view,
+                count=self.shapes[event['sql']],
+                template=template,
+                code=code,
+            )
+            query_logger.warning(json.dumps(event, ensure_ascii=False))
+
+
+class RequestMetrics(QueryLog):
+    """Полный замер HTTP-запроса из выборки: число и время запросов
+    к базе, время шаблонов, медленные запросы и кандидаты в N+1."""
+    def __init__(self):
+        super().__init__()
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.sql += duration
+            self.inspect(sql, duration)
+
+    def inspect(self, sql, duration):
+        shape = query_shape(sql)
+        self.shapes[shape] += 1
+        if is_slow(duration):
+            self.slow(shape, duration)
+        if self.shapes[shape] == settings.N_PLUS_ONE_THRESHOLD:
+            # Место запоминается один раз, на пороговом повторе;
+            # итоговое число повторов допишет log_queries.
+            self.repeated[shape] = query_origin()
+
+    def record(self, view, total):
+        bucket = next(
+            bound for bound in bucket_bounds()
+            if bound == 'inf' or total * 1000 <= bound
+        )
+        values = {
+            'count': 1,
+            'queries': self.queries,
+            'sql_us': int(self.sql * 1000000),
+            'template_us': int(self.template * 1000000),
+            'total_us': int(total * 1000000),
+            'le_{0}'.format(bucket): 1,
+        }
+        for field, delta in values.items():
+            incr(_key(view, field), delta)
+
+    def server_timing(self, total):
+        return (
+            'db;dur={0:.1f};desc="{1} queries", tpl;dur={2:.1f}, '
+            'total;dur={3:.1f}'.format(
+                self.sql * 1000,
+                self.queries,
+                self.template * 1000,
+                total * 1000
+            )
+        )
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = getattr(_current, 'metrics', None)
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, который замеряет время отрисовки шаблона
+    целиком (вложенные {% include %} идут в общий счёт)."""
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            log = QueryLog()
+            with wrap_queries(log):
+                response = self.get_response(request)
+            response['Server-Timing'] = 'total;dur={0:.1f}'.format(
+                (time.perf_counter() - started) * 1000
+            )
+            if log.events:
+                view = self.view(request)
+                if view is not None:
+                    log.log_queries(view)
+            return response
+
+        metrics = _current.metrics = RequestMetrics()
+        try:
+            with wrap_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.metrics = None
+        total = time.perf_counter() - started
+        response['Server-Timing'] = metrics.server_timing(total)
+        view = self.view(request)
+        if view is None:
+            return response
+        metrics.record(view, total)
+        metrics.log_queries(view)
+        return response
+
+    def view(self, request):
+        view = getattr(request, 'metrics_view', None)
+        if view is None:
+            # Ответ отдан до представления (кэш страниц, 304, редирект
+            # CommonMiddleware) — учитываем отдельно.
+            try:
+                view = view_name(resolve(request.path_info).func)
+            except Resolver404:
+                return None
+            view += PAGE_CACHE_SUFFIX
+        return view
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func)
+
+
+def known_views(patterns=None):
+    """Имена всех представлений из URLconf."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    names = []
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            names.append(view_name(pattern.callback))
+        else:
+            names.extend(known_views(pattern.url_patterns))
+    return names
+
+
+def summary():
+    """Сводка по всем представлениям, у которых были замеры."""
+    views = []
+    for view in dict.fromkeys(known_views()):
+        views.extend((view, view + PAGE_CACHE_SUFFIX))
+    histogram_fields = ['le_{0}'.format(bound) for bound in bucket_bounds()]
+    keys = [
+        _key(view, field)
+        for view in views
+        for field in FIELDS + tuple(histogram_fields)
+    ]
+    values = cache.get_many(keys)
+    result = {}
+    for view in views:
+        count = values.get(_key(view, 'count'))
+        if not count:
+            continue
+        result[view] = {
+            'count': count,
+            'queries_mean': round(values.get(
+                _key(view, 'queries'), 0
+            ) / count, 2),
+            'sql_ms_mean': round(values.get(
+                _key(view, 'sql_us'), 0
+            ) / count / 1000, 2),
+            'template_ms_mean': round(values.get(
+                _key(view, 'template_us'), 0
+            ) / count / 1000, 2),
+            'total_ms_mean': round(values.get(
+                _key(view, 'total_us'), 0
+            ) / count / 1000, 2),
+            'histogram_ms': {
+                field[3:]: values.get(_key(view, field), 0)
+                for field in histogram_fields
+            },
+        }
+    return result
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    allowed = request.user.is_staff or (
+        token and request.META.get('HTTP_X_METRICS_TOKEN') == token
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return JsonResponse({
+        'sample_rate': settings.METRICS_SAMPLE_RATE,
+        'views': summary(),
+        'ratelimit': ratelimit.summary(),
+    })
@@ -0,0 +1,43 @@
+"""Постоянные соединения с проверкой перед использованием.
+
+При CONN_MAX_AGE > 0 Django держит соединение открытым между
+запросами, но узнаёт о его обрыве (перезапуск PostgreSQL, разрыв
+в PgBouncer) только по ошибке уже в самом запросе. С CONN_HEALTH_CHECKS
+первое обращение к базе в каждом запросе сначала проверяет соединение
+(is_usable) и при необходимости открывает новое — как в Django 4.1,
+где появилась эта настройка.
+"""
+
+
+class HealthCheckMixin:
+    health_check_done = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def connect(self):
+        super().connect()
+        # Новое соединение проверять незачем.
+        self.health_check_done = True
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого запроса.
+        if self.connection is not None:
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,8 @@
+"""PostgreSQL с проверкой постоянных соединений (yatube.pooling)."""
+from django.db.backends.postgresql import base
+
+from yatube.pooling import HealthCheckMixin
+
+
+class DatabaseWrapper(HealthCheckMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,136 @@
+"""Ограничение частоты записей: token bucket в общем кэше.
+
+У каждого пользователя и каждого IP-адреса на область (scope) есть
+«ведро» на capacity жетонов, которое наполняется за period секунд
+(settings.RATELIMITS: область -> (capacity, period)). Запрос забирает
+по жетону из всех своих вёдер, только если жетон есть в каждом; иначе —
+ответ 429 с Retry-After через столько секунд, сколько нужно до
+следующего жетона, и ни одно ведро не тратится. Для вошедшего
+пользователя ведро IP-адреса в RATELIMIT_IP_FACTOR раз больше: за
+одним адресом бывает несколько пользователей. У анонимных запросов
+ведро одно — адреса, и в нём ровно capacity жетонов.
+
+    @ratelimit('comment')
+    def add_comment(request, ...):
+
+Состояние ведра — (жетоны, время) в общем кэше, его видят все воркеры.
+Чтение и запись не атомарны: одновременные запросы в разных воркерах
+могут взять лишний жетон, но не больше одного на воркер. Счётчики
+пропущенных и отклонённых запросов — в /metrics/ (yatube.metrics).
+"""
+import math
+
+import time
+
+from functools import wraps
+
+from django.conf import settings
+
+from django.core.cache import cache
+
+from django.http import HttpResponse
+
+from yatube.cache import incr
+
+PREFIX = 'ratelimit'
+RESULTS = ('allowed', 'limited')
+
+
+class HttpResponseTooManyRequests(HttpResponse):
+    status_code = 429
+
+
+def _bucket_key(scope, identity):
+    return '{0}:bucket:{1}:{2}'.format(PREFIX, scope, identity)
+
+
+def _counter_key(scope, result):
+    return '{0}:count:{1}:{2}'.format(PREFIX, scope, result)
+
+
+def tokens(key, capacity, period, now):
+    """Жетонов в ведре сейчас; отсутствующий ключ — полное ведро."""
+    count, updated = cache.get(key, (capacity, now))
+    return min(capacity, count + (now - updated) * capacity / period)
+
+
+def client_ip(request):
+    return request.META.get(settings.RATELIMIT_IP_HEADER, '')
+
+
+def buckets(request, scope):
+    """(идентификатор, ёмкость) вёдер запроса."""
+    capacity, _ = settings.RATELIMITS[scope]
+    ip = 'ip:{0}'.format(client_ip(request))
+    if not request.user.is_authenticated:
+        return [(ip, capacity)]
+    return [
+        ('user:{0}'.format(request.user.pk), capacity),
+        (ip, capacity * settings.RATELIMIT_IP_FACTOR),
+    ]
+
+
+def check(request, scope):
+    """Секунды до разрешения запроса, 0 — можно сейчас. Жетоны
+    забираются только после проверки всех вёдер: запрос, отклонённый
+    ведром пользователя, не тратит жетон общего ведра адреса."""
+    _, period = settings.RATELIMITS[scope]
+    now = time.time()
+    left = {}
+    retry_after = 0
+    for identity, capacity in buckets(request, scope):
+        key = _bucket_key(scope, identity)
+        left[key] = tokens(key, capacity, period, now)
+        if left[key] < 1:
+            retry_after = max(
+                retry_after,
+                (1 - left[key]) * period / capacity
+            )
+    if retry_after:
+        incr(_counter_key(scope, 'limited'))
+        return retry_after
+    cache.set_many(
+        {key: (count - 1, now) for key, count in left.items()},
+        period
+    )
+    incr(_counter_key(scope, 'allowed'))
+    return 0
+
+
+def ratelimit(scope, methods=('POST',)):
+    """Декоратор представления: запросы методами methods (None — любыми)
+    ограничиваются ведром области scope."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLED and (
+                methods is None or request.method in methods
+            ):
+                retry_after = check(request, scope)
+                if retry_after:
+                    response = HttpResponseTooManyRequests(
+                        'Слишком много запросов, попробуйте позже.',
+                        content_type='text/plain; charset=utf-8'
+                    )
+                    response['Retry-After'] = str(math.ceil(retry_after))
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary():
+    """Счётчики пропущенных и отклонённых запросов по областям."""
+    keys = [
+        _counter_key(scope, result)
+        for scope in settings.RATELIMITS
+        for result in RESULTS
+    ]
+    values = cache.get_many(keys)
+    return {
+        scope: {
+            result: values.get(_counter_key(scope, result), 0)
+            for result in RESULTS
+        }
+        for scope in settings.RATELIMITS
+    }
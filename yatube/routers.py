@@ -0,0 +1,40 @@
+"""Чтение с отдельного соединения только для чтения.
+
+В settings.DATABASES алиас REPLICA — та же база SQLite, открытая
+в режиме mode=ro, а все записи идут через 'default' — единственного
+пишущего. Внутри транзакции на 'default' чтение тоже идёт через него:
+иначе код не увидел бы свои же ещё не закоммиченные строки.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+
+REPLICA = 'replica'
+
+
+def replica_available():
+    """Есть ли отдельная реплика. В тестах реплика — зеркало
+    (TEST['MIRROR']) и указывает на ту же базу, что и 'default'."""
+    if REPLICA not in connections.databases:
+        return False
+    return (
+        connections[REPLICA].settings_dict['NAME']
+        != connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    )
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if replica_available():
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+import sys
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -52,7 +54,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.assets.StaticFilesMiddleware',
+    'yatube.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Выше кэша страниц: в кэше лежит несжатый ответ, а сжимается он
+    # для каждого клиента по его Accept-Encoding (и потоковые ответы).
+    'django.middleware.gzip.GZipMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,7 +75,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,13 +97,83 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+# Соединения с базой не закрываются после каждого запроса, а живут
+# DATABASE_CONN_MAX_AGE секунд (0 — закрывать сразу, как раньше) и
+# проверяются в начале запроса (CONN_HEALTH_CHECKS, yatube.pooling).
+DATABASE_CONN_MAX_AGE = int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 60))
+
+DATABASE_PATH = os.path.join(BASE_DIR, 'db.sqlite3')
+
+# PRAGMA каждого соединения с SQLite (yatube.sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # В WAL NORMAL не теряет целостность, fsync — только на checkpoint.
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер кэша страниц в КБ.
+    'cache_size': -64000,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
 }
 
+# База выбирается переменной окружения YATUBE_DATABASE:
+#   sqlite — файл db.sqlite3 (разработка и небольшой сервер);
+#   postgres — PostgreSQL, параметры в YATUBE_DB_NAME, YATUBE_DB_USER,
+#   YATUBE_DB_PASSWORD, YATUBE_DB_HOST и YATUBE_DB_PORT. За PgBouncer
+#   в режиме пула транзакций нужно YATUBE_DB_PGBOUNCER=1: серверные
+#   курсоры не переживают смену соединения между транзакциями.
+YATUBE_DATABASE = os.environ.get('YATUBE_DATABASE', 'sqlite')
+
+if YATUBE_DATABASE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'yatube.postgresql',
+            'NAME': os.environ.get('YATUBE_DB_NAME', 'yatube'),
+            'USER': os.environ.get('YATUBE_DB_USER', 'yatube'),
+            'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+            'HOST': os.environ.get('YATUBE_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('YATUBE_DB_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.environ.get('YATUBE_DB_PGBOUNCER') == '1'
+            ),
+            'OPTIONS': {'connect_timeout': 5},
+        },
+    }
+else:
+    # SQLite в режиме WAL (yatube.sqlite): читатели не блокируются записью.
+    # Чтение идёт через отдельное соединение только для чтения ('replica'),
+    # запись — через единственного пишущего 'default' (yatube.routers).
+    DATABASES = {
+        'default': {
+            'ENGINE': 'yatube.sqlite',
+            'NAME': DATABASE_PATH,
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pragmas': SQLITE_PRAGMAS},
+        },
+        'replica': {
+            'ENGINE': 'yatube.sqlite',
+            'NAME': 'file:{0}?mode=ro'.format(DATABASE_PATH),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pragmas': dict(
+                    {
+                        name: value
+                        for name, value in SQLITE_PRAGMAS.items()
+                        if name != 'journal_mode'
+                    },
+                    query_only='ON'
+                ),
+            },
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+DATABASE_ROUTERS = ['yatube.routers.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -138,6 +216,20 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 
+# collectstatic хеширует имена и сжимает файлы (yatube.assets),
+# StaticFilesMiddleware отдаёт их из STATIC_ROOT: файлы с хешем —
+# с кэшем на год, остальные — на STATIC_REVALIDATE_MAX_AGE секунд.
+# STATIC_SERVE = False — статику отдаёт веб-сервер.
+STATICFILES_STORAGE = 'yatube.assets.CompressedManifestStaticFilesStorage'
+STATIC_SERVE = True
+STATIC_MAX_AGE = 60 * 60 * 24 * 365
+STATIC_REVALIDATE_MAX_AGE = 60
+STATIC_COMPRESS_MIN_SIZE = 256
+STATIC_COMPRESS_EXTENSIONS = (
+    '.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml',
+    '.ico', '.ttf', '.otf', '.eot',
+)
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
@@ -151,14 +243,160 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 POSTS_LIMIT = 10
+# Комментариев на странице поста и в каждой подгрузке «Показать ещё».
+COMMENTS_LIMIT = 20
+
+# Размеры миниатюр картинок постов (ширина, высота), строятся при загрузке
+# в каждом из форматов (в порядке предпочтения; AVIF — если Pillow умеет
+# его сохранять). В src у <img> — JPEG шириной POST_THUMBNAIL_SRC_WIDTH.
+POST_THUMBNAIL_SIZES = ((1920, 678), (960, 339), (480, 170))
+POST_THUMBNAIL_FORMATS = ('avif', 'webp', 'jpeg')
+POST_THUMBNAIL_SRC_WIDTH = 960
+
+# Фоновая обработка картинок (manage.py process_images): оригинал
+# уменьшается до POST_IMAGE_MAX_SIZE по большей стороне, неудачное
+# задание повторяется до IMAGE_JOB_MAX_ATTEMPTS раз, «выполняющееся»
+# дольше IMAGE_JOB_STALE_TIMEOUT секунд возвращается в очередь.
+POST_IMAGE_MAX_SIZE = 1920
+IMAGE_JOB_MAX_ATTEMPTS = 3
+IMAGE_JOB_STALE_TIMEOUT = 600
+
+# Загрузки пишутся во временные файлы (posts.uploads), картинка
+# проверяется по заголовку: размер файла, формат и число пикселей.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.StreamingImageUploadHandler']
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40000000
+POST_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Авторы с большим числом подписчиков не раскладываются по лентам
+# при публикации, их посты подмешиваются в /follow/ при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Полнотекстовый поиск (posts.search): не больше SEARCH_MAX_TERMS слов
+# в запросе и SEARCH_MAX_RESULTS результатов на все страницы, в админке —
+# SEARCH_ADMIN_LIMIT; конфигурация текстового поиска PostgreSQL.
+SEARCH_MAX_TERMS = 8
+SEARCH_MAX_RESULTS = 500
+SEARCH_ADMIN_LIMIT = 500
+SEARCH_POSTGRES_CONFIG = 'russian'
+
+# Ограничение частоты записей (yatube.ratelimit): область ->
+# (жетонов в ведре, за сколько секунд ведро наполняется). Для вошедших
+# ведро IP-адреса в RATELIMIT_IP_FACTOR раз больше ведра пользователя,
+# у анонимов ведро адреса — ровно capacity; адрес клиента — из
+# RATELIMIT_IP_HEADER (за прокси — HTTP_X_REAL_IP).
+RATELIMIT_ENABLED = True
+RATELIMITS = {
+    'post': (10, 10 * 60),
+    'comment': (30, 10 * 60),
+    'follow': (60, 10 * 60),
+    'signup': (5, 60 * 60),
+}
+RATELIMIT_IP_FACTOR = 5
+RATELIMIT_IP_HEADER = 'REMOTE_ADDR'
+
+# Замеры времени ответа (yatube.metrics): доля запросов с полным
+# замером, границы гистограммы в мс и токен для /metrics/.
+METRICS_SAMPLE_RATE = 0.1
+METRICS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+# Журнал медленных запросов (из всех HTTP-запросов) и повторяющихся
+# (N+1, только в замеренных), отчёт — manage.py query_report.
+SLOW_QUERY_MS = 100
+N_PLUS_ONE_THRESHOLD = 5
+QUERY_LOG_FILE = os.environ.get(
+    'YATUBE_QUERY_LOG',
+    os.path.join(BASE_DIR, 'queries.log')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'query_log': {
+            'class': 'logging.FileHandler',
+            'filename': QUERY_LOG_FILE,
+            'formatter': 'message',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.queries': {
+            'handlers': ['query_log'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
-CACHES = {
-    'default': {
+# Страницы лент кэшируются надолго: при изменениях сигналы сбрасывают
+# поколения затронутых лент (posts.feed_cache).
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Полные страницы для анонимных посетителей (posts.middleware).
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Кэш выбирается переменной окружения YATUBE_CACHE:
+#   file (по умолчанию), db — общий для всех воркеров gunicorn кэш
+#   на одном сервере (для db нужен `python manage.py createcachetable`);
+#   tiered — LRU в памяти процесса перед общим кэшем YATUBE_SHARED_CACHE;
+#   locmem — свой кэш у каждого процесса, только для тестов: с ним
+#   воркеры часами отдают страницы, сброшенные в другом воркере,
+#   а ведра ограничения частоты и счётчики /metrics/ у каждого свои.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+YATUBE_CACHE = os.environ.get(
+    'YATUBE_CACHE',
+    'locmem' if TESTING else 'file'
+)
+YATUBE_SHARED_CACHE = os.environ.get('YATUBE_SHARED_CACHE', 'file')
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        # 'LOCATION': 'index_page',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
 }
 
+if YATUBE_CACHE == 'tiered':
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.TieredCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                # Ключи, в которые уже зашита версия данных.
+                'LOCAL_KEY_PREFIXES': [
+                    'feed_page:',
+                    'template.cache.post_card.',
+                ],
+                'LOCAL_MAX_ENTRIES': 2000,
+            },
+        },
+        'shared': CACHE_BACKENDS[YATUBE_SHARED_CACHE],
+    }
+else:
+    CACHES = {
+        'default': CACHE_BACKENDS[YATUBE_CACHE],
+    }
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -0,0 +1,33 @@
+"""SQLite с настройкой соединения для работы под нагрузкой.
+
+Бэкенд отличается от django.db.backends.sqlite3 тем, что каждое
+новое соединение выполняет PRAGMA из OPTIONS['pragmas'], а постоянные
+соединения проверяются перед использованием (yatube.pooling):
+
+    'OPTIONS': {'pragmas': {'journal_mode': 'WAL', 'busy_timeout': 5000}}
+
+В режиме WAL читатели не ждут пишущего: запись идёт в журнал, а
+читатели видят последнюю закоммиченную версию базы.
+"""
+from django.db.backends.sqlite3 import base
+
+from yatube.pooling import HealthCheckMixin
+
+
+def configure(connection, pragmas):
+    """Выполняет PRAGMA на открытом sqlite3-соединении."""
+    for name, value in pragmas.items():
+        connection.execute('PRAGMA {0} = {1}'.format(name, value))
+
+
+class DatabaseWrapper(HealthCheckMixin, base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # sqlite3.connect() не знает ключа pragmas.
+        self.pragmas = kwargs.pop('pragmas', {})
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        configure(connection, self.pragmas)
+        return connection
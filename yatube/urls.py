@@ -25,6 +25,8 @@ from django.contrib import admin
 from django.urls import include
 from django.urls import path
 
+from yatube import metrics
+
 urlpatterns = [
     #  регистрация и авторизация
     path('auth/', include('users.urls')),
@@ -33,6 +35,10 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     #  раздел администратора
     path('admin/', admin.site.urls),
+    #  сводка замеров времени ответа (до posts.urls: там '<username>/')
+    path('metrics/', metrics.metrics_view, name='metrics'),
+    #  JSON API лент только для чтения (до posts.urls: там '<username>/')
+    path('api/v1/', include('posts.api_urls')),
     #  обработчик для главной страницы ищем в urls.py приложения posts
     path('', include('posts.urls')),
     #  раздел статичных страниц приложения about